@@ -0,0 +1,191 @@
+#============================================================
+# File run_benchmarks.py
+#
+# Offline benchmark suite for dynamicme.
+#
+# Usage:
+#   python benchmarks/run_benchmarks.py --out bench.json
+#   python benchmarks/run_benchmarks.py --out new.json --compare bench.json
+#
+# Runs on a generated synthetic model with the deterministic
+# double-precision LP backend (--solver highs, default) or qMINOS.
+#============================================================
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from dynamicme.dynamic import DynamicME, ParamOpt, LocalMove, get_cplx_concs
+from synthetic import build_synthetic_me
+
+
+C0_DICT = {'glc__D_e': 20., 'o2_e': 0.21, 'ac_e': 0.}
+LB_DICT = {'EX_glc__D_e': -10., 'EX_o2_e': -20., 'EX_ac_e': -10.}
+
+
+def timeit(func, repeat=3):
+    """
+    Run func repeat times. Returns dict of timings (secs).
+    """
+    times = []
+    for i in range(repeat):
+        tic = time.time()
+        func()
+        times.append(time.time() - tic)
+    return {'min': min(times), 'median': float(np.median(times)),
+            'mean': float(np.mean(times)), 'repeat': repeat}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       cwd=HERE).decode().strip()
+    except Exception:
+        return None
+
+
+def make_sim_params(T, dt):
+    return {'T': T, 'dt': dt, 'X0': 0.01,
+            'c0_dict': dict(C0_DICT),
+            'lb_dict': dict(LB_DICT),
+            'ub_dict': {},
+            'extra_rxns_tracked': ['translation', 'P0_out', 'P1_out'],
+            'ZERO_CONC': 1e-3}
+
+
+def run(args):
+    np.random.seed(args.seed)
+    backend = args.solver
+    me = build_synthetic_me(n_pathways=args.n_pathways,
+                            chain_length=args.chain_length, seed=args.seed)
+    results = {}
+
+    #----------------------------------------------------
+    # Dynamic loop at various dt and T
+    for T, dt in [(2., 0.5), (4., 0.25), (4., 0.1)]:
+        sim = make_sim_params(T, dt)
+        def sim_batch():
+            dyme = DynamicME(me, backend=backend, exchange_one_rxn=True)
+            dyme.simulate_batch(T, dict(sim['c0_dict']), sim['X0'], dt=dt,
+                                lb_dict=dict(sim['lb_dict']),
+                                extra_rxns_tracked=sim['extra_rxns_tracked'],
+                                prec_bs=args.prec_bs, verbosity=0)
+        results['simulate_batch[T=%g,dt=%g]' % (T, dt)] = timeit(sim_batch, args.repeat)
+
+    #----------------------------------------------------
+    # Proteome extraction
+    dyme = DynamicME(me, backend=backend, exchange_one_rxn=True)
+    sim = make_sim_params(2., 0.5)
+    result_ref = dyme.simulate_batch(sim['T'], dict(sim['c0_dict']), sim['X0'],
+                                     dt=sim['dt'], lb_dict=dict(sim['lb_dict']),
+                                     extra_rxns_tracked=sim['extra_rxns_tracked'],
+                                     prec_bs=args.prec_bs, verbosity=0)
+    results['get_cplx_concs'] = timeit(lambda: get_cplx_concs(dyme), args.repeat*10)
+
+    #----------------------------------------------------
+    # Scoring
+    popt = ParamOpt(me, sim, exchange_one_rxn=True, backend=backend)
+    df_sim = popt.compute_conc_profile(result_ref)
+    df_meas = df_sim.copy()
+    variables = ['glc__D_e', 'ac_e', 'biomass']
+    for col in variables:
+        df_meas[col] = df_meas[col] * (1 + 0.05*np.random.randn(len(df_meas)))
+    results['calc_error_conc'] = timeit(
+        lambda: popt.calc_error_conc(df_sim, df_meas, variables), args.repeat*10)
+
+    #----------------------------------------------------
+    # Local moves
+    pert_rxns = [r.id for r in me.reactions if getattr(r, 'keff', None) is not None]
+    mover = LocalMove(me)
+    def move_unmove():
+        mover.move(me, pert_rxns)
+        mover.unmove(me)
+    results['LocalMove.move+unmove'] = timeit(move_unmove, args.repeat*10)
+
+    #----------------------------------------------------
+    # Short fit
+    keffs0 = {rid: me.reactions.get_by_id(rid).keff for rid in pert_rxns}
+    def fit():
+        np.random.seed(args.seed)
+        popt.fit_profile(df_meas, pert_rxns, variables, result0=result_ref,
+                         max_iter_phase1=2, max_iter_phase2=2, verbosity=0)
+        popt.update_keffs(keffs0)
+    results['fit_profile[2+2]'] = timeit(fit, 1)
+    def fit_multi():
+        np.random.seed(args.seed)
+        popt.fit_profile(df_meas, pert_rxns, variables, result0=result_ref,
+                         max_iter_phase1=2, max_iter_phase2=2, verbosity=0,
+                         fidelity='multi')
+        popt.update_keffs(keffs0)
+    results['fit_profile[2+2,multi]'] = timeit(fit_multi, 1)
+
+    out = {'commit': git_commit(),
+           'python': platform.python_version(),
+           'platform': platform.platform(),
+           'solver': args.solver,
+           'model': {'n_reactions': len(me.reactions),
+                     'n_metabolites': len(me.metabolites),
+                     'n_complexes': len(me.complex_data)},
+           'results': results}
+    return out
+
+
+def compare(new, old, threshold):
+    """
+    Print ratio of new/old median times. Returns names of regressions.
+    """
+    regressions = []
+    for name, res in sorted(new['results'].items()):
+        if name not in old['results']:
+            continue
+        ratio = res['median'] / max(old['results'][name]['median'], 1e-12)
+        flag = ''
+        if ratio > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print('%-36s %10.4g s  x%.2f%s' % (name, res['median'], ratio, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='dynamicme benchmarks')
+    parser.add_argument('--out', default='bench.json')
+    parser.add_argument('--compare', default=None,
+                        help='baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='ratio of median times flagged as regression')
+    parser.add_argument('--solver', default='highs', choices=['highs', 'qminos'])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--n-pathways', type=int, default=4)
+    parser.add_argument('--chain-length', type=int, default=3)
+    parser.add_argument('--prec-bs', type=float, default=1e-3)
+    args = parser.parse_args()
+
+    out = run(args)
+    with open(args.out, 'w') as f:
+        json.dump(out, f, indent=2, sort_keys=True)
+    print('Wrote %s' % args.out)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            old = json.load(f)
+        regressions = compare(out, old, args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+#============================================================
+# File synthetic.py
+#
+# class  SyntheticMEModel
+#
+# Small generated ME-style model for offline benchmarks.
+#============================================================
+
+from cobra import Model, Reaction, Metabolite, DictList
+from cobrame import mu
+
+import numpy as np
+
+
+class SyntheticComplexData(object):
+    """
+    Minimal stand-in for cobrame ComplexData
+    """
+    def __init__(self, cplx, formation, n_aa):
+        self.id = cplx.id
+        self.complex = cplx
+        self.complex_id = cplx.id
+        self.formation = formation
+        self.stoichiometry = {'prot_c': n_aa}
+        self.modifications = {}
+
+
+class SyntheticReaction(Reaction):
+    """
+    Reaction coupled to its complex by -mu/keff/3600, like cobrame
+    MetabolicReaction
+    """
+    def __init__(self, id, keff=None, cplx=None):
+        Reaction.__init__(self, id)
+        self.keff = keff
+        self.complex = cplx
+
+    def update(self, verbose=True):
+        if self.complex is not None:
+            self.add_metabolites({self.complex: -mu/self.keff/3600.}, combine=False)
+
+
+class SyntheticMEModel(Model):
+    """
+    Model with complex_data, as used by dynamicme
+    """
+    def __init__(self, id):
+        Model.__init__(self, id)
+        self.complex_data = DictList()
+
+
+def build_synthetic_me(n_pathways=4, chain_length=3, seed=0):
+    """
+    me = build_synthetic_me(n_pathways=4, chain_length=3, seed=0)
+
+    Coarse ME-style model: glucose is converted to precursors and ATP by
+    n_pathways alternative enzyme chains (even: fermentative, secreting
+    acetate; odd: respiratory). Every enzyme is a complex formed from
+    protein, which is translated by a ribosome complex. Growth is the
+    fixed-flux biomass_dilution reaction (lb = ub = mu).
+    Model size scales with n_pathways * chain_length.
+    """
+    rs = np.random.RandomState(seed)
+    me = SyntheticMEModel('synthetic_me')
+
+    mets = {}
+    def met(mid):
+        if mid not in mets:
+            mets[mid] = Metabolite(mid)
+        return mets[mid]
+
+    rxns = []
+    def add_rxn(rid, stoich, lb=0., ub=1000., keff=None):
+        if keff is not None:
+            cplx = met('CPLX_' + rid)
+            rxn = SyntheticReaction(rid, keff=keff, cplx=cplx)
+        else:
+            rxn = Reaction(rid)
+        rxn.lower_bound = lb
+        rxn.upper_bound = ub
+        rxn.add_metabolites({met(m):v for m,v in stoich.items()})
+        rxns.append(rxn)
+        return rxn
+
+    # Exchanges (one reversible exchange per metabolite, as ME 2.0)
+    add_rxn('EX_glc__D_e', {'glc__D_e':-1}, lb=-10.)
+    add_rxn('EX_o2_e', {'o2_e':-1}, lb=-20.)
+    add_rxn('EX_ac_e', {'ac_e':-1}, lb=-10.)
+    add_rxn('O2t', {'o2_e':-1, 'o2_c':1})
+    add_rxn('ACex', {'ac_c':-1, 'ac_e':1})
+    catalyzed = []
+    catalyzed.append(add_rxn('GLCt', {'glc__D_e':-1, 'g_c':1}, keff=rs.uniform(50,150)))
+    catalyzed.append(add_rxn('ACup', {'ac_e':-1, 'o2_c':-1, 'pre_c':0.5, 'atp_c':1},
+                             keff=rs.uniform(20,60)))
+
+    for p in range(n_pathways):
+        prev = 'g_c'
+        for k in range(chain_length):
+            cur = 'm_%d_%d_c' % (p, k)
+            catalyzed.append(add_rxn('P%d_R%d' % (p, k), {prev:-1, cur:1},
+                                     keff=rs.uniform(20,200)))
+            prev = cur
+        if p % 2 == 0:
+            stoich = {prev:-1, 'pre_c':1, 'atp_c':2, 'ac_c':1}
+        else:
+            stoich = {prev:-1, 'o2_c':-2, 'pre_c':1, 'atp_c':1 + 2*rs.uniform(1,2)}
+        catalyzed.append(add_rxn('P%d_out' % p, stoich, keff=rs.uniform(20,200)))
+
+    ribo = add_rxn('translation', {'pre_c':-1, 'atp_c':-4, 'prot_c':1}, keff=rs.uniform(10,20))
+    catalyzed.append(ribo)
+    add_rxn('ATPM', {'atp_c':-1}, lb=1.)
+    add_rxn('PREsink', {'pre_c':-1})
+    dil = add_rxn('biomass_dilution', {'pre_c':-10, 'atp_c':-30, 'prot_c':-5})
+    dil.lower_bound = mu
+    dil.upper_bound = mu
+
+    # Complex formation from protein
+    for rxn in catalyzed:
+        n_aa = rs.uniform(100, 600) / 1000.
+        form = add_rxn('formation_' + rxn.complex.id, {'prot_c':-n_aa, rxn.complex.id:1})
+        me.complex_data.append(SyntheticComplexData(rxn.complex, form, n_aa))
+
+    me.add_reactions(rxns)
+    for rxn in catalyzed:
+        rxn.update()
+    # Parsimony: maximize glucose exchange flux, i.e., minimize uptake
+    me.reactions.get_by_id('EX_glc__D_e').objective_coefficient = 1.
+
+    return me
@@ -0,0 +1,262 @@
+#============================================================
+# File backends.py
+#
+# class  LPBackend
+#
+# Solver backends for DynamicME. A backend is a class constructed as
+# backend(me, growth_key=growth_key) that provides the ME_NLP1
+# interface used by dynamicme: bisectmu, solvelp, make_lp,
+# construct_S, compile_expr, compiled_expressions,
+# substitution_dict, subs_keys_ordered.
+#============================================================
+
+from functools import partial
+from six import iteritems, string_types
+
+from dynamicme.log import SimLogger
+
+import numpy as np
+import scipy.sparse as sps
+import sympy
+
+
+def _qminos_backend():
+    from qminospy.me1 import ME_NLP1
+    return ME_NLP1
+
+
+def get_backend(backend=None):
+    """
+    backend_class = get_backend(backend)
+
+    backend: None or 'qminos': qminospy ME_NLP1 (quad precision)
+             'highs':           LPBackend, double precision HiGHS LPs at fixed mu
+             'highs-verify':    LPBackend, verifying mu_opt with qMINOS
+             a class or callable backend(me, growth_key=...)
+    """
+    if backend is None or backend == 'qminos':
+        return _qminos_backend()
+    if isinstance(backend, string_types):
+        if backend == 'highs':
+            return LPBackend
+        elif backend == 'highs-verify':
+            return partial(LPBackend, verify=True)
+        else:
+            raise ValueError('Unknown backend: %s' % backend)
+    return backend
+
+
+class LPBackend(object):
+    """
+    Fixed-mu LP backend.
+
+    Substitutes mu (and other symbols) numerically into the compiled
+    ME problem and solves the resulting LP in double precision with
+    scipy.optimize.linprog (HiGHS by default). Max mu by bisection.
+
+    backend = LPBackend(me, growth_key='mu', method='highs', verify=False)
+
+    verify: if True, check mu_opt with qMINOS (quad precision) at the end
+            of bisectmu, backing off mu until qMINOS finds it feasible.
+            The returned solution and basis are then qMINOS's.
+    substitution_dict: values of symbols other than mu
+    """
+    def __init__(self, me, growth_key='mu', method='highs', verify=False,
+                 substitution_dict=None, verify_max_backoff=10):
+        self.me = me
+        self.growth_key = growth_key
+        self.method = method
+        self.verify = verify
+        self.verify_max_backoff = verify_max_backoff
+        self.lp_hs = None
+        self.feas_basis = None
+        self._verifier = None
+
+        # Symbols in stoichiometries and bounds. mu first.
+        symbols = {}
+        for rxn in me.reactions:
+            exprs = list(rxn.metabolites.values()) + [rxn.lower_bound, rxn.upper_bound]
+            for expr in exprs:
+                if hasattr(expr, 'free_symbols'):
+                    for sym in expr.free_symbols:
+                        symbols[str(sym)] = sym
+        keys = sorted(k for k in symbols if k != growth_key)
+        self.subs_keys_ordered = [growth_key] + keys
+        if growth_key in symbols:
+            self._symbols = [symbols[k] for k in self.subs_keys_ordered]
+        else:
+            self._symbols = [sympy.Symbol(growth_key)] + [symbols[k] for k in keys]
+        self.substitution_dict = {k:1. for k in self.subs_keys_ordered}
+        if substitution_dict is not None:
+            self.substitution_dict.update(substitution_dict)
+        self.substitution_dict[growth_key] = 0.
+
+        # Numeric part of S once; symbolic entries compiled
+        self.compiled_expressions = {}
+        rows = []
+        cols = []
+        vals = []
+        for j,rxn in enumerate(me.reactions):
+            for met,s in iteritems(rxn.metabolites):
+                i = me.metabolites.index(met)
+                if hasattr(s, 'subs'):
+                    self.compiled_expressions[(i,j)] = self.compile_expr(s)
+                else:
+                    rows.append(i)
+                    cols.append(j)
+                    vals.append(float(s))
+        self._S_numeric = (np.array(rows, dtype=int), np.array(cols, dtype=int),
+                           np.array(vals))
+
+    def compile_expr(self, expr):
+        return sympy.lambdify(self._symbols, expr, modules='numpy')
+
+    def _sub_vals(self, mu_fix):
+        self.substitution_dict[self.growth_key] = mu_fix
+        return [self.substitution_dict[k] for k in self.subs_keys_ordered]
+
+    def construct_S(self, mu_fix):
+        """
+        Stoichiometric matrix (sparse) at mu_fix
+        """
+        sub_vals = self._sub_vals(mu_fix)
+        rows, cols, vals = self._S_numeric
+        sym_keys = [k for k in self.compiled_expressions if k[1] is not None]
+        sym_rows = np.array([k[0] for k in sym_keys], dtype=int)
+        sym_cols = np.array([k[1] for k in sym_keys], dtype=int)
+        sym_vals = np.array([float(self.compiled_expressions[k](*sub_vals)) for k in sym_keys])
+        shape = (len(self.me.metabolites), len(self.me.reactions))
+        return sps.coo_matrix((np.concatenate([vals, sym_vals]),
+                               (np.concatenate([rows, sym_rows]),
+                                np.concatenate([cols, sym_cols]))), shape=shape)
+
+    def make_lp(self, mu_fix):
+        """
+        S, b, c, xl, xu, csense = make_lp(mu_fix)
+        """
+        me = self.me
+        sub_vals = self._sub_vals(mu_fix)
+        subs = dict(zip(self._symbols, sub_vals))
+        S = self.construct_S(mu_fix).tocsc()
+
+        def num(val):
+            if hasattr(val, 'subs'):
+                return float(val.subs(subs))
+            return float(val)
+
+        xl = np.array([num(r.lower_bound) for r in me.reactions])
+        xu = np.array([num(r.upper_bound) for r in me.reactions])
+        c = np.array([r.objective_coefficient for r in me.reactions], dtype=float)
+        b = np.zeros(len(me.metabolites))
+        csense = ['E' for m in me.metabolites]
+        for i,met in enumerate(me.metabolites):
+            if hasattr(met, '_bound'):
+                b[i] = num(met._bound)
+            if hasattr(met, '_constraint_sense'):
+                csense[i] = met._constraint_sense
+        # Constraints added after construction (e.g., proteome inertia)
+        for key, val in iteritems(self.compiled_expressions):
+            if key[1] is None:
+                expr, sense = val
+                b[key[0]] = float(expr(*sub_vals))
+                csense[key[0]] = sense
+
+        return S, b, c, xl, xu, csense
+
+    def solvelp(self, muf, basis=None, verbosity=0, **kwargs):
+        """
+        x, stat, hs = solvelp(muf)
+
+        Solve LP at fixed mu. basis is ignored (HiGHS warm starts are not
+        exposed through linprog); hs is None.
+        """
+        from scipy.optimize import linprog
+
+        S, b, c, xl, xu, csense = self.make_lp(muf)
+        S = sps.csr_matrix(S)
+        b = np.ravel(b)
+        csense = np.array(csense)
+        eq = csense == 'E'
+        le = csense == 'L'
+        ge = csense == 'G'
+        A_ub = None
+        b_ub = None
+        if le.any() or ge.any():
+            A_ub = sps.vstack([S[le], -S[ge]]).tocsr()
+            b_ub = np.concatenate([b[le], -b[ge]])
+        bounds = np.column_stack([np.ravel(xl), np.ravel(xu)])
+        res = linprog(-np.ravel(c), A_ub=A_ub, b_ub=b_ub, A_eq=S[eq], b_eq=b[eq],
+                      bounds=bounds, method=self.method)
+        if res.status == 0:
+            return res.x, 'optimal', None
+        return None, 'infeasible', None
+
+    def bisectmu(self, precision=1e-3, mumin=0., mumax=2., basis=None,
+                 verbosity=0, **kwargs):
+        """
+        mu_opt, hs, x_opt, cache = bisectmu(precision)
+        """
+        slog = SimLogger(verbosity)
+        x_opt = None
+        mu_opt = mumin
+        mu_lo = mumin
+        mu_hi = mumax
+        while mu_hi - mu_lo > precision:
+            mu_mid = 0.5*(mu_lo + mu_hi)
+            x, stat, hs = self.solvelp(mu_mid)
+            slog.debug('mu=%g: %s', mu_mid, stat)
+            if stat == 'optimal':
+                mu_lo = mu_mid
+                mu_opt = mu_mid
+                x_opt = x
+            else:
+                mu_hi = mu_mid
+        if x_opt is None:
+            x_opt, stat, hs = self.solvelp(mumin)
+
+        hs = None
+        if self.verify:
+            mu_opt, hs, x_opt = self.verify_mu(mu_opt, precision, mumin, basis, x_opt)
+
+        cache = None
+        if x_opt is None:
+            cache = {'infeasible': True}
+        self.substitution_dict[self.growth_key] = mu_opt
+        return mu_opt, hs, x_opt, cache
+
+    def verify_mu(self, mu_opt, precision, mumin=0., basis=None, x_opt=None):
+        """
+        mu, hs, x = verify_mu(mu_opt, precision)
+
+        Check mu_opt with qMINOS. If infeasible in quad precision,
+        back off by precision (at most verify_max_backoff times), then
+        try mumin. Returns the last mu qMINOS found feasible with its
+        basis and solution, or mumin, None, None if none was.
+        """
+        if self._verifier is None:
+            verifier = _qminos_backend()(self.me, growth_key=self.growth_key)
+            # Use the same bounds as this backend (which DynamicME may
+            # have routed through its own bound arrays)
+            make_lp_full = verifier.make_lp
+            def make_lp(mu_fix, *args, **kwargs):
+                S, b, c, xl, xu, csense = make_lp_full(mu_fix, *args, **kwargs)
+                lp = self.make_lp(mu_fix)
+                xl = np.reshape(lp[3], np.shape(xl))
+                xu = np.reshape(lp[4], np.shape(xu))
+                return S, b, c, xl, xu, csense
+            verifier.make_lp = make_lp
+            self._verifier = verifier
+        verifier = self._verifier
+        mu_test = mu_opt
+        for i in range(self.verify_max_backoff+1):
+            x, stat, hs = verifier.solvelp(mu_test, basis=basis, verbosity=0)
+            if stat == 'optimal':
+                return mu_test, hs, x
+            if mu_test <= mumin:
+                return mumin, None, None
+            mu_test = max(mu_test - precision, mumin)
+        # Backoff exhausted: only mumin is left to try
+        x, stat, hs = verifier.solvelp(mumin, basis=basis, verbosity=0)
+        if stat == 'optimal':
+            return mumin, hs, x
+        return mumin, None, None
@@ -0,0 +1,188 @@
+#============================================================
+# File basis.py
+#
+# class  BasisLibrary
+#
+# Compact storage of LP bases (hs) for warm starts.
+#============================================================
+
+from collections import OrderedDict
+
+import hashlib
+import os
+import tempfile
+import numpy as np
+
+
+def compact_basis(hs):
+    """
+    (hs, dtype) = compact_basis(hs)
+
+    Compact copy of basis hs: int8 if its values fit, with the original
+    dtype for expand_basis. None if hs is None.
+    """
+    if hs is None:
+        return None
+    hs = np.asarray(hs)
+    dtype = hs.dtype.str
+    if hs.size and hs.dtype.kind in 'iu' and hs.min() >= -128 and hs.max() <= 127:
+        hs = hs.astype(np.int8)
+    else:
+        hs = hs.copy()
+    return hs, dtype
+
+
+def expand_basis(compact, default=None):
+    """
+    hs = expand_basis(compact, default=None)
+
+    Basis from compact_basis output, in its original dtype.
+    default if compact is None.
+    """
+    if compact is None:
+        return default
+    hs, dtype = compact
+    return np.asarray(hs, dtype=np.dtype(dtype))
+
+
+#============================================================
+# Persistent basis library
+
+BASIS_DIR_ENV = 'DYNAMICME_BASIS_DIR'
+
+_default_library = {'library': None, 'checked': False}
+
+
+def get_default_library():
+    """
+    Library used by DynamicME when none is given: the one set by
+    set_default_library, else a BasisLibrary in $DYNAMICME_BASIS_DIR
+    if that is set, else None (no library).
+    """
+    if _default_library['library'] is None and not _default_library['checked']:
+        path = os.environ.get(BASIS_DIR_ENV)
+        if path:
+            _default_library['library'] = BasisLibrary(path)
+        _default_library['checked'] = True
+    return _default_library['library']
+
+
+def set_default_library(library):
+    """
+    Set (or, with None, clear) the default BasisLibrary
+    """
+    _default_library['library'] = library
+    _default_library['checked'] = True
+
+
+def basis_key(model_hash, growth_key, exchange_sig):
+    """
+    Library key for a model, growth key and exchange open/closed signature
+    """
+    h = hashlib.sha1()
+    for part in [model_hash, growth_key, exchange_sig]:
+        h.update(str(part).encode('utf-8') + b'|')
+    return h.hexdigest()
+
+
+class BasisLibrary(object):
+    """
+    Size-bounded store of LP bases (hs), kept in memory and, if path is
+    given, in one file per key under path (persists across processes
+    and restarts). Least recently used entries are evicted beyond
+    max_entries.
+
+    lib = BasisLibrary(path=None, max_entries=256)
+    lib.put(key, hs)
+    hs = lib.get(key)       # None if not found
+
+    Keys are built by basis_key (see DynamicME.basis_key).
+    """
+    def __init__(self, path=None, max_entries=256):
+        self.path = path
+        self.max_entries = max_entries
+        self._mem = OrderedDict()
+        self.n_hits = 0
+        self.n_misses = 0
+        if path is not None and not os.path.isdir(path):
+            os.makedirs(path)
+
+    def _file(self, key):
+        return os.path.join(self.path, key + '.npz')
+
+    def get(self, key):
+        """
+        Basis stored under key, or None
+        """
+        compact = self._mem.get(key)
+        if compact is not None:
+            self._mem.move_to_end(key)
+        elif self.path is not None:
+            fname = self._file(key)
+            try:
+                with np.load(fname) as data:
+                    compact = (data['hs'], str(data['dtype']))
+                os.utime(fname, None)
+            except (IOError, OSError, KeyError, ValueError):
+                compact = None
+            if compact is not None:
+                self._remember(key, compact)
+        if compact is None:
+            self.n_misses += 1
+            return None
+        self.n_hits += 1
+        return expand_basis(compact)
+
+    def put(self, key, hs):
+        """
+        Store basis hs under key. Writes to disk only if it changed.
+        """
+        compact = compact_basis(hs)
+        if compact is None:
+            return
+        old = self._mem.get(key)
+        if old is not None and np.array_equal(old[0], compact[0]):
+            self._mem.move_to_end(key)
+            return
+        self._remember(key, compact)
+        if self.path is not None:
+            # Write atomically so concurrent readers never see partial files
+            fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.savez(f, hs=compact[0], dtype=np.array(compact[1]))
+                os.replace(tmp, self._file(key))
+            except (IOError, OSError):
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                return
+            if old is None:
+                self._evict_files()
+
+    def _remember(self, key, compact):
+        self._mem[key] = compact
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def _evict_files(self):
+        try:
+            files = [os.path.join(self.path, f) for f in os.listdir(self.path)
+                     if f.endswith('.npz')]
+            if len(files) <= self.max_entries:
+                return
+            files.sort(key=os.path.getmtime)
+            for fname in files[:len(files) - self.max_entries]:
+                os.remove(fname)
+        except OSError:
+            pass
+
+    def clear(self):
+        """
+        Remove all entries (including files)
+        """
+        self._mem.clear()
+        if self.path is not None:
+            for f in os.listdir(self.path):
+                if f.endswith('.npz'):
+                    os.remove(os.path.join(self.path, f))
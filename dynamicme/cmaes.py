@@ -0,0 +1,150 @@
+#============================================================
+# File cmaes.py
+#
+# class  CMAES
+#
+# Covariance matrix adaptation evolution strategy, (mu/mu_w, lambda),
+# following Hansen, "The CMA Evolution Strategy: A Tutorial".
+#============================================================
+
+import numpy as np
+
+
+class CMAES(object):
+    """
+    Ask-and-tell CMA-ES minimizer.
+
+    es = CMAES(x0, sigma0, popsize=None, bounds=None, seed=None)
+    while not es.stop():
+        X = es.ask()
+        es.tell(X, [f(x) for x in X])
+
+    popsize: samples per generation, at least 2. Default: 4 + 3 ln(n)
+    bounds: (lower, upper) arrays (or scalars). Samples returned by ask
+            are clipped to the bounds.
+    seed:   seed or numpy Generator
+    """
+    def __init__(self, x0, sigma0, popsize=None, bounds=None, seed=None,
+                 tolx=1e-4, tolfun=1e-10):
+        x0 = np.asarray(x0, dtype=float).ravel()
+        n = len(x0)
+        self.n = n
+        self.mean = x0.copy()
+        self.sigma = float(sigma0)
+        self.tolx = tolx
+        self.tolfun = tolfun
+        if isinstance(seed, np.random.Generator):
+            self.rng = seed
+        else:
+            self.rng = np.random.default_rng(seed)
+        if bounds is None:
+            self.lower = np.full(n, -np.inf)
+            self.upper = np.full(n, np.inf)
+        else:
+            self.lower = np.broadcast_to(np.asarray(bounds[0], dtype=float), (n,)).copy()
+            self.upper = np.broadcast_to(np.asarray(bounds[1], dtype=float), (n,)).copy()
+
+        # Selection and recombination
+        lam = popsize if popsize is not None else 4 + int(3*np.log(n))
+        if lam < 2:
+            raise ValueError('popsize must be at least 2, got %s' % lam)
+        mu = lam // 2
+        weights = np.log(mu + 0.5) - np.log(np.arange(1, mu+1))
+        weights = weights / weights.sum()
+        mueff = 1. / np.sum(weights**2)
+        self.popsize = lam
+        self.mu = mu
+        self.weights = weights
+        self.mueff = mueff
+
+        # Adaptation
+        self.cc = (4 + mueff/n) / (n + 4 + 2*mueff/n)
+        self.cs = (mueff + 2) / (n + mueff + 5)
+        self.c1 = 2. / ((n + 1.3)**2 + mueff)
+        self.cmu = min(1 - self.c1, 2*(mueff - 2 + 1/mueff) / ((n + 2)**2 + mueff))
+        self.damps = 1 + 2*max(0, np.sqrt((mueff - 1)/(n + 1)) - 1) + self.cs
+        self.chiN = np.sqrt(n) * (1 - 1./(4*n) + 1./(21*n**2))
+
+        self.pc = np.zeros(n)
+        self.ps = np.zeros(n)
+        self.B = np.eye(n)
+        self.D = np.ones(n)
+        self.C = np.eye(n)
+        self.invsqrtC = np.eye(n)
+        self.eigeneval = 0
+        self.counteval = 0
+        self.generation = 0
+        self.fbest = np.inf
+        self.xbest = None
+        self._fhist = []
+
+    def ask(self):
+        """
+        Sample popsize candidates (rows), clipped to the bounds
+        """
+        Z = self.rng.standard_normal((self.popsize, self.n))
+        Y = np.dot(Z * self.D, self.B.T)
+        X = self.mean + self.sigma * Y
+        return np.clip(X, self.lower, self.upper)
+
+    def tell(self, X, fvals):
+        """
+        Update the distribution from candidates X and their objective values
+        """
+        X = np.asarray(X, dtype=float)
+        fvals = np.asarray(fvals, dtype=float)
+        n = self.n
+        self.counteval += len(fvals)
+        self.generation += 1
+
+        order = np.argsort(fvals)
+        if fvals[order[0]] < self.fbest:
+            self.fbest = fvals[order[0]]
+            self.xbest = X[order[0]].copy()
+        self._fhist.append(fvals[order[0]])
+
+        mean_old = self.mean
+        Xsel = X[order[:self.mu]]
+        self.mean = np.dot(self.weights, Xsel)
+        ymean = (self.mean - mean_old) / self.sigma
+
+        # Evolution paths
+        self.ps = (1 - self.cs)*self.ps + \
+            np.sqrt(self.cs*(2 - self.cs)*self.mueff) * np.dot(self.invsqrtC, ymean)
+        hsig = np.linalg.norm(self.ps) / \
+            np.sqrt(1 - (1 - self.cs)**(2*self.counteval/self.popsize)) / self.chiN < \
+            1.4 + 2./(n + 1)
+        self.pc = (1 - self.cc)*self.pc + \
+            hsig * np.sqrt(self.cc*(2 - self.cc)*self.mueff) * ymean
+
+        # Covariance
+        Ysel = (Xsel - mean_old) / self.sigma
+        rank_mu = np.dot(Ysel.T * self.weights, Ysel)
+        self.C = (1 - self.c1 - self.cmu)*self.C + \
+            self.c1*(np.outer(self.pc, self.pc) + (1 - hsig)*self.cc*(2 - self.cc)*self.C) + \
+            self.cmu*rank_mu
+
+        # Step size
+        self.sigma = self.sigma * np.exp((self.cs/self.damps) *
+                                         (np.linalg.norm(self.ps)/self.chiN - 1))
+
+        # Eigendecomposition, lazily (O(n^3))
+        if self.counteval - self.eigeneval > self.popsize/(self.c1 + self.cmu)/n/10:
+            self.eigeneval = self.counteval
+            self.C = np.triu(self.C) + np.triu(self.C, 1).T
+            D2, B = np.linalg.eigh(self.C)
+            D2 = np.maximum(D2, 1e-20)
+            self.D = np.sqrt(D2)
+            self.B = B
+            self.invsqrtC = np.dot(B / self.D, B.T)
+
+    def stop(self):
+        """
+        True if the step size or the recent objective range is below tolerance
+        """
+        if self.sigma * self.D.max() < self.tolx:
+            return True
+        fhist = self._fhist[-10:]
+        if len(fhist) >= 10 and max(fhist) - min(fhist) < self.tolfun:
+            return True
+        return False
@@ -0,0 +1,411 @@
+#============================================================
+# File community.py
+#
+# class  Community
+# class  CommunityMember
+#
+# Several DynamicME members (strains, knockouts) with their own
+# biomass in one shared medium. Each member lives in its own
+# persistent process, so per-step wall time is that of the
+# slowest member.
+#============================================================
+
+from collections import OrderedDict
+from six import iteritems
+from six.moves import cPickle as pickle
+
+from dynamicme.log import SimLogger
+
+import multiprocessing
+import traceback
+import numpy as np
+
+
+class CommunityMember(object):
+    """
+    Exchange bound state of one member for a shared medium with
+    metabolites metids. Solves the member's growth problem whenever
+    its exchange bounds change.
+
+    member = CommunityMember(dyme, metids, lb_dict={}, ub_dict={})
+    mu, v_net = member.solve(conc, caps={})
+
+    v_net: net exchange flux per metabolite (mmol/gDW/h, secretion positive)
+    """
+    def __init__(self, dyme, metids, lb_dict={}, ub_dict={},
+                 LB_DEFAULT=-1000., UB_DEFAULT=1000., ZERO_CONC=1e-3,
+                 prec_bs=1e-6):
+        self.dyme = dyme
+        self.metids = list(metids)
+        self.ZERO_CONC = ZERO_CONC
+        self.prec_bs = prec_bs
+        # Uptake is opened via lower bound (ME 2.0) or source upper bound (ME 1.0)
+        if dyme.exchange_one_rxn:
+            self.open_dict, self.open_default = dict(lb_dict), LB_DEFAULT
+        else:
+            self.open_dict, self.open_default = dict(ub_dict), UB_DEFAULT
+
+        ex_index = dyme.get_exchange_index(self.metids)
+        self.ind_in = ex_index['ind_in']
+        self.ind_out = ex_index['ind_out']
+        bound_rxns = ex_index['bound_rxns']
+        self.bound_ids = [(r.id if r is not None else None) for r in bound_rxns]
+        self.bound_pos = np.array([i for i,r in enumerate(bound_rxns) if r is not None],
+                                  dtype=int)
+        self.bound_inds = dyme.rxn_index([self.bound_ids[i] for i in self.bound_pos])
+        self.open_bnds = None
+
+        dyme.init_lp_bounds()
+        self.keffs_numeric0 = dict(dyme._keffs_numeric)
+        self.basis = None
+        self.mu = 0.
+        self.v_net = np.zeros(len(self.metids))
+        self.n_solves = 0
+
+    def capped_bounds(self, caps):
+        """
+        Open exchange bounds with uptake of metabolites in caps
+        ({met ID: max uptake rate, mmol/gDW/h}) capped:
+        lb >= -rate for ME 2.0, source ub <= rate for ME 1.0
+        """
+        if self.open_bnds is None:
+            self.open_bnds = np.array([self.open_dict.get(self.bound_ids[i], self.open_default)
+                                       for i in self.bound_pos])
+        if not caps:
+            return self.open_bnds
+        bnds = self.open_bnds.copy()
+        pos = list(self.bound_pos)
+        for metid, rate in iteritems(caps):
+            k = self.metids.index(metid)
+            if k in pos:
+                k = pos.index(k)
+                if self.dyme.exchange_one_rxn:
+                    bnds[k] = max(bnds[k], -rate)
+                else:
+                    bnds[k] = min(bnds[k], rate)
+        return bnds
+
+    def solve(self, conc, caps=None):
+        """
+        mu, v_net = solve(conc, caps=None)
+
+        Close exchanges of depleted metabolites, open the others (with
+        uptake capped by caps, see capped_bounds) and re-solve if any
+        bound changed. Caps apply to this solve only.
+        """
+        dyme = self.dyme
+        conc = np.asarray(conc, dtype=float)
+        depleted = conc[self.bound_pos] <= self.ZERO_CONC
+        bnds = np.where(depleted, 0., self.capped_bounds(caps))
+        if dyme.exchange_one_rxn:
+            bnds0 = dyme.xl[self.bound_inds]
+        else:
+            bnds0 = dyme.xu[self.bound_inds]
+        for k in np.flatnonzero(bnds != bnds0):
+            if dyme.exchange_one_rxn:
+                dyme.set_bounds(self.bound_inds[k], lb=bnds[k])
+            else:
+                dyme.set_bounds(self.bound_inds[k], ub=bnds[k])
+
+        if dyme.apply_bound_deltas() > 0 or self.n_solves == 0:
+            mu_opt, hs, x_opt, cache = dyme.solve_mu(self.prec_bs, basis=self.basis)
+            self.n_solves += 1
+            self.basis = hs
+            self.mu = mu_opt
+            dyme.set_solution_vector(x_opt, cache)
+            x_pad = dyme.padded_x()
+            if x_pad is None:
+                self.v_net = np.zeros(len(self.metids))
+            else:
+                self.v_net = x_pad[self.ind_out] - x_pad[self.ind_in]
+        return self.mu, self.v_net
+
+    def finish(self):
+        """
+        Leave the model with the final bounds and the keffs it started
+        with, as DynamicME.simulate_batch. Returns the number of solves.
+        """
+        dyme = self.dyme
+        if dyme.xl is None:
+            # Already finished
+            return self.n_solves
+        dyme.sync_bounds_to_model()
+        dyme.reset_keffs_numeric()
+        keffs0 = self.keffs_numeric0
+        if keffs0:
+            dyme.set_keffs_numeric(list(keffs0.keys()), list(keffs0.values()))
+        dyme.release_lp_bounds()
+        return self.n_solves
+
+
+#============================================================
+# Member processes
+
+def _dispatch(state, cmd, args):
+    if cmd == 'setup':
+        state['member'] = CommunityMember(state['dyme'], *args)
+        return None
+    if cmd == 'finish' and state['member'] is None:
+        return 0
+    return getattr(state['member'], cmd)(*args)
+
+
+def _member_main(conn, me_bytes, dyme_kwargs):
+    from dynamicme.dynamic import DynamicME
+
+    state = {'dyme': DynamicME(pickle.loads(me_bytes), **dyme_kwargs), 'member': None}
+    while True:
+        msg = conn.recv()
+        if msg[0] == 'close':
+            break
+        try:
+            conn.send(('ok', _dispatch(state, msg[0], msg[1])))
+        except Exception:
+            conn.send(('error', traceback.format_exc()))
+    conn.close()
+
+
+class _MemberProcess(object):
+    """
+    Persistent process holding one member's DynamicME
+    """
+    def __init__(self, dyme):
+        dyme_kwargs = {'growth_key': dyme.growth_key,
+                       'growth_rxn': dyme.growth_rxn,
+                       'exchange_one_rxn': dyme.exchange_one_rxn,
+                       'backend': dyme.backend}
+        me_bytes = pickle.dumps(dyme.me, protocol=pickle.HIGHEST_PROTOCOL)
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_member_main,
+                                               args=(child_conn, me_bytes, dyme_kwargs))
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+
+    def send(self, cmd, *args):
+        self.conn.send((cmd, args))
+
+    def recv(self):
+        status, out = self.conn.recv()
+        if status == 'error':
+            raise RuntimeError('Community member failed:\n' + out)
+        return out
+
+    def close(self):
+        try:
+            self.conn.send(('close',))
+        except (IOError, OSError):
+            pass
+        self.process.join()
+        self.conn.close()
+
+
+class _LocalMember(object):
+    """
+    In-process stand-in for _MemberProcess
+    """
+    def __init__(self, dyme):
+        self.state = {'dyme': dyme, 'member': None}
+        self._out = None
+
+    def send(self, cmd, *args):
+        self._out = _dispatch(self.state, cmd, args)
+
+    def recv(self):
+        return self._out
+
+    def close(self):
+        pass
+
+
+#============================================================
+class Community(object):
+    """
+    Community of DynamicME members sharing one extracellular medium.
+
+    comm = Community(OrderedDict([('wt', dyme_wt), ('ko', dyme_ko)]))
+    result = comm.simulate_batch(T, c0_dict, X0_dict)
+    comm.close()
+
+    members:   dict of name - DynamicME
+    processes: if True, each member is solved in its own persistent
+               process (started here, copying its model), concurrently
+               with the others. If False, members are solved in turn
+               in this process.
+    """
+    def __init__(self, members, processes=True):
+        self.members = OrderedDict(members)
+        self.processes = processes
+        if processes:
+            self._proxies = OrderedDict((name, _MemberProcess(dyme))
+                                        for name, dyme in iteritems(self.members))
+        else:
+            self._proxies = OrderedDict((name, _LocalMember(dyme))
+                                        for name, dyme in iteritems(self.members))
+
+    def _call_all(self, cmd, args_dict):
+        # Send to all members first so they work concurrently
+        for name, proxy in iteritems(self._proxies):
+            proxy.send(cmd, *args_dict[name])
+        # Collect every reply before raising, so no stale reply is
+        # left in a pipe for the next call
+        out = OrderedDict()
+        error = None
+        for name, proxy in iteritems(self._proxies):
+            try:
+                out[name] = proxy.recv()
+            except RuntimeError as e:
+                error = error or e
+        if error is not None:
+            raise error
+        return out
+
+    def simulate_batch(self, T, c0_dict, X0_dict, dt=0.1,
+                       o2_e_id='o2_e', o2_head=0.21, kLa=7.5,
+                       prec_bs=1e-6,
+                       ZERO_CONC=1e-3,
+                       lb_dict={},
+                       ub_dict={},
+                       member_lb_dict={},
+                       member_ub_dict={},
+                       LB_DEFAULT=-1000.,
+                       UB_DEFAULT=1000.,
+                       max_resets=5,
+                       max_halvings=10,
+                       verbosity=0,
+                       log_every=1):
+        """
+        result = simulate_batch(T, c0_dict, X0_dict)
+
+        Batch culture of all members in one medium.
+        [Arguments]
+        T:        batch time
+        c0_dict:  initial extracellular concentration dict (shared)
+        X0_dict:  initial biomass density per member name
+        lb_dict, ub_dict: exchange bounds for all members (see
+                  DynamicME.simulate_batch)
+        member_lb_dict, member_ub_dict: dict of member name - bound dict,
+                  overriding lb_dict, ub_dict for that member
+        max_resets: times a step is redone with capped uptake when a
+                  metabolite would fall below ZERO_CONC. What is left is
+                  shared among consumers in proportion to their uptake.
+                  Caps hold for that step only.
+        max_halvings: times the step is halved when max_resets capped
+                  redos were not enough. A RuntimeError is raised after.
+        Other arguments as DynamicME.simulate_batch.
+
+        [Output]
+        result: time, concentration (shared), and per time a dict of
+        member name - biomass, mu, ex_flux (dict of met ID - flux)
+        ----------------------------------------------------
+        dX_m/dt = mu_m*X_m
+        dc/dt = sum_m A*v_m*X_m
+        """
+        slog = SimLogger(verbosity, every=log_every)
+        names = list(self._proxies.keys())
+        metids = list(c0_dict.keys())
+        conc = np.array([c0_dict[metid] for metid in metids], dtype=float)
+        X = np.array([X0_dict[name] for name in names], dtype=float)
+        is_o2 = np.array([metid == o2_e_id for metid in metids], dtype=bool)
+
+        setup = {}
+        for name in names:
+            lbs = dict(lb_dict)
+            lbs.update(member_lb_dict.get(name, {}))
+            ubs = dict(ub_dict)
+            ubs.update(member_ub_dict.get(name, {}))
+            setup[name] = (metids, lbs, ubs, LB_DEFAULT, UB_DEFAULT, ZERO_CONC, prec_bs)
+        try:
+            self._call_all('setup', setup)
+
+            t_sim = 0.
+            iter_sim = 0
+            times = [t_sim]
+            conc_profile = [dict(zip(metids, conc))]
+            biomass_profile = [dict(zip(names, X))]
+            mu_profile = [{name:0. for name in names}]
+            ex_flux_profile = [{name:{metid:0. for metid in metids} for name in names}]
+
+            h = dt
+            caps = {name:{} for name in names}
+            n_resets = 0
+            n_halvings = 0
+            while t_sim < T:
+                out = self._call_all('solve', {name:(conc, caps[name]) for name in names})
+                mus = np.array([out[name][0] for name in names], dtype=float)
+                V = np.array([out[name][1] for name in names], dtype=float)
+
+                X_prime = X + mus*X*h
+                # mmol/L = sum over members of mmol/gDW/h * gDW/L * h
+                flows = V * X_prime[:,None] * h
+                conc_prime = conc + flows.sum(axis=0)
+                conc_prime[is_o2] = np.maximum(
+                    conc_prime[is_o2] + kLa*(o2_head - conc[is_o2])*h, 0.)
+
+                below = ~is_o2 & (conc_prime < (ZERO_CONC - prec_bs))
+                if below.any():
+                    if n_resets < max_resets:
+                        # Share what is left down to ZERO_CONC among consumers
+                        # in proportion to their uptake, then redo the step
+                        for i in np.flatnonzero(below):
+                            uptake = np.maximum(-flows[:,i], 0.)
+                            total = uptake.sum()
+                            if total <= 0:
+                                continue
+                            avail = max(conc[i] - ZERO_CONC, 0.)
+                            for m in np.flatnonzero(uptake > 0):
+                                caps[names[m]][metids[i]] = avail*uptake[m]/total/(X_prime[m]*h)
+                            slog.info('%s below threshold, capping uptake and resetting step',
+                                      metids[i])
+                        n_resets += 1
+                        continue
+                    if n_halvings < max_halvings:
+                        # Caps were not enough: redo with half the step, fresh caps
+                        h = 0.5*h
+                        caps = {name:{} for name in names}
+                        n_resets = 0
+                        n_halvings += 1
+                        slog.info('Uptake caps not enough, halving step to %g', h)
+                        continue
+                    raise RuntimeError('%s below ZERO_CONC after %d resets and %d step halvings'
+                                       ' at t=%g' % (', '.join(np.array(metids)[below]),
+                                                     max_resets, max_halvings, t_sim))
+
+                X = X_prime
+                conc = conc_prime
+                t_sim = t_sim + h
+                iter_sim = iter_sim + 1
+                h = dt
+                caps = {name:{} for name in names}
+                n_resets = 0
+                n_halvings = 0
+                times.append(t_sim)
+                conc_profile.append(dict(zip(metids, conc)))
+                biomass_profile.append(dict(zip(names, X)))
+                mu_profile.append(dict(zip(names, mus)))
+                ex_flux_profile.append({name:dict(zip(metids, V[m]))
+                                        for m, name in enumerate(names)})
+                slog.record('community_step', iter_step=iter_sim-1, t=t_sim,
+                            biomass=biomass_profile[-1], mu=mu_profile[-1])
+        finally:
+            # Release bound routing and deltas in every member on any exit
+            n_solves = self._call_all('finish', {name:() for name in names})
+
+        result = {'time':times,
+                  'concentration':conc_profile,
+                  'biomass':biomass_profile,
+                  'mu':mu_profile,
+                  'ex_flux':ex_flux_profile,
+                  'n_solves':dict(n_solves)}
+        self.result = result
+        return result
+
+    def close(self):
+        for proxy in self._proxies.values():
+            proxy.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
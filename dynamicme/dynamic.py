@@ -22,9 +22,20 @@ from cobrame import MetabolicReaction, TranslationReaction, MEReaction
 from cobrame import MEModel
 from cobrame import Complex, ComplexFormation, GenericFormationReaction
 
-from qminospy.me1 import ME_NLP1
-
 from dynamicme.model import ComplexDegradation, PeptideDegradation
+from dynamicme.model import get_complex_index, model_hash
+from dynamicme.parallel import lp_bound_arrays, _checkmu_task
+from dynamicme.parallel import WorkerPool, _score_condition_task, _lbta_epoch_task
+from dynamicme.parallel import _score_keffs_task, _sweep_chunk_task, _fva_task
+from dynamicme.parallel import _residuals_task
+from dynamicme.kinetics import UptakeKinetics
+from dynamicme.profiling import NullProfiler
+from dynamicme.log import SimLogger
+from dynamicme.backends import get_backend
+from dynamicme.surrogate import RandomFeatureSurrogate
+from dynamicme.cmaes import CMAES
+from dynamicme.basis import compact_basis, expand_basis
+from dynamicme.basis import basis_key, get_default_library
 
 from sympy import Basic
 
@@ -33,6 +44,7 @@ import numpy as np
 import copy as cp
 import pandas as pd
 import time
+import itertools
 import warnings
 import cobra
 import cobrame
@@ -69,22 +81,526 @@ class DynamicME(object):
     """
 
     def __init__(self, me, growth_key='mu', growth_rxn='biomass_dilution',
-                 exchange_one_rxn=None):
+                 exchange_one_rxn=None, backend=None, basis_library=None):
+        """
+        backend: 'qminos' (default, qminospy ME_NLP1), 'highs', 'highs-verify',
+                 or a solver class constructed as backend(me, growth_key=growth_key).
+                 See dynamicme.backends.
+        basis_library: BasisLibrary used to look up and deposit bases by
+                 open/closed exchange set. Default:
+                 dynamicme.basis.get_default_library() (None unless set or
+                 $DYNAMICME_BASIS_DIR is defined).
+        """
         self.me = me
         is_me2 = isinstance(me, MEModel)
         if exchange_one_rxn is None:
             exchange_one_rxn = is_me2
         self.exchange_one_rxn = exchange_one_rxn
 
-        self.solver = ME_NLP1(me, growth_key=growth_key)
+        self.growth_key = growth_key
         self.growth_rxn = growth_rxn
-        self.me_nlp = self.solver   # for backward compat
+        self.set_backend(backend)
 
         self.mm_model = None    # Used for proteome-constrained sub simulation
 
+        self.x = None           # Primal solution vector, ordered as me.reactions
+
+        # LP bound arrays owned by DynamicME. Bound changes are recorded as
+        # deltas and pushed into these arrays, never through cobra setters.
+        self.xl = None
+        self.xu = None
+        self._bound_exprs = []      # (index, is_upper, expr) for mu-dependent bounds
+        self._bound_deltas = {}     # {index: (lb, ub)} pending changes
+        self._bounds_touched = set()
+        self._make_lp_full = None
+        self._lp_cache = None
+        self.objective_override = None  # {rxn index: coefficient} replacing the model objective
+
+        self.uptake_kinetics = None # Used if conc_dep_fluxes is True
+        self._keff_exprs0 = {}      # {rid: (keff0, [(key, expr0, mu_expr)])} before numeric keff updates
+        self._keffs_numeric = {}    # {rid: keff} currently set by set_keffs_numeric
+
+        if basis_library is None:
+            basis_library = get_default_library()
+        self.basis_library = basis_library
+        self._exchange_inds = None  # Exchange rxns in the basis library key
+        self._basis_key = None      # Library key of the last deposited basis
+
 
     def __getattr__(self, attr):
-        return getattr(self.solver, attr)
+        solver = self.__dict__.get('solver')
+        if solver is None:
+            raise AttributeError(attr)
+        return getattr(solver, attr)
+
+    def set_backend(self, backend=None):
+        """
+        Select the solver backend for subsequent runs (see __init__)
+        """
+        backend = get_backend(backend)
+        self.backend = backend
+        self.solver = backend(self.me, growth_key=self.growth_key)
+        self.me_nlp = self.solver   # for backward compat
+        # Bound arrays and LP cache belong to the previous solver
+        self.xl = None
+        self.xu = None
+        self._make_lp_full = None
+        self._lp_cache = None
+
+    @property
+    def x_dict(self):
+        """
+        Solution as {rxn.id: flux}. Materialized on demand from self.x.
+        """
+        if self.x is None:
+            return None
+        return {rxn.id:self.x[j] for j,rxn in enumerate(self.me.reactions)}
+
+    def set_solution_vector(self, x_opt, cache=None):
+        """
+        Store primal solution as vector ordered as me.reactions.
+        Falls back to me.solution if solver returned no vector, unless
+        cache (from solve_mu) marks the problem infeasible.
+        """
+        me = self.me
+        n_rxn = len(me.reactions)
+        if x_opt is None:
+            if me.solution is None or (isinstance(cache, dict) and cache.get('infeasible')):
+                self.x = None
+                return self.x
+            x_opt = me.solution.x
+        self.x = np.asarray(x_opt, dtype=float).ravel()[:n_rxn]
+        return self.x
+
+    def rxn_index(self, rxns):
+        """
+        inds = rxn_index(rxns)
+
+        Integer positions of reactions (objects or IDs) in me.reactions.
+        Reactions not in the model get index len(me.reactions), which
+        points to the zero appended by padded_x().
+        """
+        me = self.me
+        n_rxn = len(me.reactions)
+        inds = []
+        for r in rxns:
+            rid = r.id if hasattr(r,'id') else r
+            if me.reactions.has_id(rid):
+                inds.append(me.reactions.index(rid))
+            else:
+                inds.append(n_rxn)
+        return np.array(inds, dtype=int)
+
+    def padded_x(self):
+        """
+        Solution vector with a trailing zero for missing-reaction indices.
+        Returns None if no solution.
+        """
+        if self.x is None:
+            return None
+        return np.append(self.x, 0.)
+
+    def init_lp_bounds(self):
+        """
+        Initialize LP bound arrays from the model and route the solver's
+        LP construction through self.make_lp, which uses these arrays.
+        Call again to re-sync after changing cobra reaction bounds directly.
+        Undone by release_lp_bounds (simulate_batch releases on return).
+        """
+        solver = self.solver
+        xl, xu, bound_exprs = lp_bound_arrays(self.me)
+        self.xl = xl
+        self.xu = xu
+        self._bound_exprs = bound_exprs
+        self._bound_deltas = {}
+        self._bounds_touched = set()
+        self._lp_cache = None
+
+        if self._make_lp_full is None:
+            self._make_lp_full = solver.make_lp
+            solver.make_lp = self.make_lp
+
+    def release_lp_bounds(self):
+        """
+        Restore the solver's own make_lp and drop the bound arrays and
+        LP cache, so later solver calls see the cobra model as it is
+        (bounds, objective). Call sync_bounds_to_model first to keep
+        bound changes.
+        """
+        if self._make_lp_full is not None:
+            self.solver.make_lp = self._make_lp_full
+            self._make_lp_full = None
+        self.xl = None
+        self.xu = None
+        self._bound_deltas = {}
+        self._bounds_touched = set()
+        self._lp_cache = None
+
+    def make_lp(self, mu_fix, *args, **kwargs):
+        """
+        S, b, c, xl, xu, csense = make_lp(mu_fix)
+
+        Construct the fixed-mu LP using the bound arrays in self.xl, self.xu.
+        The first call builds the full problem with the solver; afterwards
+        only S and the symbolic rows of b (metabolite _bound expressions and
+        added constraints, e.g., proteome inertia) are re-evaluated at mu_fix,
+        and c, csense are reused.
+        If self.objective_override is set, c is replaced by it.
+        """
+        solver = self.solver
+        cache = self._lp_cache
+        if cache is None or not hasattr(solver, 'construct_S'):
+            S, b, c, xl0, xu0, csense = self._make_lp_full(mu_fix, *args, **kwargs)
+            b_exprs = [(i, met._bound) for i,met in enumerate(self.me.metabolites)
+                       if hasattr(getattr(met, '_bound', None), 'free_symbols')]
+            b_compiled = [key[0] for key in getattr(solver, 'compiled_expressions', {})
+                          if key[1] is None]
+            cache = {'b':b, 'c':c, 'csense':csense, 'shape':np.shape(xl0),
+                     'b_exprs':b_exprs, 'b_compiled':b_compiled}
+            self._lp_cache = cache
+            b = cache['b']
+        else:
+            S = solver.construct_S(mu_fix).tocsc()
+            b = cache['b']
+            if cache['b_exprs'] or cache['b_compiled']:
+                b = np.array(b, dtype=float)
+                for i, expr in cache['b_exprs']:
+                    b.flat[i] = self._eval_expr(expr, mu_fix)
+                if cache['b_compiled']:
+                    sub_vals = self._sub_vals(mu_fix)
+                    compiled = solver.compiled_expressions
+                    for i in cache['b_compiled']:
+                        b.flat[i] = float(compiled[(i, None)][0](*sub_vals))
+
+        xl = self.xl.copy()
+        xu = self.xu.copy()
+        for j, is_upper, expr in self._bound_exprs:
+            val = self._eval_expr(expr, mu_fix)
+            if is_upper:
+                xu[j] = val
+            else:
+                xl[j] = val
+        shape = cache['shape']
+        xl = np.reshape(xl, shape)
+        xu = np.reshape(xu, shape)
+
+        c = cache['c']
+        if self.objective_override is not None:
+            c = np.zeros(np.shape(c))
+            for j, coeff in iteritems(self.objective_override):
+                c.flat[j] = coeff
+
+        return S, b, c, xl, xu, cache['csense']
+
+    def _sub_vals(self, mu_fix):
+        """
+        Values of solver.subs_keys_ordered, with the growth rate at mu_fix
+        """
+        subs = self.solver.substitution_dict
+        subs[self.growth_key] = mu_fix
+        return [subs[k] for k in self.solver.subs_keys_ordered]
+
+    def _eval_expr(self, expr, mu_fix):
+        """
+        Numeric value of expr at mu_fix and the solver's substitution_dict
+        """
+        subs = self.solver.substitution_dict
+        vals = {}
+        for sym in expr.free_symbols:
+            key = str(sym)
+            vals[sym] = mu_fix if key == self.growth_key else subs[key]
+        return float(expr.subs(vals))
+
+    def reset_lp_cache(self):
+        """
+        Force the next LP construction to rebuild b, c, csense
+        (e.g., after adding constraints).
+        """
+        self._lp_cache = None
+
+    def set_bounds(self, rxn, lb=None, ub=None):
+        """
+        changed = set_bounds(rxn, lb=None, ub=None)
+
+        Record a bound change for rxn (object, ID or index).
+        Only records a delta if the bound actually differs from the current
+        (or pending) value. Returns True if a delta was recorded.
+        """
+        if self.xl is None:
+            self.init_lp_bounds()
+        if isinstance(rxn, (int, np.integer)):
+            j = rxn
+        else:
+            j = self.me.reactions.index(rxn.id if hasattr(rxn,'id') else rxn)
+        lb0, ub0 = self._bound_deltas.get(j, (self.xl[j], self.xu[j]))
+        lb1 = lb0 if lb is None else lb
+        ub1 = ub0 if ub is None else ub
+        if lb1 == lb0 and ub1 == ub0:
+            return False
+        self._bound_deltas[j] = (lb1, ub1)
+        return True
+
+    def apply_bound_deltas(self):
+        """
+        n_changed = apply_bound_deltas()
+
+        Push recorded bound deltas into the LP bound arrays.
+        Cost is O(number of changed bounds).
+        """
+        deltas = self._bound_deltas
+        n_changed = 0
+        for j,(lb,ub) in iteritems(deltas):
+            if lb != self.xl[j] or ub != self.xu[j]:
+                self.xl[j] = lb
+                self.xu[j] = ub
+                self._bounds_touched.add(j)
+                n_changed += 1
+        self._bound_deltas = {}
+        return n_changed
+
+    def sync_bounds_to_model(self):
+        """
+        Write bounds changed through apply_bound_deltas back to the
+        cobra reactions so the model reflects the final LP bounds.
+        """
+        me = self.me
+        for j in self._bounds_touched:
+            rxn = me.reactions[j]
+            rxn.lower_bound = self.xl[j]
+            rxn.upper_bound = self.xu[j]
+        self._bounds_touched = set()
+
+    def solve_mu(self, prec_bs=1e-6, basis=None, pool=None, verbosity=0, use_library=True):
+        """
+        mu_opt, hs, x_opt, cache = solve_mu(prec_bs, basis=None, pool=None)
+
+        Find max feasible growth rate. Uses solver.bisectmu,
+        or parallel k-section (ksectmu) if a WorkerPool is given.
+        use_library: look up a basis in self.basis_library (see library_basis).
+                     The resulting basis is deposited either way.
+        """
+        if pool is None:
+            return self.bisectmu(prec_bs, basis=basis, verbosity=verbosity,
+                                 use_library=use_library)
+        else:
+            return self.ksectmu(prec_bs, pool, basis=basis, verbosity=verbosity,
+                                use_library=use_library)
+
+    def bisectmu(self, precision=1e-3, *args, **kwargs):
+        """
+        mu_opt, hs, x_opt, cache = bisectmu(precision, basis=None, ...)
+
+        solver.bisectmu (same arguments), warm-started from and depositing
+        into self.basis_library if set
+        use_library: if False, only deposit
+        """
+        use_library = kwargs.pop('use_library', True)
+        key, kwargs['basis'] = self.library_basis(kwargs.get('basis'), lookup=use_library)
+        mu_opt, hs, x_opt, cache = self.solver.bisectmu(precision, *args, **kwargs)
+        self.deposit_basis(key, hs)
+        return mu_opt, hs, x_opt, cache
+
+    def basis_key(self):
+        """
+        Basis library key of the current LP: model hash, growth_key and
+        which exchange rxns are open for uptake and secretion
+        """
+        if self.xl is None:
+            xl, xu = lp_bound_arrays(self.me)[:2]
+        else:
+            xl, xu = self.xl, self.xu
+        if self._exchange_inds is None:
+            self._exchange_inds = np.array([j for j,rxn in enumerate(self.me.reactions)
+                                            if len(rxn.metabolites) == 1], dtype=int)
+        inds = self._exchange_inds
+        bits = np.concatenate([xl[inds] < 0, xu[inds] > 0])
+        exchange_sig = np.packbits(bits).tobytes().hex()
+        return basis_key(model_hash(self.me), self.growth_key, exchange_sig)
+
+    def library_basis(self, basis=None, lookup=True):
+        """
+        key, basis = library_basis(basis=None, lookup=True)
+
+        Basis from self.basis_library for the current exchange set,
+        if basis is None or the exchange set changed since the last
+        deposit. Otherwise (or if not lookup) basis.
+        key is None without a library.
+        """
+        library = self.basis_library
+        if library is None:
+            return None, basis
+        key = self.basis_key()
+        if lookup and (basis is None or key != self._basis_key):
+            hs = library.get(key)
+            if hs is not None:
+                basis = hs
+        return key, basis
+
+    def deposit_basis(self, key, hs):
+        """
+        Store basis hs in self.basis_library under key (from library_basis)
+        """
+        if key is not None and hs is not None:
+            self.basis_library.put(key, hs)
+            self._basis_key = key
+
+    def ksectmu(self, prec_bs, pool, k=None, mumin=0., mumax=2., basis=None,
+                verbosity=0, use_library=True):
+        """
+        mu_opt, hs, x_opt, cache = ksectmu(prec_bs, pool, k=None)
+
+        Parallel k-section on mu. Each round tests k mu values at once on
+        pool (a WorkerPool), shrinking the bracket by a factor of k+1.
+        Workers get the current bounds and keffs (including numeric keffs)
+        with each task.
+
+        k: number of candidates per round. Default: pool.n_workers
+        If no mu is feasible, returns mumin, no solution and
+        cache {'infeasible': True}.
+        """
+        slog = SimLogger(verbosity)
+        if k is None:
+            k = pool.n_workers
+        key, basis = self.library_basis(basis, lookup=use_library)
+        bound_state = pool.bound_state(self)
+        keffs = pool.keff_state(self)
+        mu_lo = mumin
+        mu_hi = mumax
+        hs_lo = basis
+        x_lo = None
+        n_round = 0
+        while mu_hi - mu_lo > prec_bs:
+            n_round += 1
+            mus = mu_lo + (mu_hi - mu_lo)*np.arange(1, k+1)/(k+1.)
+            tasks = [(mu_i, bound_state, keffs, hs_lo) for mu_i in mus]
+            results = pool.map(_checkmu_task, tasks)
+            # Feasibility is monotone in mu: keep the largest feasible mu
+            feas = [i for i,r in enumerate(results) if r[1] == 'optimal']
+            if feas:
+                i = max(feas)
+                mu_lo, stat, hs_lo, x_lo = results[i]
+                if i+1 < k:
+                    mu_hi = mus[i+1]
+            else:
+                mu_hi = mus[0]
+            slog.info('k-section round %d: mu in [%g, %g]', n_round, mu_lo, mu_hi)
+
+        cache = None
+        if x_lo is None:
+            # Nothing above mumin was feasible
+            x_lo, stat, hs = self.solver.solvelp(mu_lo, basis=hs_lo, verbosity=0)
+            if stat == 'optimal':
+                hs_lo = hs
+            else:
+                x_lo = None
+                cache = {'infeasible': True}
+
+        self.deposit_basis(key, hs_lo)
+        return mu_lo, hs_lo, x_lo, cache
+
+    def solve_objective(self, mu_fix, objective, basis=None):
+        """
+        x, stat, hs = solve_objective(mu_fix, objective, basis=None)
+
+        Solve the LP at fixed mu_fix and the current bounds, optimizing
+        objective ({rxn index: coefficient}, same sense as the model
+        objective) instead of the model objective
+        """
+        release = self._make_lp_full is None
+        if release:
+            self.init_lp_bounds()
+        self.objective_override = objective
+        try:
+            return self.solver.solvelp(mu_fix, basis=basis, verbosity=0)
+        finally:
+            self.objective_override = None
+            if release:
+                self.release_lp_bounds()
+
+    def fva(self, mu_fix, rxns, basis=None, pool=None):
+        """
+        fmin, fmax = fva(mu_fix, rxns, basis=None, pool=None)
+
+        Flux variability of rxns (objects or IDs) at fixed mu_fix and the
+        current bounds, each LP warm-started from basis. The 2*len(rxns)
+        LPs are spread over pool (a WorkerPool) if given, with the current
+        bounds and keffs (including numeric keffs).
+        nan for rxns not in the model or non-optimal LPs.
+        """
+        inds = self.rxn_index(rxns)
+        n_rxn = len(self.me.reactions)
+        tasks = [(j, sense) for j in inds if j < n_rxn for sense in (1., -1.)]
+        if pool is None:
+            vals = []
+            for j, sense in tasks:
+                x, stat, hs = self.solve_objective(mu_fix, {j:sense}, basis=basis)
+                vals.append(float(np.ravel(x)[j]) if stat == 'optimal' and x is not None
+                            else np.nan)
+        else:
+            bound_state = pool.bound_state(self)
+            keffs = pool.keff_state(self)
+            vals = pool.map(_fva_task, [(mu_fix, bound_state, keffs, basis, j, sense)
+                                        for j, sense in tasks])
+        fmin = np.full(len(inds), np.nan)
+        fmax = np.full(len(inds), np.nan)
+        pos = np.flatnonzero(inds < n_rxn)
+        # Either objective sense: order the two optima of each flux
+        vals = np.array(vals, dtype=float).reshape(-1, 2)
+        fmin[pos] = np.fmin(vals[:,0], vals[:,1])
+        fmax[pos] = np.fmax(vals[:,0], vals[:,1])
+        return fmin, fmax
+
+    def get_exchange_index(self, metids):
+        """
+        ex_index = get_exchange_index(metids)
+
+        Precompute exchange reactions and integer indices for metids.
+        ex_index is a dict:
+            metids:     metabolite IDs, in order
+            bound_rxns: exchange rxn whose bound opens/closes uptake (None if missing)
+            ind_in:     index of uptake (source) rxn. Only used for ME 1.0
+            ind_out:    index of secretion (sink) or exchange rxn
+            flux_ids:   IDs of exchange rxns reported in ex_flux
+            flux_inds:  indices of flux_ids
+        Net flux (secretion positive) = x[ind_out] - x[ind_in]
+        """
+        exchange_one_rxn = self.exchange_one_rxn
+        n_rxn = len(self.me.reactions)
+        bound_rxns = []
+        rxns_in = []
+        rxns_out = []
+        flux_ids = []
+        for metid in metids:
+            if exchange_one_rxn:
+                rxn = self.get_exchange_rxn(metid, exchange_one_rxn=exchange_one_rxn)
+                bound_rxns.append(rxn)
+                rxns_in.append(None)
+                rxns_out.append(rxn)
+                flux_ids.append(rxn.id)
+            else:
+                try:
+                    rxn_in = self.get_exchange_rxn(metid, 'source', exchange_one_rxn)
+                    flux_ids.append(rxn_in.id)
+                except ValueError:
+                    rxn_in = None
+                try:
+                    rxn_out = self.get_exchange_rxn(metid, 'sink', exchange_one_rxn)
+                    flux_ids.append(rxn_out.id)
+                except ValueError:
+                    rxn_out = None
+                bound_rxns.append(rxn_in)
+                rxns_in.append(rxn_in)
+                rxns_out.append(rxn_out)
+
+        ex_index = {
+            'metids': list(metids),
+            'bound_rxns': bound_rxns,
+            'ind_in': self.rxn_index([r.id if r is not None else None for r in rxns_in]),
+            'ind_out': self.rxn_index([r.id if r is not None else None for r in rxns_out]),
+            'flux_ids': flux_ids,
+            'flux_inds': self.rxn_index(flux_ids)
+            }
+        return ex_index
 
     def simulate_batch(self, T, c0_dict, X0, dt=0.1,
                        o2_e_id='o2_e', o2_head=0.21, kLa=7.5,
@@ -101,7 +617,21 @@ class DynamicME(object):
                        verbosity=2,
                        LB_DEFAULT=-1000.,
                        UB_DEFAULT=1000.,
-                       throttle_near_zero=True):
+                       throttle_near_zero=True,
+                       pool=None,
+                       profiler=None,
+                       log_every=1,
+                       record_bases=False,
+                       basis_ref=None,
+                       D=0.,
+                       feed_dict={},
+                       stop_at_ss=False,
+                       ZERO_SS=1e-6,
+                       n_ss=3,
+                       X_WASHOUT=1e-6,
+                       fast_forward=True,
+                       fva=False,
+                       fva_pool=None):
         """
         result = simulate_batch()
 
@@ -115,6 +645,8 @@ class DynamicME(object):
         kLa: mass transfer coefficient for O2
         dt: time step (h)
         conc_dep_fluxes: are uptake fluxes concentration dependent?
+                         False, True (use self.uptake_kinetics or, if None,
+                         Chassagnole PTS keffs) or an UptakeKinetics object
         prec_bs: precision of mu for bisection
         ZERO_CONC: (in mM) if below this concentration, consider depleted
         proteome_has_inertia: if True, track protein concentrations and
@@ -124,13 +656,48 @@ class DynamicME(object):
                         the rest of the simulation.
         mm_model : the metabolism and macromolecule model used to implement
                    proteome inertia constraints
+        pool: WorkerPool. If given, search mu by parallel k-section
+              instead of bisection.
+        profiler: Profiler recording per-step time in bounds, mu_search,
+                  lp_solve (count and time), state_update and record
+        log_every: emit per-step log messages only every log_every steps.
+                   Messages go to the dynamicme logger (see dynamicme.log);
+                   verbosity 1 logs per-step records, 2 adds per-metabolite
+                   diagnostics.
+        record_bases: if True, result['basis_events'] holds one record per
+                   solve event: iter, t, mu and the compact basis hs
+                   (see dynamicme.basis.compact_basis)
+        basis_ref: basis_events (or result) of a reference simulation.
+                   Solve event k is warm-started from event k of the
+                   reference, if it exists, instead of from the previous
+                   event. Useful for re-simulating nearby parameters.
+        D:         dilution rate (1/h). If > 0, continuous culture
+                   (see simulate_chemostat).
+        feed_dict: feed concentration dict (mM) for D > 0. Only
+                   metabolites in c0_dict are tracked.
+        stop_at_ss: stop once steady: the sum of absolute changes in biomass
+                   and concentrations over a step is <= ZERO_SS (as in
+                   ParamOpt.get_time_ss) for n_ss consecutive steps, or
+                   biomass is washed out (below X_WASHOUT, with D > 0)
+        fast_forward: once growth stops (mu 0 or infeasible, D = 0) and the
+                   remaining trajectory can no longer open or close an
+                   exchange, throttle uptake or change uptake kinetics,
+                   fill it in closed form (see stationary_trajectory)
+                   instead of stepping to T. Not with stop_at_ss, which
+                   stops stepping at the steady state instead
+        fva:       if True, at each solve event compute the min and max flux
+                   of extra_rxns_tracked at mu_opt (see fva), into
+                   result['rxn_flux_min'] and result['rxn_flux_max'],
+                   aligned with result['rxn_flux']
+        fva_pool:  WorkerPool for the FVA LPs (default: pool)
 
         [Output]
-        result
+        result. With stop_at_ss, also t_ss (time steady state was first
+        reached, None if not), washout (True if washed out).
         ----------------------------------------------------
         Batch equations:
-        dX/dt = mu*X
-        dc/dt = A*v*X
+        dX/dt = (mu-D)*X
+        dc/dt = A*v*X + D*(c_feed-c)
         """
         # If uptake rate independent of concentration,
         # only recompute uptake rate once a substrate
@@ -139,6 +706,8 @@ class DynamicME(object):
         solver = self.solver
         is_me2 = isinstance(me, MEModel)
         exchange_one_rxn = self.exchange_one_rxn
+        slog = SimLogger(verbosity, every=log_every)
+        keffs_numeric0 = dict(self._keffs_numeric)
 
         # If constraining proteome "inertia" need extra constraints
         cplx_conc_dict = dict(cplx_conc_dict0)
@@ -147,29 +716,61 @@ class DynamicME(object):
             raise Exception("Not yet implemented.")
 
         # Initialize concentrations & biomass
+        metids = list(c0_dict.keys())
+        conc = np.array([c0_dict[metid] for metid in metids], dtype=float)
         conc_dict = c0_dict.copy()
         #prot_dict = prot0_dict.copy()
         X_biomass = X0
         mu_opt = 0.
-        x_dict = None
+        x_pad = None
+
+        # Precompute integer indices into the solution vector so that
+        # post-solve work is a few gathers instead of dict lookups
+        ex_index = self.get_exchange_index(metids)
+        ind_in = ex_index['ind_in']
+        ind_out = ex_index['ind_out']
+        bound_rxns = ex_index['bound_rxns']
+        flux_ids = ex_index['flux_ids']
+        flux_inds = ex_index['flux_inds']
+        is_o2 = np.array([metid == o2_e_id for metid in metids], dtype=bool)
+        has_bound = np.array([r is not None for r in bound_rxns], dtype=bool)
+        feed = np.array([feed_dict.get(metid, 0.) for metid in metids], dtype=float)
+        bound_pos = np.array([i for i,r in enumerate(bound_rxns) if r is not None], dtype=int)
+        bound_ids = [(r.id if r is not None else None) for r in bound_rxns]
+        bound_inds = self.rxn_index([bound_ids[i] for i in bound_pos])
+        open_bnds = None    # Uptake bounds when available. Refreshed if lb_dict changes.
+        for metid,r in zip(metids,bound_rxns):
+            if r is None:
+                slog.debug('No uptake rxn found for met: %s', metid)
+        # Uptake is opened via lower bound (ME 2.0) or source upper bound (ME 1.0)
         if exchange_one_rxn:
-            ex_flux_dict = {self.get_exchange_rxn(metid).id:0. for metid in list(conc_dict.keys())}
+            open_dict, open_default, open_str = lb_dict, LB_DEFAULT, 'LB'
         else:
-            ex_flux_dict = {}
-            for metid in list(conc_dict.keys()):
-                try:
-                    rxn = self.get_exchange_rxn(metid, 'source', exchange_one_rxn)
-                    ex_flux_dict[rxn.id] = 0.
-                except ValueError:
-                    pass
-                try:
-                    rxn = self.get_exchange_rxn(metid, 'sink', exchange_one_rxn)
-                    ex_flux_dict[rxn.id] = 0.
-                except ValueError:
-                    pass
+            open_dict, open_default, open_str = ub_dict, UB_DEFAULT, 'UB'
+        ex_flux_dict = {rid:0. for rid in flux_ids}
+
+        # Concentration-dependent uptake
+        kinetics = self.get_uptake_kinetics(conc_dep_fluxes)
+        if kinetics is not None:
+            kinetics.bind(metids)
+            kinetics.values = None
+            if kinetics.mode == 'bound':
+                bound_k = {bound_ids[i]:k for k,i in enumerate(bound_pos)}
+                kin_pos = np.array([bound_k[rid] for rid in kinetics.rxn_ids], dtype=int)
 
         #rxn_flux_dict = {rxn.id:0. for rxn in extra_rxns_tracked}
-        rxn_flux_dict = {(r.id if hasattr(r,'id') else r):0. for r in extra_rxns_tracked}
+        tracked_ids = [(r.id if hasattr(r,'id') else r) for r in extra_rxns_tracked]
+        tracked_inds = self.rxn_index(tracked_ids)
+        rxn_flux_dict = {rid:0. for rid in tracked_ids}
+        if fva_pool is None:
+            fva_pool = pool
+        rxn_min_dict = dict(rxn_flux_dict)
+        rxn_max_dict = dict(rxn_flux_dict)
+
+        cplx_ids = list(cplx_conc_dict.keys())
+        cplx_conc = np.array([cplx_conc_dict[cid] for cid in cplx_ids], dtype=float)
+        form_inds = self.rxn_index([me.complex_data.get_by_id(cid).formation
+                                    for cid in cplx_ids])
 
         t_sim = 0.
 
@@ -180,194 +781,283 @@ class DynamicME(object):
         biomass_profile = [X_biomass]
         ex_flux_profile = [ex_flux_dict.copy()]
         rxn_flux_profile= [rxn_flux_dict.copy()]
+        rxn_min_profile = [rxn_min_dict]
+        rxn_max_profile = [rxn_max_dict]
+
+        if profiler is None:
+            profiler = NullProfiler()
+        timer = time.time
+
+        if isinstance(basis_ref, dict):
+            basis_ref = basis_ref.get('basis_events')
+        basis_events = [] if record_bases else None
+        n_event = 0
+        n_steady = 0
+        t_steady = None
+        t_ss = None
+        ff_pending = False  # Check for stationary phase after the next step
+        washout = False
 
         iter_sim = 0
         recompute_fluxes = True     # In first iteration always compute
-        while t_sim < T:
-            # Determine available substrates given concentrations
-            for metid,conc in conc_dict.items():
-                try:
-                    ex_rxn = self.get_exchange_rxn(metid, exchange_one_rxn=exchange_one_rxn,
-                                                   direction='source')
-                    if conc <= ZERO_CONC:
-                        if verbosity >= 1:
-                            print('Metabolite %s depleted.'%(metid))
+        # Bound arrays and the profiled solver are released however the
+        # loop ends
+        self.init_lp_bounds()
+        restore_solver = profiler.wrap_solver(solver)
+        try:
+            while t_sim < T:
+                profiler.start('step', iter=iter_sim, time=t_sim)
+                tic = timer()
+                # Determine available substrates given concentrations.
+                # Only exchanges whose bound actually changes are recorded
+                # and pushed to the LP bound arrays.
+                if kinetics is not None:
+                    # Only changes above kinetics.tol are pushed and trigger a resolve
+                    changed = kinetics.update(conc)
+                    if len(changed) > 0:
+                        if kinetics.mode == 'keff':
+                            self.set_keffs_numeric([kinetics.rxn_ids[i] for i in changed],
+                                                   kinetics.values[changed])
+                            recompute_fluxes = True
+                        else:
+                            open_bnds = None
+                depleted = conc[bound_pos] <= ZERO_CONC
+                if open_bnds is None:
+                    open_bnds = np.array([open_dict.get(bound_ids[i], open_default)
+                                          for i in bound_pos])
+                    if kinetics is not None and kinetics.mode == 'bound':
                         if exchange_one_rxn:
-                            lb0 = ex_rxn.lower_bound
-                            lb1 = 0.
-                            if lb1 != lb0:
-                                recompute_fluxes = True
-                            ex_rxn.lower_bound = 0.
+                            open_bnds[kin_pos] = np.maximum(open_bnds[kin_pos], -kinetics.values)
                         else:
-                            ub0 = ex_rxn.upper_bound
-                            ub1 = 0.
-                            if ub1 != ub0:
-                                recompute_fluxes = True
-                            ex_rxn.upper_bound = 0.
-                    else:
+                            open_bnds[kin_pos] = np.minimum(open_bnds[kin_pos], kinetics.values)
+                    if slog.enabled(2):
+                        for i in bound_pos:
+                            if bound_ids[i] not in open_dict:
+                                slog.debug('Using default %s=%g for %s',
+                                           open_str, open_default, bound_ids[i])
+                if slog.enabled(2):
+                    for k,i in enumerate(bound_pos):
                         # (re)-open exchange whenever concentration above
                         # threshold since, e.g., secreted products can be 
                         # re-consumed, too.
-                        if verbosity >= 1:
-                            print('Metabolite %s available.'%(metid))
-                        if exchange_one_rxn:
-                            lb0 = ex_rxn.lower_bound
-                            if ex_rxn.id in lb_dict:
-                                lb1 = lb_dict[ex_rxn.id]
-                            else:
-                                if verbosity >= 1:
-                                    print('Using default LB=%g for %s'%(LB_DEFAULT, ex_rxn.id))
-                                lb1 = LB_DEFAULT
-                            if lb1 != lb0:
-                                recompute_fluxes = True
-                            ex_rxn.lower_bound = lb1
+                        if depleted[k]:
+                            slog.step(iter_sim, 'Metabolite %s depleted.', metids[i], verbosity=2)
                         else:
-                            ub0 = ex_rxn.upper_bound
-                            if ex_rxn.id in ub_dict:
-                                ub1 = ub_dict[ex_rxn.id]
-                            else:
-                                if verbosity >= 1:
-                                    print('Using default UB=%g for %s'%(UB_DEFAULT, ex_rxn.id))
-                                ub1 = UB_DEFAULT
-                            if ub1 != ub0:
-                                recompute_fluxes = True
-                            ex_rxn.upper_bound = ub1
-                except:
-                    if verbosity >= 2:
-                        print('No uptake rxn found for met:', metid)
-
-            # Recompute fluxes if any rxn bounds changed, which triggers
-            # recompute_fluxes flag
-            if recompute_fluxes:
-                # Compute ME
-                if verbosity >= 1:
-                    print('Computing new uptake rates')
-                mu_opt, hs_bs, x_opt, cache_opt = solver.bisectmu(prec_bs, basis=basis,
-                                                                  verbosity=verbosity)
-
-                if proteome_has_inertia:
-                    raise Exception("Not yet implemented.")
-                basis = hs_bs
-                if me.solution is None:
-                    x_dict = None
-                else:
-                    x_dict = me.solution.x_dict
-
-            # Update biomass for next time step
-            X_biomass_prime = X_biomass + mu_opt*X_biomass*dt
-            # Update concentrations
-            ex_flux_dict = {}
-            conc_dict_prime = conc_dict.copy()
-            #prot_dict_prime = prot_dict.copy()
-            cplx_conc_dict_prime = cplx_conc_dict.copy()
-            reset_run = False
-
-            for metid, conc in conc_dict.items():
-                v = 0.
+                            slog.step(iter_sim, 'Metabolite %s available.', metids[i], verbosity=2)
+                bnds = np.where(depleted, 0., open_bnds)
+                bnds0 = self.xl[bound_inds] if exchange_one_rxn else self.xu[bound_inds]
+                for k in np.flatnonzero(bnds != bnds0):
+                    if exchange_one_rxn:
+                        self.set_bounds(bound_inds[k], lb=bnds[k])
+                    else:
+                        self.set_bounds(bound_inds[k], ub=bnds[k])
+
+                if self.apply_bound_deltas() > 0:
+                    recompute_fluxes = True
+                profiler.add('bounds', timer()-tic)
+
+                # Recompute fluxes if any rxn bounds changed, which triggers
+                # recompute_fluxes flag
+                if recompute_fluxes:
+                    # Compute ME
+                    slog.step(iter_sim, 'Computing new uptake rates')
+                    tic = timer()
+                    replay = basis_ref is not None and n_event < len(basis_ref) and \
+                        basis_ref[n_event]['hs'] is not None
+                    if replay:
+                        basis = expand_basis(basis_ref[n_event]['hs'], basis)
+                    mu_opt, hs_bs, x_opt, cache_opt = self.solve_mu(prec_bs, basis=basis,
+                                                                    pool=pool,
+                                                                    verbosity=verbosity,
+                                                                    use_library=not replay)
+                    profiler.add('mu_search', timer()-tic)
+
+                    if proteome_has_inertia:
+                        raise Exception("Not yet implemented.")
+                    basis = hs_bs
+                    if basis_events is not None:
+                        basis_events.append({'iter':iter_sim, 't':t_sim, 'mu':mu_opt,
+                                             'hs':compact_basis(hs_bs)})
+                    n_event = n_event + 1
+                    self.set_solution_vector(x_opt, cache_opt)
+                    x_pad = self.padded_x()
+                    ff_pending = fast_forward and not stop_at_ss
+
+                    if fva:
+                        tic = timer()
+                        if x_pad is not None:
+                            fmin, fmax = self.fva(mu_opt, tracked_ids, basis=hs_bs, pool=fva_pool)
+                        else:
+                            fmin = fmax = np.full(len(tracked_ids), np.nan)
+                        rxn_min_dict = dict(zip(tracked_ids, fmin))
+                        rxn_max_dict = dict(zip(tracked_ids, fmax))
+                        profiler.add('fva', timer()-tic)
+
+                tic = timer()
+                # Update biomass for next time step
+                X_biomass_prime = max(X_biomass + (mu_opt - D)*X_biomass*dt, 0.)
+                # Update concentrations
+                # Net exchange flux (mmol/gDW/h), secretion positive.
                 # If ME 1.0, EX_ split into source and sink
-                if exchange_one_rxn:
-                    rxn = self.get_exchange_rxn(metid)
-                    if x_dict is not None:
-                        v = me.solution.x_dict[rxn.id]              # mmol/gDW/h
-                    ex_flux_dict[rxn.id] = v
+                if x_pad is None:
+                    v_net = np.zeros(len(metids))
+                    ex_flux_dict = {rid:0. for rid in flux_ids}
                 else:
-                    v_in  = 0.
-                    v_out = 0.
-                    try:
-                        rxn_in  = self.get_exchange_rxn(metid, 'source', exchange_one_rxn)
-                        v_in  = me.solution.x_dict[rxn_in.id]
-                        ex_flux_dict[rxn_in.id] = v_in
-                    except:
-                        pass
-                    try:
-                        rxn_out = self.get_exchange_rxn(metid, 'sink', exchange_one_rxn)
-                        v_out = me.solution.x_dict[rxn_out.id]
-                        ex_flux_dict[rxn_out.id] = v_out
-                    except:
-                        pass
-                    v = v_out - v_in
-
-                if metid is not o2_e_id:
-                    conc_dict_prime[metid] = conc + v*X_biomass_prime*dt    # mmol/L = mmol/gDW/h * gDW/L * h
-                    if throttle_near_zero:
-                        if conc_dict_prime[metid] < (ZERO_CONC - prec_bs):
+                    v_net = x_pad[ind_out] - x_pad[ind_in]
+                    ex_flux_dict = dict(zip(flux_ids, x_pad[flux_inds]))
+
+                # mmol/L = mmol/gDW/h * gDW/L * h
+                conc_prime = conc + v_net*X_biomass_prime*dt
+                if D > 0:
+                    # Feed in, medium out
+                    conc_prime = conc_prime + D*(feed - conc)*dt
+                # Account for oxygen diffusion from headspace into medium
+                conc_prime[is_o2] = conc_prime[is_o2] + kLa*(o2_head - conc[is_o2])*dt
+                reset_run = False
+
+                if throttle_near_zero:
+                    below = ~is_o2 & (conc_prime < (ZERO_CONC - prec_bs))
+                    nearing = ~is_o2 & ~below & (-v_net*X_biomass_prime*dt > conc_prime/2)
+                    for i in np.flatnonzero(below | nearing):
+                        metid = metids[i]
+                        if bound_rxns[i] is None:
+                            continue
+                        rid = bound_rxns[i].id
+                        if below[i]:
                             # Set flag to negate this run and recompute fluxes again with a new lower bound if any of the
                             # metabolites end up with a negative concentration
-                            if verbosity >= 1:
-                                print(metid, "below threshold, reset run flag triggered")
+                            slog.info('%s below threshold, reset run flag triggered', metid)
                             reset_run = True
-                            lb_dict[rxn.id] = min(-conc_dict[metid] / (X_biomass_prime * dt), 0.)
-                            if verbosity >= 1:
-                                print('Changing lower bounds %s to %.3f' % (metid, lb_dict[rxn.id]))
-                        elif -v*X_biomass_prime*dt > conc_dict_prime[metid]/2:
+                            lb_dict[rid] = min(-conc[i] / (X_biomass_prime * dt), 0.)
+                        else:
                             ### Update lower bounds as concentration is nearing 0
-                            lb_dict[rxn.id] = min(-conc_dict_prime[metid]/(X_biomass*dt), 0.)
-                            if verbosity >= 1:
-                                print('Changing lower bounds %s to %.3f' %(metid, lb_dict[rxn.id]))
+                            lb_dict[rid] = min(-conc_prime[i]/(X_biomass*dt), 0.)
+                        open_bnds = None
+                        slog.info('Changing lower bounds %s to %.3f', metid, lb_dict[rid])
+
+                #------------------------------------------------
+                # Update complex concentrations for next time step
+                #------------------------------------------------
+                """
+                for a cell:
+                    Ej(t+1) = Ej(t) + v_formation*dt
+                    mmol/gDW = mmol/gDW + mmol/gDW/h * h
+                """
+                if x_pad is not None and len(cplx_ids) > 0:
+                    cplx_conc_prime = cplx_conc + x_pad[form_inds]*dt
                 else:
-                    # Account for oxygen diffusion from headspace into medium
-                    conc_dict_prime[metid] = conc + (v*X_biomass_prime + kLa*(o2_head - conc))*dt
-
-            #------------------------------------------------
-            # Update complex concentrations for next time step
-            #------------------------------------------------
-            """
-            for a cell:
-                Ej(t+1) = Ej(t) + v_formation*dt
-                mmol/gDW = mmol/gDW + mmol/gDW/h * h
-            """
-            for cplx_id, conc in iteritems(cplx_conc_dict):
-                cplx = me.metabolites.get_by_id(cplx_id)
-                #data = me.complex_data.get_by_id(cplx_id)
-                #data.formation
-                v_cplx_net = 0.
-                #for rxn in cplx.reactions:
-
-
-                v_formation = me.solution.x_dict[rxn_form.id]
-                cplx_conc_dict_prime[cplx_id] = conc + v_cplx_net*dt
-
-
-            # Reset the run if the reset_run flag is triggered, if not update the new biomass and conc_dict
-            if reset_run:
-                if verbosity >= 1:
-                    print("Resetting run")
-                continue  # Skip the updating of time steps and go to the next loop while on the same time step
-            else:
-                X_biomass = X_biomass_prime
-                conc_dict = conc_dict_prime.copy()
-                cplx_dict = cplx_conc_dict_prime.copy()
-                #prot_dict = prot_dict_prime.copy()
-
-            ### Extra fluxes tracked
-            for rxn in extra_rxns_tracked:
-                v = 0.
-                rid = rxn.id if hasattr(rxn,'id') else rxn
-                if x_dict is not None:
-                    v = x_dict[rid]
-                rxn_flux_dict[rid] = v
-
-            # ------------------------------------------------
-            # Move to next time step
-            t_sim = t_sim + dt
-            iter_sim = iter_sim + 1
-            times.append(t_sim)
-            conc_profile.append(conc_dict.copy())
-            biomass_profile.append(X_biomass)
-            ex_flux_profile.append(ex_flux_dict.copy())
-            rxn_flux_profile.append(rxn_flux_dict.copy())
-            # Save protein concentrations
-            cplx_profile.append(cplx_dict.copy())
-
-            # Reset recompute_fluxes to false
-            recompute_fluxes = False
-
-            # ------------------------------------------------
-            # Print some results
-            if verbosity >= 1:
-                print('Biomass at t=%g: %g'%(t_sim, X_biomass))
-                print('Concentrations:', conc_dict)
+                    cplx_conc_prime = cplx_conc
+                profiler.add('state_update', timer()-tic)
 
+                # Reset the run if the reset_run flag is triggered, if not update the new biomass and conc_dict
+                if reset_run:
+                    slog.info('Resetting run')
+                    continue  # Skip the updating of time steps and go to the next loop while on the same time step
+                else:
+                    if stop_at_ss:
+                        change = abs(X_biomass_prime - X_biomass) + np.abs(conc_prime - conc).sum()
+                    X_biomass = X_biomass_prime
+                    conc = conc_prime
+                    cplx_conc = cplx_conc_prime
+                    conc_dict = dict(zip(metids, conc))
+                    cplx_dict = dict(zip(cplx_ids, cplx_conc))
+
+                tic = timer()
+                ### Extra fluxes tracked
+                if x_pad is not None:
+                    rxn_flux_dict = dict(zip(tracked_ids, x_pad[tracked_inds]))
+
+                # ------------------------------------------------
+                # Move to next time step
+                t_sim = t_sim + dt
+                iter_sim = iter_sim + 1
+                times.append(t_sim)
+                conc_profile.append(conc_dict)
+                biomass_profile.append(X_biomass)
+                ex_flux_profile.append(ex_flux_dict)
+                rxn_flux_profile.append(rxn_flux_dict)
+                if fva:
+                    rxn_min_profile.append(rxn_min_dict)
+                    rxn_max_profile.append(rxn_max_dict)
+                # Save protein concentrations
+                cplx_profile.append(cplx_dict)
+                profiler.add('record', timer()-tic)
+
+                # Reset recompute_fluxes to false
+                recompute_fluxes = False
+
+                # ------------------------------------------------
+                # Log some results
+                slog.record('step', iter_step=iter_sim-1, t=t_sim, biomass=X_biomass,
+                            mu=mu_opt, concentration=conc_dict)
+
+                if stop_at_ss:
+                    if D > 0 and X_biomass <= X_WASHOUT:
+                        washout = True
+                        slog.info('Biomass washed out at t=%g', t_sim)
+                        break
+                    if change <= ZERO_SS:
+                        n_steady += 1
+                        if n_steady == 1:
+                            t_steady = t_sim
+                        if n_steady >= n_ss:
+                            t_ss = t_steady
+                            slog.info('Steady state reached at t=%g', t_ss)
+                            break
+                    else:
+                        n_steady = 0
+
+                # Stationary phase: without growth, the state only moves along
+                # constant fluxes (and O2 transfer). If that cannot change any
+                # bound, the rest of the trajectory is known in closed form.
+                if ff_pending and D == 0 and mu_opt <= 0 and t_sim < T:
+                    ff_pending = False
+                    n_rest = int(np.ceil((T - t_sim)/dt - 1e-9))
+                    C = stationary_trajectory(conc, v_net, X_biomass, dt, n_rest, is_o2,
+                                              kLa=kLa, o2_head=o2_head)
+                    C_all = np.vstack([conc, C])
+                    stationary = np.all((C_all[:,bound_pos] <= ZERO_CONC) == depleted)
+                    if stationary and throttle_near_zero:
+                        below = C < (ZERO_CONC - prec_bs)
+                        nearing = -v_net*X_biomass*dt > C/2
+                        stationary = not np.any((below | nearing) & ~is_o2 & has_bound)
+                    if stationary and kinetics is not None:
+                        inds = kinetics._conc_inds
+                        stationary = np.all(C_all[:,inds] == conc[inds])
+                    if stationary:
+                        times_rest = t_sim + dt*np.arange(1, n_rest+1)
+                        if x_pad is not None and len(cplx_ids) > 0:
+                            cplx_rate = x_pad[form_inds]*dt
+                        else:
+                            cplx_rate = np.zeros(len(cplx_ids))
+                        cplx_rest = cplx_conc + np.arange(1, n_rest+1)[:,None]*cplx_rate
+                        times.extend(times_rest.tolist())
+                        conc_profile.extend(dict(zip(metids, row)) for row in C)
+                        biomass_profile.extend([X_biomass]*n_rest)
+                        ex_flux_profile.extend(dict(ex_flux_dict) for k in range(n_rest))
+                        rxn_flux_profile.extend(dict(rxn_flux_dict) for k in range(n_rest))
+                        if fva:
+                            rxn_min_profile.extend([rxn_min_dict]*n_rest)
+                            rxn_max_profile.extend([rxn_max_dict]*n_rest)
+                        cplx_profile.extend(dict(zip(cplx_ids, row)) for row in cplx_rest)
+                        slog.info('Stationary from t=%g: filled %d steps to t=%g',
+                                  t_sim, n_rest, times_rest[-1])
+                        conc = C[-1]
+                        cplx_conc = cplx_rest[-1]
+                        t_sim = times_rest[-1]
+                        iter_sim = iter_sim + n_rest
+                        break
+        finally:
+            profiler.finish()
+            restore_solver()
+            # Leave the model with the final bounds, as before
+            self.sync_bounds_to_model()
+            # but with the keffs it started with (undo uptake kinetics)
+            self.reset_keffs_numeric()
+            if keffs_numeric0:
+                self.set_keffs_numeric(list(keffs_numeric0.keys()), list(keffs_numeric0.values()))
+            # and the solver reading the model directly again
+            self.release_lp_bounds()
 
         result = {'biomass':biomass_profile,
                   'concentration':conc_profile,
@@ -378,12 +1068,112 @@ class DynamicME(object):
                   'complex':cplx_profile
                   }
                   #'prot_concs':prot_concs}
+        if basis_events is not None:
+            result['basis_events'] = basis_events
+        if fva:
+            result['rxn_flux_min'] = rxn_min_profile
+            result['rxn_flux_max'] = rxn_max_profile
+        if stop_at_ss:
+            result['t_ss'] = t_ss
+            result['washout'] = washout
 
         self.result = result
 
         return result
 
 
+    def simulate_chemostat(self, T, D, feed_dict, X0, c0_dict=None, dt=0.1,
+                           stop_at_ss=True, **kwargs):
+        """
+        result = simulate_chemostat(T, D, feed_dict, X0, c0_dict=None)
+
+        Continuous culture at dilution rate D (1/h) with feed
+        concentrations feed_dict (mM), until steady state, washout or T.
+
+        c0_dict: initial concentrations (default: feed_dict). Feed
+                 metabolites missing from c0_dict start at 0.
+        stop_at_ss: stop early at steady state or washout (see
+                 simulate_batch). The final state is in
+                 result['steady_state'] if steady state was reached.
+        kwargs:  other simulate_batch arguments
+
+        For a substrate-limited steady state (mu = D), uptake must depend on
+        concentration (conc_dep_fluxes).
+        """
+        if c0_dict is None:
+            c0_dict = feed_dict
+        c0_dict = dict(c0_dict)
+        for metid in feed_dict:
+            c0_dict.setdefault(metid, 0.)
+
+        result = self.simulate_batch(T, c0_dict, X0, dt=dt, D=D, feed_dict=feed_dict,
+                                     stop_at_ss=stop_at_ss, **kwargs)
+        if result.get('t_ss') is not None:
+            result['steady_state'] = {'time':result['time'][-1],
+                                      'biomass':result['biomass'][-1],
+                                      'concentration':result['concentration'][-1],
+                                      'ex_flux':result['ex_flux'][-1]}
+        return result
+
+
+    def sweep(self, grid, T, c0_dict, X0, order='nn', pool=None, n_workers=None,
+              n_chunks=None, verbosity=0, **kwargs):
+        """
+        df = sweep(grid, T, c0_dict, X0, order='nn')
+
+        Batch simulations over a parameter grid, run along a short path
+        through the grid so that each simulation is warm-started from the
+        per-event bases of its predecessor (see simulate_batch basis_ref).
+
+        grid:  dict of parameter - values (all combinations are run) or
+               list of parameter dicts. Parameters are simulate_batch
+               arguments (e.g., kLa, o2_head, X0, LB_DEFAULT) or entries of
+               its dict arguments as 'c0_dict:<met ID>', 'lb_dict:<rxn ID>'
+               or 'ub_dict:<rxn ID>'.
+        order: 'nn' (greedy nearest neighbour), 'snake' (boustrophedon over
+               the grid levels) or None (as given). See order_points.
+        pool:  WorkerPool. The path is split into n_chunks contiguous
+               chunks (default: one per worker), each run in sequence on
+               one worker. Default: pool of n_workers for the sweep;
+               n_workers=0: run the whole path here. A single point
+               always runs here.
+        kwargs: other simulate_batch arguments, common to all points
+
+        Returns DataFrame with one row per point and time step: point
+        (index into sweep_points(grid)), path_pos, the parameters, then
+        the columns of result_to_frame.
+        """
+        points = sweep_points(grid)
+        params = list(grid.keys()) if isinstance(grid, dict) else None
+        path = order_points(points, order, params=params)
+        items = [(int(ipoint), pos, points[ipoint]) for pos, ipoint in enumerate(path)]
+
+        sim_kwargs = dict(kwargs)
+        sim_kwargs.update({'T':T, 'c0_dict':c0_dict, 'X0':X0})
+        sim_kwargs.pop('pool', None)
+
+        own_pool = False
+        if pool is None and n_workers != 0 and len(items) >= 2:
+            pool = WorkerPool(self, n_workers)
+            own_pool = True
+        if pool is None or len(items) < 2:
+            frames = [run_sweep_chunk(self, items, sim_kwargs, verbosity=verbosity)]
+        else:
+            if n_chunks is None:
+                n_chunks = pool.n_workers
+            n_chunks = max(1, min(n_chunks, len(items)))
+            # Workers run with the keffs of this model, numeric ones included
+            keffs = pool.keff_state(self)
+            chunks = np.array_split(np.arange(len(items)), n_chunks)
+            tasks = [([items[k] for k in chunk], sim_kwargs, keffs, verbosity)
+                     for chunk in chunks]
+            frames = pool.map(_sweep_chunk_task, tasks)
+        if own_pool:
+            pool.close()
+
+        return pd.concat(frames, ignore_index=True)
+
+
     def get_exchange_rxn(self, metid, direction='both', exchange_one_rxn=None):
         """
         Get exchange flux for metabolite with id metid
@@ -483,10 +1273,16 @@ class DynamicME(object):
         """
 
 
-    def change_uptake_kinetics(self, transport_classes={'PTS'}):
+    def change_uptake_kinetics(self, conc_dict, kinetics=None, transport_classes={'PTS'}):
         """
+        n_changed = change_uptake_kinetics(conc_dict, kinetics=None)
+
         Update PTS (and other transporter) keff as function of extracellular metabolite concentration.
-        Need to recompile the first time after doing this.
+        keffs are pushed numerically into the compiled expressions, so no recompile is needed.
+        Only updates whose relative change exceeds kinetics.tol are pushed.
+
+        kinetics: UptakeKinetics. Default: self.uptake_kinetics or, if None,
+                  Chassagnole PTS keffs for transport_classes.
 
         Chassagnole PTS:
         r_PTS = 
@@ -499,14 +1295,116 @@ class DynamicME(object):
         such that v_PTS = keff(x_glc_e)*[PTS].
         We approximate x_pyr and x_pep and make x_glc_e the sole variable in computing keff.
         """
-        # 
-        me = self.me
+        if kinetics is None:
+            kinetics = self.get_uptake_kinetics(True, transport_classes)
+
+        metids = list(conc_dict.keys())
+        conc = np.array([conc_dict[m] for m in metids], dtype=float)
+        kinetics.bind(metids)
+        changed = kinetics.update(conc)
+        rids = [kinetics.rxn_ids[i] for i in changed]
+        values = kinetics.values[changed]
+        if kinetics.mode == 'keff':
+            self.set_keffs_numeric(rids, values)
+        else:
+            for rid, v in zip(rids, values):
+                if self.exchange_one_rxn:
+                    self.set_bounds(rid, lb=-v)
+                else:
+                    self.set_bounds(rid, ub=v)
+            self.apply_bound_deltas()
+
+        return len(changed)
+
+    def get_uptake_kinetics(self, conc_dep_fluxes, transport_classes={'PTS'}):
+        """
+        kinetics = get_uptake_kinetics(conc_dep_fluxes)
 
+        Resolve the conc_dep_fluxes argument of simulate_batch to an
+        UptakeKinetics object (or None).
+        """
+        if conc_dep_fluxes is None or conc_dep_fluxes is False:
+            return None
+        if isinstance(conc_dep_fluxes, UptakeKinetics):
+            return conc_dep_fluxes
+        if self.uptake_kinetics is None:
+            self.uptake_kinetics = self.make_transport_kinetics(transport_classes)
+        return self.uptake_kinetics
+
+    def make_transport_kinetics(self, transport_classes={'PTS'}, tol=1e-2):
+        """
+        kinetics = make_transport_kinetics(transport_classes)
+
+        Chassagnole keff kinetics for PTS reactions, using each
+        reaction's current keff as kcat. The substrate is the
+        periplasmic reactant, mapped to its extracellular ID.
+        """
+        me = self.me
+        kinetics = UptakeKinetics(mode='keff', tol=tol)
         transport_classesL  = [c.lower() for c in transport_classes]
-        if 'PTS' in transport_classesL:
+        if 'pts' in transport_classesL:
             rxns_pts = me.reactions.query('ptspp')
             # Substitute concentration-dependent keff for each substrate
+            for rxn in rxns_pts:
+                if not hasattr(rxn, 'keff'):
+                    continue
+                subs = [m.id for m,s in iteritems(rxn.metabolites) if
+                        not hasattr(s,'subs') and s < 0 and m.id.endswith('_p')]
+                if subs:
+                    metid = subs[0][:-2] + '_e'
+                    kinetics.add_chassagnole_pts(rxn.id, metid, rxn.keff)
+
+        return kinetics
 
+    def set_keffs_numeric(self, rids, keffs):
+        """
+        Set keffs of rxns by rescaling the mu term of their compiled
+        enzyme coupling coefficients (e.g., -mu/keff in -mu/keff - 1),
+        which is taken to scale with 1/keff. No sympy update or recompile,
+        and the model (rxn.keff, stoichiometry) is left unchanged: use
+        keff_scales (as get_cplx_concs does) to account for these keffs
+        outside the LP. Original expressions are kept for reset_keffs_numeric.
+        """
+        me = self.me
+        solver = self.solver
+        compiled = solver.compiled_expressions
+        for rid, keff in zip(rids, keffs):
+            if rid not in self._keff_exprs0:
+                rxn = me.reactions.get_by_id(rid)
+                irxn = me.reactions.index(rxn)
+                entries = []
+                for met,stoich in iteritems(rxn.metabolites):
+                    if hasattr(stoich,'free_symbols') and mu in stoich.free_symbols:
+                        key = (me.metabolites.index(met), irxn)
+                        if key in compiled:
+                            # Only the mu term scales with 1/keff
+                            mu_term = sympy.expand(stoich - stoich.subs(mu, 0))
+                            entries.append((key, compiled[key], solver.compile_expr(mu_term)))
+                self._keff_exprs0[rid] = (rxn.keff, entries)
+            keff0, entries = self._keff_exprs0[rid]
+            scale = _keff_scale(keff0, keff)
+            for key, expr0, mu_expr in entries:
+                compiled[key] = _scaled_expr(expr0, mu_expr, scale)
+            self._keffs_numeric[rid] = keff
+
+    def reset_keffs_numeric(self):
+        """
+        Restore compiled expressions changed by set_keffs_numeric
+        """
+        compiled = self.solver.compiled_expressions
+        for rid, (keff0, entries) in iteritems(self._keff_exprs0):
+            for key, expr0, mu_expr in entries:
+                compiled[key] = expr0
+        self._keff_exprs0 = {}
+        self._keffs_numeric = {}
+
+    def keff_scales(self):
+        """
+        {rxn ID: keff0/keff} of keffs set by set_keffs_numeric: the factor
+        on the mu term of their coupling coefficients in the LP
+        """
+        return {rid: _keff_scale(self._keff_exprs0[rid][0], keff)
+                for rid, keff in iteritems(self._keffs_numeric)}
 
     def get_dilution_dict(self, cplx, extra_dil_prefix='extra_dilution_',
             excludes=['damage_','demetallation_'],
@@ -516,14 +1414,14 @@ class DynamicME(object):
         Get total dilution for this rxn = sum_j vuse + extra_dilution
         """
         me = self.me
+        index = get_complex_index(me)
+        rxn_types = tuple(rxn_types)
 
         # Just want the coefficient on mu (1/keff). Then, multiply mu back on.
         # I.e., don't want mu/keff + 1, etc. The +1 part does not contribute to dilution.
         # vdil = mu/keff * v
-        dil_dict = {r:-r.metabolites[cplx].coeff(mu)*mu for r in cplx.reactions if
-                r.metabolites[cplx]<0 and
-                hasattr(r.metabolites[cplx],'subs') and
-                any([isinstance(r,t) for t in rxn_types]) and
+        dil_dict = {r:-r.metabolites[cplx].coeff(mu)*mu for r in index.catalyzed[cplx.id] if
+                isinstance(r,rxn_types) and
                 all([s not in r.id for s in excludes])}
         rid_extra_dil = extra_dil_prefix + cplx.id
 
@@ -575,37 +1473,39 @@ class DynamicME(object):
         """
         me = self.me
         solver = self.solver
+        index = get_complex_index(me)
 
         # Diluted complexes
         for cplx_id, conc in iteritems(cplx_conc_dict):
             cplx = me.metabolites.get_by_id(cplx_id)
             # Include cases like ribosome, which catalyzes but 
             # not MetabolicReactions
-            for rxn in cplx.reactions:
+            for rxn in index.symbolic[cplx_id]:
                 stoich = rxn.metabolites[cplx]
-                if hasattr(stoich,'subs'):
-                    keff = mu / stoich
-                    # Add constraint
-                    cons_id = 'cons_rate_'+rxn.id
-                    if me.metabolites.has_id(cons_id):
-                        cons = me.metabolites.get_by_id(cons_id)
-                    else:
-                        cons = Constraint(cons_id)
-                        me.add_metabolites(cons)
-                    cons._constraint_sense = csense
-                    cons._bound = keff*cplx_conc_dict[cplx.id]
-                    # And include the rxn in this constraint
-                    rxn.add_metabolites({cons: 1}, combine=False)
-
-                    ### Append to compiled expressions
-                    mind = me.metabolites.index(cons)
-                    expr = solver.compile_expr(cons._bound)
-                    solver.compiled_expressions[(mind,None)] = (expr,
-                            cons._constraint_sense)
+                keff = mu / stoich
+                # Add constraint
+                cons_id = 'cons_rate_'+rxn.id
+                if me.metabolites.has_id(cons_id):
+                    cons = me.metabolites.get_by_id(cons_id)
+                else:
+                    cons = Constraint(cons_id)
+                    me.add_metabolites(cons)
+                cons._constraint_sense = csense
+                cons._bound = keff*cplx_conc_dict[cplx.id]
+                # And include the rxn in this constraint
+                rxn.add_metabolites({cons: 1}, combine=False)
+
+                ### Append to compiled expressions
+                mind = me.metabolites.index(cons)
+                expr = solver.compile_expr(cons._bound)
+                solver.compiled_expressions[(mind,None)] = (expr,
+                        cons._constraint_sense)
 
         # Need to reset basis
         self.solver.lp_hs = None
         self.solver.feas_basis = None
+        # and rebuild rhs, constraint senses on next LP
+        self.reset_lp_cache()
 
 
     def update_inertia_constraints(self, cplx_conc_dict={}, csense='L'):
@@ -613,9 +1513,10 @@ class DynamicME(object):
         Update inertia constraints with new complex concentrations
         """
         me = self.me
+        index = get_complex_index(me)
         for cplx_id, conc in cplx_conc_dict.items():
             cplx = me.metabolites.get_by_id(cplx_id)
-            for rxn in cplx.reactions:
+            for rxn in index.symbolic[cplx_id]:
                 cons_id = 'cons_rate_' + rxn.id
                 if me.metabolites.has_id(cons_id):
                     stoich = rxn.metabolites[cplx]
@@ -625,49 +1526,100 @@ class DynamicME(object):
                     cons._bound = keff*conc
 
 
-    def calc_cplx_concs(self, complexes, x_dict, muopt):
+    def calc_cplx_concs(self, complexes, x_dict=None, muopt=None):
         """
         Calculate complex concentrations given solution x_dict and keffs of model
 
         conc = sum_(i\in rxns_catalyzed_by_cplx) mu / keffi
+
+        x_dict: solution as dict or as vector ordered as me.reactions.
+                Default: self.x
         """
         me = self.me
-        cplx_conc_dict = {}
+        solver = self.solver
+        if x_dict is None:
+            x = self.x
+        elif isinstance(x_dict, dict):
+            x = np.array([x_dict[rxn.id] for rxn in me.reactions])
+        else:
+            x = np.asarray(x_dict, dtype=float).ravel()
+        if muopt is None:
+            muopt = x[me.reactions.index(self.growth_rxn)]
+
         subs_dict = dict(self.solver.substitution_dict)
         subs_dict['mu'] = muopt
         sub_vals = [subs_dict[k] for k in self.subs_keys_ordered]
 
-        for cplx in complexes:
-            concs = []
-            for rxn in cplx.reactions:
-                stoich = rxn.metabolites[cplx]
+        # Entries (complex position, rxn index, compiled stoich)
+        index = get_complex_index(me)
+        rows = []
+        cols = []
+        svals = []
+        for i,cplx in enumerate(complexes):
+            imet = me.metabolites.index(cplx)
+            for rxn in index.symbolic[cplx.id]:
                 irxn = me.reactions.index(rxn)
-                if hasattr(stoich,'subs'):
-                    # Make sure this converts to float!
-                    imet = me.metabolites.index(cplx)
-                    expr = solver.compiled_expressions[(imet,irxn)]
-                    sval = expr(*sub_vals)
-
-                    keff = float(muopt / sval)
-                    conc = x_dict[rxn.id] / keff
-                    concs.append(conc)
-
-            conc_total = sum(concs)
-            cplx_conc_dict[cplx.id] = conc_total
+                expr = solver.compiled_expressions[(imet,irxn)]
+                rows.append(i)
+                cols.append(irxn)
+                # Make sure this converts to float!
+                svals.append(float(expr(*sub_vals)))
+
+        # conc = v / keff = v * stoich / mu
+        rows = np.array(rows, dtype=int)
+        cols = np.array(cols, dtype=int)
+        keff_inv = np.array(svals) / muopt
+        concs = np.bincount(rows, weights=x[cols]*keff_inv,
+                            minlength=len(complexes))
+        cplx_conc_dict = {cplx.id:concs[i] for i,cplx in enumerate(complexes)}
 
         return cplx_conc_dict
 
 
 
-    def cplx_to_prot_concs(self, cplx_conc_dict):
+    def cplx_to_prot_concs(self, cplx_concs, cplx_ids=None, include_modifications=False):
         """
-        Convert complex concentrations to protein concentrations
+        prot_concs = cplx_to_prot_concs(cplx_concs, cplx_ids=None)
+
+        Convert complex concentrations to protein (subunit) concentrations:
+        sum over complexes of subunit copies times complex concentration.
+        cplx_concs: dict of complex ID - conc, DataFrame with complex
+                    columns (e.g., pd.DataFrame(result['complex'])), or
+                    (n_time, n_cplx) array with columns cplx_ids
+        cplx_ids:   complexes (default: all, in ComplexIndex order)
+        include_modifications: also return modification components
+        Returns the same type: dict, DataFrame, or array with columns
+        ordered as ComplexIndex.subunit_matrix prot_ids.
         """
+        P, prot_ids, cplx_ids = get_complex_index(self.me).subunit_matrix(
+            self.me, cplx_ids, include_modifications)
+        X, wrap = _conc_array(cplx_concs, cplx_ids)
+        Y = P.dot(X.T).T
+        return wrap(np.asarray(Y), prot_ids)
 
-    def prot_to_cplx_concs(self, prot_conc_dict):
+    def prot_to_cplx_concs(self, prot_concs, cplx_ids=None):
         """
-        Convert protein concentrations to complex concentrations
+        cplx_concs = prot_to_cplx_concs(prot_concs, cplx_ids=None)
+
+        Convert protein concentrations to complex concentrations, each
+        complex limited by its scarcest subunit: min over subunits of
+        protein conc / copies. Subunits shared by several complexes are
+        counted fully for each. Complexes without subunits get 0.
+        prot_concs: dict, DataFrame or array (columns ordered as
+                    ComplexIndex.subunit_matrix prot_ids); missing
+                    proteins count as 0
+        Returns the same type (see cplx_to_prot_concs).
         """
+        P, prot_ids, cplx_ids = get_complex_index(self.me).subunit_matrix(self.me, cplx_ids)
+        Y, wrap = _conc_array(prot_concs, prot_ids)
+        Pc = P.tocsc()
+        Pc.sort_indices()
+        X = np.zeros((Y.shape[0], len(cplx_ids)))
+        cols = np.flatnonzero(np.diff(Pc.indptr) > 0)
+        if len(cols):
+            ratios = Y[:, Pc.indices] / Pc.data
+            X[:, cols] = np.minimum.reduceat(ratios, Pc.indptr[cols], axis=1)
+        return wrap(X, cplx_ids)
 
 
 
@@ -676,6 +1628,209 @@ class DynamicME(object):
 #============================================================
 
 
+def _keff_scale(keff0, keff):
+    """
+    keff0/keff, capped so near-zero keffs at depletion stay well-conditioned
+    """
+    return min(float(keff0) / max(float(keff), 1e-12), 1e6)
+
+
+def _scaled_expr(expr0, mu_expr, scale):
+    """
+    Compiled expression expr0 with its mu term (compiled mu_expr)
+    multiplied by scale
+    """
+    def expr(*args):
+        return expr0(*args) + (scale - 1.) * mu_expr(*args)
+    return expr
+
+
+
+def stationary_trajectory(conc, v_net, X, dt, n_steps, is_o2, kLa=0., o2_head=0.):
+    """
+    C = stationary_trajectory(conc, v_net, X, dt, n_steps, is_o2, kLa, o2_head)
+
+    Concentrations over the next n_steps of simulate_batch (rows) at
+    constant biomass X and net exchange fluxes v_net. Linear in the step
+    number, except O2 (is_o2), which relaxes geometrically towards
+    o2_head + v*X/kLa. Same as stepping
+    conc' = conc + v*X*dt + kLa*(o2_head - conc)*dt.
+    """
+    k = np.arange(1, n_steps+1)[:,None]
+    C = conc + k*(v_net*X*dt)
+    if np.any(is_o2) and kLa*dt != 0:
+        c_inf = o2_head + v_net[is_o2]*X/kLa
+        C[:,is_o2] = c_inf + (1. - kLa*dt)**k * (conc[is_o2] - c_inf)
+    return C
+
+
+def _conc_array(concs, ids):
+    """
+    X, wrap = _conc_array(concs, ids)
+
+    (n_time, len(ids)) array from a dict, DataFrame or array of
+    concentrations, and wrap(Y, out_ids) converting results back to
+    the input type
+    """
+    if isinstance(concs, dict):
+        X = np.array([[concs.get(i, 0.) for i in ids]], dtype=float)
+        return X, lambda Y, out_ids: dict(zip(out_ids, Y[0]))
+    if isinstance(concs, pd.DataFrame):
+        X = concs.reindex(columns=ids, fill_value=0.).values.astype(float)
+        return X, lambda Y, out_ids: pd.DataFrame(Y, index=concs.index, columns=out_ids)
+    X = np.asarray(concs, dtype=float)
+    if X.ndim == 1:
+        return X[None,:], lambda Y, out_ids: Y[0]
+    return X, lambda Y, out_ids: Y
+
+
+#============================================================
+# Parameter sweeps (see DynamicME.sweep)
+
+SWEEP_DICT_ARGS = ('c0_dict', 'lb_dict', 'ub_dict')
+
+
+def sweep_points(grid):
+    """
+    points = sweep_points(grid)
+
+    List of parameter dicts from grid: a dict of parameter - values
+    (all combinations) or a list of parameter dicts (used as is)
+    """
+    if isinstance(grid, dict):
+        params = list(grid.keys())
+        return [dict(zip(params, vals))
+                for vals in itertools.product(*[grid[p] for p in params])]
+    return [dict(point) for point in grid]
+
+
+def sweep_coords(points, params=None):
+    """
+    X = sweep_coords(points, params=None)
+
+    (n_points, n_params) coordinates of points, each parameter scaled to
+    [0, 1]. Non-numeric values are replaced by their rank.
+    """
+    if params is None:
+        params = []
+        for point in points:
+            params.extend(p for p in point if p not in params)
+    X = np.zeros((len(points), len(params)))
+    for k, param in enumerate(params):
+        vals = [point.get(param) for point in points]
+        try:
+            col = np.array(vals, dtype=float)
+        except (TypeError, ValueError):
+            levels = sorted(set(vals), key=str)
+            col = np.array([levels.index(v) for v in vals], dtype=float)
+        span = np.nanmax(col) - np.nanmin(col) if len(col) else 0.
+        col = np.nan_to_num(col - np.nanmin(col)) / span if span > 0 else np.zeros(len(col))
+        X[:,k] = col
+    return X
+
+
+def order_points(points, order='nn', params=None):
+    """
+    path = order_points(points, order='nn', params=None)
+
+    Order in which to simulate points so that consecutive points are close.
+    order: 'nn':    greedy nearest neighbour (L1 distance on scaled
+                    coordinates), starting at the lowest corner
+           'snake': boustrophedon over the levels of each parameter (first
+                    parameter slowest). On a full grid, consecutive points
+                    differ by one level of one parameter.
+           None:    as given
+    params: parameter order (default: order of first appearance)
+    """
+    n = len(points)
+    if order is None or n < 2:
+        return np.arange(n)
+    X = sweep_coords(points, params)
+    if order == 'nn':
+        remaining = np.ones(n, dtype=bool)
+        path = [int(np.argmin(X.sum(axis=1)))]
+        remaining[path[0]] = False
+        for _ in range(n-1):
+            dist = np.abs(X - X[path[-1]]).sum(axis=1)
+            dist[~remaining] = np.inf
+            i = int(np.argmin(dist))
+            path.append(i)
+            remaining[i] = False
+        return np.array(path, dtype=int)
+    elif order == 'snake':
+        pos = np.zeros(n, dtype=np.int64)
+        for k in range(X.shape[1]):
+            levels, r = np.unique(X[:,k], return_inverse=True)
+            n_k = len(levels)
+            pos = pos*n_k + np.where(pos % 2 == 0, r, n_k-1-r)
+        return np.argsort(pos, kind='mergesort')
+    else:
+        raise ValueError("order must be 'nn', 'snake' or None")
+
+
+def sweep_kwargs(sim_kwargs, point):
+    """
+    simulate_batch keyword arguments for one sweep point
+    """
+    kwargs = dict(sim_kwargs)
+    for arg in SWEEP_DICT_ARGS:
+        kwargs[arg] = dict(kwargs.get(arg, {}))
+    for param, val in iteritems(point):
+        if ':' in param:
+            arg, key = param.split(':', 1)
+            if arg not in SWEEP_DICT_ARGS:
+                raise ValueError('Unknown sweep parameter: %s' % param)
+            kwargs[arg][key] = val
+        else:
+            kwargs[param] = val
+    return kwargs
+
+
+def result_to_frame(result):
+    """
+    df = result_to_frame(result)
+
+    simulate_batch result as one DataFrame: time, biomass,
+    concentrations, exchange fluxes and tracked rxn fluxes
+    """
+    df_time = pd.DataFrame({'time':result['time'], 'biomass':result['biomass']},
+                           columns=['time','biomass'])
+    df = pd.concat([df_time, pd.DataFrame(result['concentration']),
+                    pd.DataFrame(result['ex_flux']),
+                    pd.DataFrame(result['rxn_flux'])], axis=1)
+    return df.loc[:, ~df.columns.duplicated()]
+
+
+def run_sweep_chunk(dyme, items, sim_kwargs, verbosity=0):
+    """
+    df = run_sweep_chunk(dyme, items, sim_kwargs)
+
+    Simulate sweep points in order on dyme, each warm-started from the
+    bases of the previous one.
+    items: (point index, path position, point) tuples
+    """
+    frames = []
+    basis = sim_kwargs.get('basis')
+    basis_ref = None
+    for ipoint, pos, point in items:
+        kwargs = sweep_kwargs(sim_kwargs, point)
+        kwargs.update({'basis':basis, 'basis_ref':basis_ref, 'record_bases':True,
+                       'verbosity':verbosity})
+        result = dyme.simulate_batch(**kwargs)
+        basis = result['basis']
+        basis_ref = result['basis_events']
+        df = result_to_frame(result)
+        cols = [('point', ipoint), ('path_pos', pos)] + \
+            [(param, point[param]) for param in point]
+        for k, (col, val) in enumerate(cols):
+            df.insert(k, col, [val]*len(df))
+        frames.append(df)
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+
 #============================================================
 # Local move methods (modifies me in place)
 class LocalMove(object):
@@ -685,9 +1840,16 @@ class LocalMove(object):
     Must implement these methods:
     move
     unmove: resets ME model to before the move
+    Optional (used to screen candidate moves):
+    sample: draw a move without applying it
+    apply:  apply a sampled move
+
+    rng: numpy.random.Generator (or RandomState) used for moves.
+         Default: the global numpy.random state
     """
-    def __init__(self, me):
+    def __init__(self, me, rng=None):
         self.me = me
+        self.rng = rng
         # Default move type-parameter dict
         self.move_param_dict = {
             'uniform': {
@@ -723,70 +1885,77 @@ class LocalMove(object):
         pert_rxns: IDs of perturbed reactions
         group_rxn_dict: dict of group - perturbed reaction ID
         """
-        from numpy.random import uniform
+        keffs = self.sample(me, pert_rxns, method=method, group_rxn_dict=group_rxn_dict)
+        if keffs is None:
+            keffs = {}
+        self.apply(me, keffs, verbosity=verbosity)
+
+    def sample(self, me, pert_rxns, method='uniform', group_rxn_dict=None):
+        """
+        keffs = sample(me, pert_rxns, method='uniform', group_rxn_dict=None)
 
+        Draw a move without applying it. Returns dict of rxn ID - new keff
+        (see move), or None if the method is not available.
+        """
+        rng = self.rng if self.rng is not None else np.random
         n_pert = len(pert_rxns)
         param_dict = self.move_param_dict
-        ### Save params before move
-        self.params0 = {}
+        keffs = {}
 
         if method in param_dict:
             params = param_dict[method]
-            if method is 'uniform':
+            if method == 'uniform':
                 rmin = params['min']
                 rmax = params['max']
-                rs = np.random.uniform(rmin,rmax,n_pert)
+                rs = rng.uniform(rmin,rmax,n_pert)
                 # Perturb individually or in groups (all up/down)?
                 if group_rxn_dict is None:
                     for j,rid in enumerate(pert_rxns):
                         rxn = me.reactions.get_by_id(rid)
-                        self.params0[rxn.id] = rxn.keff
-
-                        keff2 = rxn.keff * rs[j]
-
-                        if verbosity >= 2:
-                            print('Rxn: %s\t keff_old=%g\t keff_new=%g'%(
-                                    rxn.id, rxn.keff, keff2))
-
-                        rxn.keff = keff2
-                        rxn.update()
+                        keffs[rid] = rxn.keff * rs[j]
                 else:
                     n_groups = len(list(group_rxn_dict.keys()))
-                    rs = uniform(rmin,rmax, n_groups)
+                    rs = rng.uniform(rmin,rmax, n_groups)
                     for gind, (group,rids) in enumerate(group_rxn_dict.items()):
-                        #rand = np.random.uniform(rmin,rmax)
-                        #rand = uniform(rmin,rmax)
                         rand = rs[gind]
                         for rid in rids:
                             if rid in pert_rxns:
-                                rxn = me.reactions.get_by_id(rid)
-                                self.params0[rxn.id] = rxn.keff
-                                keff2 = rxn.keff * rand
-                                if verbosity >= 2:
-                                    print('Group: %s\t Rxn: %s\t keff_old=%g\t keff_new=%g'%(
-                                            group, rxn.id, rxn.keff, keff2))
-                                rxn.keff = keff2
-                                rxn.update()
-
-            elif method is 'lognormal':
+                                keff = keffs.get(rid, me.reactions.get_by_id(rid).keff)
+                                keffs[rid] = keff * rand
+
+            elif method == 'lognormal':
                 norm_mean = params['mean']
                 norm_std  = params['std']
                 kmin  = params['min']
                 kmax  = params['max']
-                ks = 10**np.random.normal(norm_mean, norm_std, n_pert)
+                ks = 10**rng.normal(norm_mean, norm_std, n_pert)
                 ks[ks < kmin] = kmin
                 ks[ks > kmax] = kmax
                 for j,rid in enumerate(pert_rxns):
-                    rxn = me.reactions.get_by_id(rid)
-                    self.params0[rxn.id] = rxn.keff
-                    rxn.keff = ks[j]
-                    rxn.update()
+                    keffs[rid] = ks[j]
 
             else:
                 print('Move method not implemented:', method)
+                return None
 
         else:
             warnings.warn('No parameters found for move: random')
+            return None
+
+        return keffs
+
+    def apply(self, me, keffs, verbosity=0):
+        """
+        Apply a sampled move (dict of rxn ID - keff). unmove() reverts it.
+        """
+        self.params0 = {}
+        for rid,keff2 in keffs.items():
+            rxn = me.reactions.get_by_id(rid)
+            self.params0[rid] = rxn.keff
+            if verbosity >= 2:
+                print('Rxn: %s\t keff_old=%g\t keff_new=%g'%(rid, rxn.keff, keff2))
+            rxn.keff = keff2
+            rxn.update()
 
 
 # class ParallelMove(object):
@@ -855,6 +2024,17 @@ class LocalMove(object):
 #             if verbosity >= 1:
 #                 print('Gathering samples by root')
 
+#============================================================
+# Default multi-fidelity schedule for ParamOpt.fit_profile.
+# coarse: Phase I (list filling) and screening of Phase II candidates
+# fine:   candidates that pass screening
+# dt_factor multiplies sim_params['dt']
+FIT_FIDELITY = {
+    'coarse': {'prec_bs': 1e-2, 'dt_factor': 2.},
+    'fine': {'prec_bs': 1e-3, 'dt_factor': 1.},
+    'phase1': 'coarse',
+    'screen_iters': None}
+
 #============================================================
 class ParamOpt(object):
     """
@@ -865,20 +2045,102 @@ class ParamOpt(object):
     me:         ME model (1.0 or 2.0)
     sim_params: dict of simulation parameters:
                 T, c0_dict, ZERO_CONC, extra_rxns_tracked, lb_dict
+    conditions: list of (sim_params, df_meas, weights) to fit at once.
+                weights: None, scalar multiplying the condition error, or
+                dict of column weights (see calc_error_conc).
+                sim_params defaults to that of the first condition.
     """
 
-    def __init__(self, me, sim_params,
+    def __init__(self, me, sim_params=None,
                  growth_key='mu', growth_rxn='biomass_dilution',
-                 exchange_one_rxn=None):
+                 exchange_one_rxn=None, backend=None, conditions=None):
         self.me = me
         self.growth_key = growth_key
         self.growth_rxn = growth_rxn
-        self.sim_params = sim_params
         self.exchange_one_rxn = exchange_one_rxn
+        self.backend = backend
+        self.conditions = None
+        if conditions is not None:
+            self.conditions = []
+            for cond in conditions:
+                if not isinstance(cond, dict):
+                    cond = dict(zip(['sim_params','df_meas','weights'], cond))
+                self.conditions.append(cond)
+            if sim_params is None:
+                sim_params = self.conditions[0]['sim_params']
+        self.sim_params = sim_params
         random_move = LocalMove(me)
         self.move_objects = [random_move]
 
 
+    def make_dyme(self):
+        """
+        New DynamicME for self.me (compiles the current keffs)
+        """
+        return DynamicME(self.me, growth_key=self.growth_key, growth_rxn=self.growth_rxn,
+                         exchange_one_rxn=self.exchange_one_rxn, backend=self.backend)
+
+
+    def make_pool(self, n_workers=None, df_meas=None):
+        """
+        pool = make_pool(n_workers=None, df_meas=None)
+
+        WorkerPool for scoring conditions or keff sets in parallel.
+        Each worker holds a copy of the model, with its current keffs,
+        and of the conditions (or sim_params and df_meas).
+        """
+        worker_data = {'conditions': self.conditions, 'sim_params': self.sim_params,
+                       'df_meas': df_meas}
+        return WorkerPool(self.make_dyme(), n_workers=n_workers, worker_data=worker_data)
+
+
+    def get_conditions(self, df_meas=None):
+        """
+        self.conditions, or the single condition (sim_params, df_meas)
+        """
+        if self.conditions is not None:
+            return self.conditions
+        return [{'sim_params': self.sim_params, 'df_meas': df_meas, 'weights': None}]
+
+
+    def score_keffs(self, keffs_list, variables, df_meas=None, error_fun=None,
+                    basis=None, verbosity=0, pool=None, **sim_opts):
+        """
+        scores = score_keffs(keffs_list, variables, df_meas=None, pool=None)
+
+        (objval, result, df_sim) of each keff set (dict of rxn ID - keff)
+        in keffs_list. result and df_sim are lists over conditions if
+        self.conditions is set.
+        With pool (see make_pool), keff sets are simulated in parallel with
+        numeric keff updates on the workers' models. Otherwise they are
+        simulated in turn on self.me, whose keffs are restored afterwards.
+        """
+        if pool is not None:
+            tasks = [(keffs, variables, error_fun, basis, sim_opts) for keffs in keffs_list]
+            return pool.map(_score_keffs_task, tasks)
+
+        me = self.me
+        rids = set()
+        for keffs in keffs_list:
+            rids.update(keffs.keys())
+        keffs_orig = {rid:me.reactions.get_by_id(rid).keff for rid in rids}
+        scores = []
+        for keffs in keffs_list:
+            self.update_keffs(keffs)
+            if self.conditions is not None:
+                scores.append(self.score_conditions(variables, error_fun=error_fun,
+                                                    basis=basis, verbosity=verbosity,
+                                                    **sim_opts))
+            else:
+                dyme = self.make_dyme()
+                scores.append(self.score_condition(dyme, self.get_conditions(df_meas)[0],
+                                                   variables, error_fun=error_fun,
+                                                   basis=basis, verbosity=verbosity,
+                                                   **sim_opts))
+        self.update_keffs(keffs_orig)
+        return scores
+
+
     def update_keffs(self, keff_dict):
         me = self.me
         for rid,keff in keff_dict.items():
@@ -900,9 +2162,54 @@ class ParamOpt(object):
                     max_reject = 10,
                     group_rxn_dict=None,
                     verbosity=2,
-                    error_fun=None):
+                    error_fun=None,
+                    profiler=None,
+                    fidelity=None,
+                    surrogate=None,
+                    n_candidates=8,
+                    surrogate_kappa=1.,
+                    pool=None,
+                    n_workers=None,
+                    rng=None,
+                    Ts0=None,
+                    replay_bases=False):
         """
         Tune parameters (e.g., keffs) to fit flux or conc profile
+
+        profiler: Profiler recording per-move time in move, simulate and score
+        fidelity: None: simulate every candidate at the sim_params dt and
+                  prec_bs=1e-3.
+                  'multi' or dict (see FIT_FIDELITY and get_fidelity_schedule):
+                  Phase I and screening of Phase II candidates use coarse
+                  fidelity (looser bisection, larger dt). Only candidates
+                  within the threshold at coarse fidelity are re-simulated
+                  at fine fidelity, and only fine objectives are accepted or
+                  reported as best.
+        surrogate: None, True (RandomFeatureSurrogate()) or object with
+                  add(z, objval), predict(Z) -> (mean, std) and ready.
+                  Trained on log10 keffs of pert_rxns and the (fine)
+                  objective of every simulation. Once ready, each Phase II
+                  move draws n_candidates moves and simulates only the one
+                  with the lowest bound mean - surrogate_kappa*std, and only
+                  if that bound is within the threshold. Skipped
+                  simulations are undone like rejected moves but do not count
+                  toward max_reject; they are reported as n_sims_saved in
+                  opt_stats.
+        pool:     WorkerPool from make_pool, used if self.conditions is set.
+                  Default: a pool of n_workers processes for the duration of
+                  the fit (n_workers=0: score conditions serially).
+                  With conditions, df_meas is ignored, the objective is the
+                  sum of weighted condition errors and results/solutions are
+                  lists over conditions.
+        rng:      numpy.random.Generator used by the move objects for this fit
+        Ts0:      initial threshold list (default: [Thresh0])
+        replay_bases: record the basis of every solve event of the current
+                  solution and warm-start each solve event of a candidate
+                  from the matching event (single condition only)
+
+        The final search state (thresholds, current and best keffs and
+        objectives) is kept in self.lbta_state, so that a fit can be
+        continued with result0=lbta_state['result'], Ts0=lbta_state['Ts'].
         """
         #----------------------------------------------------
         # LBTA
@@ -944,32 +2251,115 @@ class ParamOpt(object):
         #----------------------------------------------------
 
         opt_stats = []
+        slog = SimLogger(verbosity)
+        if profiler is None:
+            profiler = NullProfiler()
+        timer = time.time
+        schedule = self.get_fidelity_schedule(fidelity)
+        sim_opts = {'coarse': {}, 'fine': {}}
+        if schedule is not None:
+            sim_opts = {level: {k:schedule[level][k] for k in ['prec_bs','dt']}
+                        for level in ['coarse','fine']}
+            level1 = schedule['phase1']
+            screen_iters = schedule['screen_iters']
+        else:
+            level1 = 'fine'
+            screen_iters = 0
+
+        conditions = self.conditions
+        own_pool = False
+        if conditions is not None and pool is None and n_workers != 0:
+            pool = self.make_pool(n_workers)
+            own_pool = True
+
+        # Basis events of the current solution, per fidelity
+        basis_refs = {'coarse': None, 'fine': None}
+        if replay_bases and result0 is not None and conditions is None:
+            basis_refs['fine'] = result0.get('basis_events')
+
+        def evaluate(level):
+            """
+            Simulate and score current params at fidelity level
+            """
+            tic_sim = timer()
+            if conditions is not None:
+                objval, result, df_sim = self.score_conditions(
+                    variables, error_fun=error_fun, basis=basis, verbosity=verbosity,
+                    pool=pool, pert_rxns=pert_rxns, **sim_opts[level])
+                profiler.add('simulate', timer()-tic_sim)
+            else:
+                dyme = self.make_dyme()
+                result = self.simulate_batch(dyme, basis=basis, verbosity=verbosity,
+                                             basis_ref=basis_refs[level],
+                                             record_bases=replay_bases,
+                                             **sim_opts[level])
+                profiler.add('simulate', timer()-tic_sim)
+                tic_sim = timer()
+                df_sim = self.compute_conc_profile(result)
+                objval = self.calc_error_conc(df_sim, df_meas, variables, error_fun=error_fun)
+                profiler.add('score', timer()-tic_sim)
+            if surrogate is not None and level == 'fine':
+                surrogate.add(get_log_keffs(), objval)
+            return result, df_sim, objval
+
+        if surrogate is True:
+            surrogate = RandomFeatureSurrogate()
+        pert_rxn_objs = [self.me.reactions.get_by_id(rid) for rid in pert_rxns]
+
+        def get_log_keffs(keffs={}):
+            return np.log10([keffs.get(rxn.id, rxn.keff) for rxn in pert_rxn_objs])
+
+        def get_keffs():
+            return {rxn.id:rxn.keff for rxn in pert_rxn_objs}
+
+        n_sims_saved = 0
+
         #----------------------------------------------------
         # Phase I: list filling
         #----------------------------------------------------
         Thresh = Thresh0
-        Ts = [Thresh]
+        Ts = [Thresh] if Ts0 is None else list(Ts0)
 
         me = self.me
-        growth_key = self.growth_key
-        growth_rxn = self.growth_rxn
-        dyme = DynamicME(me, growth_key=growth_key, growth_rxn=growth_rxn,
-                         exchange_one_rxn=self.exchange_one_rxn)
 
         # Get initial solution
         if result0 is None:
-            result0 = self.simulate_batch(dyme, basis=basis, verbosity=verbosity)
-        df_sim0 = self.compute_conc_profile(result0)
-        objval0 = self.calc_error_conc(df_sim0, df_meas, variables, error_fun=error_fun)
+            result0, df_sim0, objval0 = evaluate('fine')
+            if replay_bases and conditions is None:
+                basis_refs['fine'] = result0.get('basis_events')
+        elif conditions is not None:
+            df_sim0 = [self.compute_conc_profile(r) for r in result0]
+            objval0 = sum(self.condition_error(cond, df, variables, error_fun=error_fun)
+                          for cond, df in zip(conditions, df_sim0))
+            if surrogate is not None:
+                surrogate.add(get_log_keffs(), objval0)
+        else:
+            df_sim0 = self.compute_conc_profile(result0)
+            objval0 = self.calc_error_conc(df_sim0, df_meas, variables, error_fun=error_fun)
+            if surrogate is not None:
+                surrogate.add(get_log_keffs(), objval0)
+        # Reference objective at coarse fidelity, for thresholds of
+        # coarse candidates
+        objval0_coarse = objval0
+        if schedule is not None:
+            result_coarse, _, objval0_coarse = evaluate('coarse')
+            if replay_bases and conditions is None:
+                basis_refs['coarse'] = result_coarse.get('basis_events')
 
         # Perform local moves
         move_objects = self.move_objects
+        if rng is not None:
+            rngs_move = [getattr(mover, 'rng', None) for mover in move_objects]
+            for mover in move_objects:
+                mover.rng = rng
         n_iter = 0
         obj_best = objval0
         sol = df_sim0
         sol_best = sol
         result = result0
         result_best = result
+        result_cur = result
+        keffs_best = get_keffs()
 
         while n_iter < max_iter_phase1:
             n_iter = n_iter + 1
@@ -980,29 +2370,33 @@ class ParamOpt(object):
                 # TODO: PARALLEL sampling and moves
                 # Local move
 
-                if verbosity >= 1:
-                    print('[Phase I] Iter %d:\t Performing local move:'%n_iter, type(mover))
+                profiler.start('move', phase=1, iter=n_iter)
+                slog.info('[Phase I] Iter %d:\t Performing local move: %s', n_iter, type(mover))
                 mover.move(me, pert_rxns, group_rxn_dict=group_rxn_dict)
+                profiler.add('move', timer()-tic)
+
+                # Simulate and compute objective value (error)
+                result, df_sim, objval = evaluate(level1)
+                keffs_moved = get_keffs()
 
-                # Simulate
-                dyme = DynamicME(me, growth_key=growth_key, growth_rxn=growth_rxn,
-                                 exchange_one_rxn=self.exchange_one_rxn)
-                result = self.simulate_batch(dyme, basis=basis, verbosity=verbosity)
                 # Unmove: generate samples surrounding initial point
                 # TODO: PARALLEL unmoves
+                tic_sim = timer()
                 mover.unmove(me)
+                profiler.add('move', timer()-tic_sim, count=0)
 
-                # Compute objective value (error)
-                df_sim = self.compute_conc_profile(result)
-                objval = self.calc_error_conc(df_sim, df_meas, variables, error_fun=error_fun)
-                if objval < obj_best:
+                if level1 == 'fine' and objval < obj_best:
                     obj_best = objval
                     sol_best = sol
                     result_best = result
+                    keffs_best = keffs_moved
 
                 # Calc relative cost deviation
                 #T_rel = (objval - objval0) / (objval0 + 1.0)
-                T_rel = self.calc_threshold(objval0, objval)
+                if level1 == 'fine':
+                    T_rel = self.calc_threshold(objval0, objval)
+                else:
+                    T_rel = self.calc_threshold(objval0_coarse, objval)
 
                 Tmax = max(Ts)
                 if T_rel <= Tmax and T_rel > 0:
@@ -1011,15 +2405,14 @@ class ParamOpt(object):
 
                 opt_stats.append({'phase':1, 'iter':n_iter,
                                   'obj':objval, 'objbest':obj_best,
-                                  'Tmax':Tmax, 'Tk':T_rel})
+                                  'Tmax':Tmax, 'Tk':T_rel, 'fidelity':level1,
+                                  'n_sims_saved':n_sims_saved})
 
                 #--------------------------------------------
                 toc = time.time()-tic
                 #--------------------------------------------
-                if verbosity >= 1:
-                    print('Obj:%g \t Best Obj: %g \t Tmax:%g \t T:%g \t Time:%g secs'%(
-                        objval, obj_best, Tmax, T_rel, toc))
-                    print('//============================================')
+                slog.record('move', phase=1, iter=n_iter, obj=objval, objbest=obj_best,
+                            Tmax=Tmax, T=T_rel, fidelity=level1, secs=toc)
 
         #----------------------------------------------------
         # Phase II: optimization
@@ -1028,35 +2421,65 @@ class ParamOpt(object):
         n_iter = 0
         while (n_iter < max_iter_phase2) and (n_reject < max_reject):
             n_iter = n_iter + 1
+            screen = schedule is not None and (screen_iters is None or n_iter <= screen_iters)
             for mover in move_objects:
                 #--------------------------------------------
                 tic = time.time()
                 #--------------------------------------------
                 # Local move
                 # TODO: PARALLEL sampling and moves
-                if verbosity >= 1:
-                    print('[Phase II] Iter %d:\t Performing local move:'%n_iter, type(mover))
-
-                mover.move(me, pert_rxns, group_rxn_dict=group_rxn_dict)
-
-                # Simulate
-                dyme = DynamicME(me, growth_key=growth_key, growth_rxn=growth_rxn,
-                                 exchange_one_rxn=self.exchange_one_rxn)
-                result = self.simulate_batch(dyme, basis=basis, verbosity=verbosity)
+                profiler.start('move', phase=2, iter=n_iter)
+                slog.info('[Phase II] Iter %d:\t Performing local move: %s', n_iter, type(mover))
 
-                # Compute objective value (error)
-                df_sim = self.compute_conc_profile(result)
-                objval = self.calc_error_conc(df_sim, df_meas, variables, error_fun=error_fun)
-
-                # Calc threshold and accept or reject move
-                #T_new = (objval - objval0) / (objval0+1.0)
-                T_new = self.calc_threshold(objval0, objval)
                 T_max = max(Ts)
+                level = 'fine'
+                if surrogate is not None and surrogate.ready and hasattr(mover, 'sample'):
+                    # Pick the most promising of n_candidates moves
+                    cands = [mover.sample(me, pert_rxns, group_rxn_dict=group_rxn_dict)
+                             for k in range(n_candidates)]
+                    cands = [c for c in cands if c is not None]
+                    Z = np.array([get_log_keffs(c) for c in cands])
+                    pred, pred_std = surrogate.predict(Z)
+                    bound = pred - surrogate_kappa*pred_std
+                    kbest = int(np.argmin(bound))
+                    mover.apply(me, cands[kbest])
+                    T_new = self.calc_threshold(objval0, bound[kbest])
+                    objval = pred[kbest]
+                    if T_new > T_max:
+                        # Not promising: reject without simulating
+                        level = 'surrogate'
+                        n_sims_saved = n_sims_saved + 1
+                else:
+                    mover.move(me, pert_rxns, group_rxn_dict=group_rxn_dict)
+                profiler.add('move', timer()-tic)
+
+                # Screen at coarse fidelity: re-simulate at fine fidelity
+                # only if within threshold
+                if screen and level == 'fine':
+                    result_coarse, _, objval_coarse = evaluate('coarse')
+                    T_new = self.calc_threshold(objval0_coarse, objval_coarse)
+                    objval = objval_coarse
+                    if T_new > T_max:
+                        level = 'coarse'
+
+                if level == 'fine':
+                    result, df_sim, objval = evaluate('fine')
+                    # Calc threshold and accept or reject move
+                    #T_new = (objval - objval0) / (objval0+1.0)
+                    T_new = self.calc_threshold(objval0, objval)
+
                 move_str = ''
-                if T_new <= T_max:
+                if level == 'fine' and T_new <= T_max:
                     # Move if under threshold
                     objval0 = objval
+                    if screen:
+                        objval0_coarse = objval_coarse
                     sol = df_sim
+                    result_cur = result
+                    if replay_bases and conditions is None:
+                        basis_refs['fine'] = result.get('basis_events')
+                        if screen:
+                            basis_refs['coarse'] = result_coarse.get('basis_events')
                     if T_new > 0:
                         Ts.remove(max(Ts))
                         Ts.append(T_new)
@@ -1065,40 +2488,652 @@ class ParamOpt(object):
                         sol_best = sol
                         obj_best = objval
                         result_best = result
+                        keffs_best = get_keffs()
                     move_str = 'accept'
                 else:
-                    n_reject = n_reject + 1
+                    # Surrogate skips were never simulated: they do not
+                    # count toward max_reject (only in n_sims_saved)
+                    if level != 'surrogate':
+                        n_reject = n_reject + 1
                     # Reject move: reset the model via unmove
                     # TODO: PARALLEL unmoves
+                    tic_sim = timer()
                     mover.unmove(me)
-                    move_str = 'reject'
+                    profiler.add('move', timer()-tic_sim, count=0)
+                    move_str = 'skip' if level == 'surrogate' else 'reject'
 
                 opt_stats.append({'phase':2, 'iter':n_iter,
                                   'obj':objval, 'objbest':obj_best,
-                                  'Tmax':Tmax, 'Tk':T_new})
+                                  'Tmax':Tmax, 'Tk':T_new, 'fidelity':level,
+                                  'n_sims_saved':n_sims_saved})
                 #--------------------------------------------
                 toc = time.time()-tic
                 #--------------------------------------------
-                if verbosity >= 1:
-                    print('Obj:%g \t Best Obj: %g \t Tmax:%g \t T:%g \t Move:%s\t n_reject:%d\t Time:%g secs'%(
-                        objval, obj_best, Tmax, T_new, move_str, n_reject, toc))
-                    print('//============================================')
+                slog.record('move', phase=2, iter=n_iter, obj=objval, objbest=obj_best,
+                            Tmax=Tmax, T=T_new, move=move_str, n_reject=n_reject,
+                            fidelity=level, n_sims_saved=n_sims_saved, secs=toc)
+
+        profiler.finish()
+        if own_pool:
+            pool.close()
+        if rng is not None:
+            for mover, rng_move in zip(move_objects, rngs_move):
+                mover.rng = rng_move
+
+        self.lbta_state = {'Ts': list(Ts), 'obj': objval0, 'result': result_cur,
+                           'keffs': get_keffs(), 'obj_best': obj_best,
+                           'keffs_best': keffs_best, 'n_iter': n_iter,
+                           'n_reject': n_reject}
 
         return sol_best, opt_stats, result_best
 
 
-    def simulate_batch(self, dyme, basis=None, prec_bs=1e-3, verbosity=2):
+    def fit_profile_population(self, df_meas, pert_rxns, variables,
+                               n_chains=None,
+                               exchange_every=5,
+                               seed=None,
+                               Thresh0=1.0, result0=None,
+                               basis=None,
+                               max_iter_phase1=10,
+                               max_iter_phase2=100,
+                               max_reject=10,
+                               group_rxn_dict=None,
+                               verbosity=0,
+                               error_fun=None,
+                               fidelity=None,
+                               pool=None):
+        """
+        sol_best, opt_stats, result_best = fit_profile_population(...)
+
+        Island-model LBTA. Runs n_chains fit_profile chains (default:
+        number of cores), each in its own process with its own model copy
+        and numpy.random.Generator (spawned from seed).
+        Every exchange_every Phase II iterations, each chain merges its
+        threshold list with that of its ring neighbour and, if the
+        neighbour's best solution is better than its current one,
+        continues from the neighbour's best keffs.
+        A chain stops after max_iter_phase2 iterations or max_reject
+        rejected moves.
+
+        opt_stats of all chains are merged (with chain and epoch columns).
+        The best keffs found are set in self.me.
+        error_fun must be picklable (e.g., a module-level function).
+        """
+        import multiprocessing
+        from numpy.random import SeedSequence, default_rng
+
+        slog = SimLogger(verbosity)
+        if n_chains is None:
+            n_chains = multiprocessing.cpu_count()
+        own_pool = False
+        if pool is None:
+            worker_data = {'sim_params': self.sim_params, 'conditions': self.conditions,
+                           'df_meas': df_meas, 'pert_rxns': pert_rxns,
+                           'variables': variables}
+            pool = WorkerPool(self.make_dyme(), n_workers=n_chains, worker_data=worker_data)
+            own_pool = True
+
+        keffs0 = {rid:self.me.reactions.get_by_id(rid).keff for rid in pert_rxns}
+        rngs = [default_rng(ss) for ss in SeedSequence(seed).spawn(n_chains)]
+        chains = [{'chain':i, 'rng':rngs[i], 'keffs':dict(keffs0), 'result':result0,
+                   'Ts':None, 'obj':np.inf, 'n_iter':0, 'n_reject':0, 'done':False,
+                   'obj_best':np.inf, 'keffs_best':dict(keffs0),
+                   'sol_best':None, 'result_best':None} for i in range(n_chains)]
+        fit_kwargs = {'Thresh0':Thresh0, 'basis':basis, 'group_rxn_dict':group_rxn_dict,
+                      'verbosity':0, 'error_fun':error_fun, 'fidelity':fidelity,
+                      'n_workers':0}
+
+        opt_stats = []
+        epoch = 0
+        active = chains
+        while active:
+            tasks = []
+            for chain in active:
+                kwargs = dict(fit_kwargs)
+                kwargs['max_iter_phase1'] = max_iter_phase1 if epoch == 0 else 0
+                kwargs['max_iter_phase2'] = min(exchange_every, max_iter_phase2-chain['n_iter'])
+                kwargs['max_reject'] = max_reject - chain['n_reject']
+                state = {k:chain[k] for k in ['keffs','result','Ts','rng']}
+                tasks.append((state, kwargs))
+            outs = pool.map(_lbta_epoch_task, tasks)
+
+            for chain, (state, sol_best, stats, result_best) in zip(active, outs):
+                for row in stats:
+                    row['chain'] = chain['chain']
+                    row['epoch'] = epoch
+                    if row['phase'] == 2:
+                        row['iter'] = row['iter'] + chain['n_iter']
+                opt_stats.extend(stats)
+                for k in ['keffs','result','Ts','rng','obj']:
+                    chain[k] = state[k]
+                chain['n_iter'] = chain['n_iter'] + state['n_iter']
+                chain['n_reject'] = chain['n_reject'] + state['n_reject']
+                if state['obj_best'] < chain['obj_best']:
+                    chain['obj_best'] = state['obj_best']
+                    chain['keffs_best'] = state['keffs_best']
+                    chain['sol_best'] = sol_best
+                    chain['result_best'] = result_best
+                chain['done'] = (chain['n_iter'] >= max_iter_phase2) or \
+                    (chain['n_reject'] >= max_reject) or (state['n_iter'] == 0)
+
+            # Exchange with ring neighbour
+            n_migrate = 0
+            if n_chains > 1:
+                donors = [(c['obj_best'], c['keffs_best'], c['result_best'], c['Ts'])
+                          for c in chains]
+                for i,chain in enumerate(chains):
+                    obj_nb, keffs_nb, result_nb, Ts_nb = donors[(i-1) % n_chains]
+                    if chain['done'] or Ts_nb is None:
+                        continue
+                    Ts_all = np.sort(chain['Ts'] + Ts_nb)
+                    inds = np.round(np.linspace(0, len(Ts_all)-1, len(chain['Ts']))).astype(int)
+                    chain['Ts'] = [float(T) for T in Ts_all[inds]]
+                    if obj_nb < chain['obj'] and result_nb is not None:
+                        chain['keffs'] = dict(keffs_nb)
+                        chain['result'] = result_nb
+                        chain['obj'] = obj_nb
+                        n_migrate += 1
+
+            obj_best = min(c['obj_best'] for c in chains)
+            slog.record('epoch', epoch=epoch, objbest=obj_best, n_migrate=n_migrate,
+                        n_active=sum(not c['done'] for c in chains))
+            epoch = epoch + 1
+            active = [c for c in chains if not c['done']]
+
+        if own_pool:
+            pool.close()
+
+        best = min(chains, key=lambda c: c['obj_best'])
+        self.update_keffs(best['keffs_best'])
+
+        return best['sol_best'], opt_stats, best['result_best']
+
+
+    def fit_profile_cmaes(self, df_meas, pert_rxns, variables,
+                          group_rxn_dict=None,
+                          sigma0=0.3,
+                          popsize=None,
+                          max_gen=100,
+                          seed=None,
+                          basis=None,
+                          verbosity=2,
+                          error_fun=None,
+                          pool=None,
+                          n_workers=None,
+                          **sim_opts):
+        """
+        sol_best, opt_stats, result_best = fit_profile_cmaes(df_meas, pert_rxns, variables)
+
+        Fit keffs by CMA-ES in log10 keff space, starting from the current
+        keffs. With group_rxn_dict, one variable per group scales the keffs
+        of its pert_rxns (log10 factor), as in grouped LocalMove moves.
+        keffs are kept within the lognormal min and max of
+        LocalMove.move_param_dict.
+
+        sigma0:  initial step size (log10 units)
+        popsize: population size (default: 4 + 3 ln(n))
+        max_gen: maximum number of generations
+        Each generation is simulated in parallel on pool (default: a pool
+        of n_workers processes for the fit; n_workers=0: sequentially).
+        error_fun must then be picklable.
+        sim_opts: prec_bs, dt
+
+        The best keffs found are set in self.me. opt_stats has one row
+        per generation.
+        """
+        slog = SimLogger(verbosity)
+        me = self.me
+        move_params = LocalMove(me).move_param_dict['lognormal']
+        lkmin = np.log10(move_params['min'])
+        lkmax = np.log10(move_params['max'])
+        lk0 = np.log10([me.reactions.get_by_id(rid).keff for rid in pert_rxns])
+
+        if group_rxn_dict is None:
+            # One variable per reaction: log10 keff
+            groups = [[j] for j in range(len(pert_rxns))]
+            x0 = lk0.copy()
+            lower = np.full(len(x0), lkmin)
+            upper = np.full(len(x0), lkmax)
+        else:
+            # One variable per group: log10 factor on its keffs
+            pert_pos = {rid:j for j,rid in enumerate(pert_rxns)}
+            groups = [[pert_pos[rid] for rid in rids if rid in pert_pos]
+                      for rids in group_rxn_dict.values()]
+            groups = [g for g in groups if g]
+            x0 = np.zeros(len(groups))
+            lower = np.array([np.max(lkmin - lk0[g]) for g in groups])
+            upper = np.array([np.min(lkmax - lk0[g]) for g in groups])
+            # Initial keffs out of bounds: bound per reaction only
+            bad = lower > upper
+            lower[bad] = -np.inf
+            upper[bad] = np.inf
+            x0 = np.clip(x0, lower, upper)
+
+        def to_keffs(x):
+            lk = lk0.copy()
+            for i,g in enumerate(groups):
+                lk[g] = x[i] if group_rxn_dict is None else lk0[g] + x[i]
+            lk = np.clip(lk, lkmin, lkmax)
+            return {rid:10**lk[j] for j,rid in enumerate(pert_rxns)}
+
+        own_pool = False
+        if pool is None and n_workers != 0:
+            pool = self.make_pool(n_workers, df_meas=df_meas)
+            own_pool = True
+
+        es = CMAES(x0, sigma0, popsize=popsize, bounds=(lower, upper), seed=seed)
+        opt_stats = []
+        obj_best = np.inf
+        sol_best = None
+        result_best = None
+        keffs_best = to_keffs(x0)
+        n_sims = 0
+        tic = time.time()
+        while es.generation < max_gen and not es.stop():
+            X = es.ask()
+            keffs_list = [to_keffs(x) for x in X]
+            if es.generation == 0:
+                # Include the starting point
+                keffs_list.append(to_keffs(x0))
+            scores = self.score_keffs(keffs_list, variables, df_meas=df_meas,
+                                      error_fun=error_fun, basis=basis, pool=pool,
+                                      **sim_opts)
+            n_sims = n_sims + len(scores)
+            fvals = np.array([score[0] for score in scores])
+            k = int(np.argmin(fvals))
+            if fvals[k] < obj_best:
+                obj_best = fvals[k]
+                result_best = scores[k][1]
+                sol_best = scores[k][2]
+                keffs_best = keffs_list[k]
+            es.tell(X, fvals[:len(X)])
+
+            opt_stats.append({'phase':'cmaes', 'iter':es.generation,
+                              'obj':fvals.min(), 'obj_mean':fvals.mean(),
+                              'objbest':obj_best, 'sigma':es.sigma, 'n_sims':n_sims})
+            slog.record('generation', iter=es.generation, obj=fvals.min(),
+                        objbest=obj_best, sigma=es.sigma, n_sims=n_sims,
+                        secs=time.time()-tic)
+
+        if own_pool:
+            pool.close()
+        self.update_keffs(keffs_best)
+
+        return sol_best, opt_stats, result_best
+
+
+    def fit_profile_lm(self, df_meas, pert_rxns, variables,
+                       max_iter=30,
+                       h=1e-2,
+                       lam0=1e-2,
+                       n_lambda=3,
+                       xtol=1e-4,
+                       ftol=1e-6,
+                       central=False,
+                       verbosity=2,
+                       pool=None,
+                       n_workers=None,
+                       **sim_opts):
+        """
+        sol_best, opt_stats, result_best = fit_profile_lm(df_meas, pert_rxns, variables)
+
+        Fit log10 keffs of pert_rxns by Levenberg-Marquardt on the
+        residuals of calc_residuals_conc (sum of squared errors), starting
+        from the current keffs. Jacobians from keff_jacobian. keffs are
+        kept within the lognormal min and max of LocalMove.move_param_dict.
+
+        max_iter: maximum number of iterations. Each tries n_lambda steps;
+                  the Jacobian is recomputed only after an accepted step.
+        h, central: finite-difference step and scheme (see keff_jacobian).
+                  keffs at the upper bound are differenced backward.
+        lam0:     initial damping (relative to diag(J'J))
+        n_lambda: damping values lam, 10*lam, ... tried per step, in
+                  parallel. The best improving one is accepted.
+        xtol:     stop if the largest log10 keff step is below xtol
+        ftol:     stop if the relative decrease in cost is below ftol
+        Simulations run in parallel on pool (default: a pool of n_workers
+        processes for the fit; n_workers=0: sequentially).
+        sim_opts: prec_bs, dt
+
+        The best keffs found are set in self.me. opt_stats has one row
+        per iteration.
+        """
+        slog = SimLogger(verbosity)
+        me = self.me
+        move_params = LocalMove(me).move_param_dict['lognormal']
+        lkmin = np.log10(move_params['min'])
+        lkmax = np.log10(move_params['max'])
+        z = np.clip(np.log10([me.reactions.get_by_id(rid).keff for rid in pert_rxns]),
+                    lkmin, lkmax)
+
+        def to_keffs(z):
+            return {rid:10**z[j] for j,rid in enumerate(pert_rxns)}
+
+        own_pool = False
+        if pool is None and n_workers != 0:
+            pool = self.make_pool(n_workers, df_meas=df_meas)
+            own_pool = True
+        dyme = self.make_dyme() if pool is None else None
+
+        base = self.residuals_keffs([to_keffs(z)], variables, df_meas=df_meas,
+                                    record_bases=True, pool=pool, dyme=dyme, **sim_opts)[0]
+        cost = float(np.dot(base[0], base[0]))
+        n_sims = 1
+        lam = lam0
+        opt_stats = [{'phase':'lm', 'iter':0, 'obj':cost, 'objbest':cost, 'lambda':lam,
+                      'step':0., 'n_sims':n_sims}]
+        tic = time.time()
+        A = None
+        for it in range(1, max_iter+1):
+            if A is None:
+                # New point: J and r are reused until a step is accepted
+                J, r = self.keff_jacobian(df_meas, pert_rxns, variables, keffs=to_keffs(z),
+                                          h=h, central=central, base=base,
+                                          keff_max=10**lkmax, pool=pool, dyme=dyme,
+                                          **sim_opts)[:2]
+                at_max = z + h > lkmax
+                n_sims += int(at_max.sum()) + (2 if central else 1)*int((~at_max).sum())
+                A = np.dot(J.T, J)
+                g = np.dot(J.T, r)
+                D = np.maximum(np.diag(A), 1e-12)
+            lams = lam * 10.**np.arange(n_lambda)
+            zs = []
+            for lam_i in lams:
+                dz = -np.linalg.solve(A + lam_i*np.diag(D), g)
+                zs.append(np.clip(z + dz, lkmin, lkmax))
+            trials = self.residuals_keffs([to_keffs(zi) for zi in zs], variables,
+                                          df_meas=df_meas, tts=base[1], basis_refs=base[2],
+                                          record_bases=True, pool=pool, dyme=dyme, **sim_opts)
+            n_sims += len(trials)
+            costs = np.array([np.dot(t[0], t[0]) for t in trials])
+            k = int(np.nanargmin(costs)) if np.isfinite(costs).any() else 0
+            step = np.abs(zs[k] - z).max()
+            if costs[k] < cost:
+                decrease = (cost - costs[k]) / max(cost, 1e-300)
+                z = zs[k]
+                base = trials[k]
+                cost = float(costs[k])
+                lam = max(lams[k] / 10., 1e-12)
+                accepted = True
+                A = None
+            else:
+                decrease = 0.
+                lam = lams[-1] * 10.
+                accepted = False
+
+            opt_stats.append({'phase':'lm', 'iter':it, 'obj':float(costs[k]), 'objbest':cost,
+                              'lambda':lam, 'step':step, 'n_sims':n_sims})
+            slog.record('lm_iter', iter=it, obj=float(costs[k]), objbest=cost, lam=lam,
+                        step=step, accepted=accepted, n_sims=n_sims, secs=time.time()-tic)
+            if step < xtol or (accepted and decrease < ftol) or lam > 1e10:
+                break
+
+        if own_pool:
+            pool.close()
+        keffs_best = to_keffs(z)
+        self.update_keffs(keffs_best)
+        score = self.score_keffs([{}], variables, df_meas=df_meas, error_fun=errfun_sse,
+                                 **sim_opts)[0]
+
+        return score[2], opt_stats, score[1]
+
+    def keff_jacobian(self, df_meas, pert_rxns, variables, keffs=None,
+                      h=1e-2,
+                      central=False,
+                      base=None,
+                      keff_max=None,
+                      pool=None,
+                      n_workers=None,
+                      dyme=None,
+                      **sim_opts):
+        """
+        J, resid, tts, basis_refs = keff_jacobian(df_meas, pert_rxns, variables)
+
+        Finite-difference Jacobian of the residual vector (see
+        residuals) with respect to log10 keffs of pert_rxns:
+        J[:,k] = d resid / d log10 keff of pert_rxns[k].
+
+        keffs:   dict of rxn ID - keff where J is evaluated (default:
+                 current keffs of pert_rxns)
+        h:       step in log10 keff
+        central: central instead of forward differences (2x simulations)
+        base:    (resid, tts, basis_refs) at keffs, if already simulated
+                 with record_bases (see residuals_keffs)
+        keff_max: upper keff bound (scalar or dict of rxn ID - keff). keffs
+                 within a step of it are differenced backward only.
+        Perturbed runs use the time points of the base run and are
+        warm-started from its per-event bases. They are simulated in
+        parallel on pool (default: a pool of n_workers processes;
+        n_workers=0: sequentially on dyme, default a new DynamicME).
+        """
+        if keffs is None:
+            keffs = {rid:self.me.reactions.get_by_id(rid).keff for rid in pert_rxns}
+        own_pool = False
+        if pool is None and n_workers != 0 and dyme is None:
+            pool = self.make_pool(n_workers, df_meas=df_meas)
+            own_pool = True
+        if pool is None and dyme is None:
+            dyme = self.make_dyme()
+        if base is None:
+            base = self.residuals_keffs([keffs], variables, df_meas=df_meas, record_bases=True,
+                                        pool=pool, dyme=dyme, **sim_opts)[0]
+        r0, tts, basis_refs = base
+
+        signs = []
+        keffs_list = []
+        for rid in pert_rxns:
+            kmax = keff_max.get(rid) if isinstance(keff_max, dict) else keff_max
+            if kmax is not None and keffs[rid] * 10**h > kmax:
+                signs_k = [-1.]
+            else:
+                signs_k = [1., -1.] if central else [1.]
+            signs.append(signs_k)
+            for sign in signs_k:
+                keffs_k = dict(keffs)
+                keffs_k[rid] = keffs[rid] * 10**(sign*h)
+                keffs_list.append(keffs_k)
+        outs = self.residuals_keffs(keffs_list, variables, df_meas=df_meas, tts=tts,
+                                    basis_refs=basis_refs, pool=pool, dyme=dyme, **sim_opts)
+        if own_pool:
+            pool.close()
+
+        J = np.zeros((len(r0), len(pert_rxns)))
+        pos = 0
+        for k, signs_k in enumerate(signs):
+            if len(signs_k) == 2:
+                J[:,k] = (outs[pos][0] - outs[pos+1][0]) / (2*h)
+            else:
+                J[:,k] = (outs[pos][0] - r0) / (signs_k[0]*h)
+            pos = pos + len(signs_k)
+        return J, r0, tts, basis_refs
+
+    def residuals_keffs(self, keffs_list, variables, df_meas=None, tts=None,
+                        basis_refs=None, record_bases=False, pool=None, dyme=None,
+                        **sim_opts):
+        """
+        outs = residuals_keffs(keffs_list, variables, df_meas=None)
+
+        (resid, tts, basis_refs) of each keff set (dict of rxn ID - keff),
+        see residuals. basis_refs is None unless record_bases.
+        With pool (see make_pool), keff sets are simulated in parallel.
+        Otherwise in turn on dyme (default: a new DynamicME) with numeric
+        keff updates.
+        """
+        if pool is not None:
+            tasks = [(keffs, variables, tts, basis_refs, record_bases, sim_opts)
+                     for keffs in keffs_list]
+            return pool.map(_residuals_task, tasks)
+
+        if dyme is None:
+            dyme = self.make_dyme()
+        outs = []
+        for keffs in keffs_list:
+            rids = list(keffs.keys())
+            dyme.reset_keffs_numeric()
+            dyme.set_keffs_numeric(rids, [keffs[rid] for rid in rids])
+            outs.append(self.residuals(dyme, variables, df_meas=df_meas, tts=tts,
+                                       basis_refs=basis_refs, record_bases=record_bases,
+                                       **sim_opts)[:3])
+        dyme.reset_keffs_numeric()
+        return outs
+
+    def residuals(self, dyme, variables, df_meas=None, tts=None, basis_refs=None,
+                  record_bases=False, verbosity=0, **sim_opts):
+        """
+        resid, tts, basis_refs, results = residuals(dyme, variables, df_meas=None)
+
+        Residual vector over all conditions (see condition_residuals) for
+        the keffs of dyme. Its sum of squares is the errfun_sse objective.
+
+        tts:        time points per condition (default: from this run)
+        basis_refs: basis_ref per condition for simulate_batch
+        record_bases: if True, basis_refs holds the basis events of this
+                    run, else None
+        """
+        conditions = self.get_conditions(df_meas)
+        resids = []
+        tts_out = []
+        refs = []
+        results = []
+        for i, cond in enumerate(conditions):
+            result = self.simulate_batch(dyme, verbosity=verbosity,
+                                         sim_params=cond['sim_params'],
+                                         basis_ref=None if basis_refs is None else basis_refs[i],
+                                         record_bases=record_bases, **sim_opts)
+            df_sim = self.compute_conc_profile(result)
+            resid, tt = self.condition_residuals(cond, df_sim, variables,
+                                                 tt=None if tts is None else tts[i])
+            resids.append(resid)
+            tts_out.append(tt)
+            refs.append(result.get('basis_events'))
+            results.append(result)
+        if not record_bases:
+            refs = None
+        return np.concatenate(resids), tts_out, refs, results
+
+    def condition_residuals(self, condition, df_sim, variables, tt=None):
+        """
+        resid, tt = condition_residuals(condition, df_sim, variables)
+
+        Weighted residuals of one condition (see condition_error).
+        Empty if df_meas is None.
+        """
+        if condition['df_meas'] is None:
+            return np.zeros(0), tt
+        weights = condition.get('weights')
+        col_weights = weights if isinstance(weights, dict) else {}
+        resid, tt = self.calc_residuals_conc(df_sim, condition['df_meas'], variables,
+                                             col_weights=col_weights, tt=tt)
+        if weights is not None and not isinstance(weights, dict):
+            resid = resid * np.sqrt(weights)
+        return resid, tt
+
+
+    def get_fidelity_schedule(self, fidelity=None):
+        """
+        schedule = get_fidelity_schedule(fidelity)
+
+        Resolve a fit_profile fidelity schedule. Returns None for
+        single fidelity.
+
+        fidelity: None, 'multi' (FIT_FIDELITY) or dict overriding
+                  entries of FIT_FIDELITY:
+            coarse, fine: dict of prec_bs and dt_factor (or dt)
+            phase1:       fidelity of Phase I, 'coarse' or 'fine'
+            screen_iters: Phase II iterations whose candidates are
+                          screened at coarse fidelity (None: all)
+        """
+        if fidelity is None:
+            return None
+        if fidelity == 'multi':
+            fidelity = {}
+        dt0 = self.sim_params.get('dt', 0.1)
+        schedule = {}
+        for key, default in FIT_FIDELITY.items():
+            val = fidelity.get(key, default)
+            if isinstance(default, dict):
+                val = dict(default, **val)
+                if 'dt' not in val:
+                    val['dt'] = dt0*val['dt_factor']
+            schedule[key] = val
+        if schedule['phase1'] not in ['coarse', 'fine']:
+            raise ValueError("phase1 must be 'coarse' or 'fine'")
+        return schedule
+
+
+    def condition_error(self, condition, df_sim, variables, error_fun=None):
+        """
+        Weighted error of simulated profile df_sim for one condition
+        (dict of sim_params, df_meas, weights). nan if df_meas is None.
+        """
+        if condition['df_meas'] is None:
+            return np.nan
+        weights = condition.get('weights')
+        col_weights = weights if isinstance(weights, dict) else {}
+        error = self.calc_error_conc(df_sim, condition['df_meas'], variables,
+                                     error_fun=error_fun, col_weights=col_weights)
+        if weights is not None and not isinstance(weights, dict):
+            error = error * weights
+        return error
+
+
+    def score_condition(self, dyme, condition, variables, error_fun=None,
+                        basis=None, verbosity=0, **sim_opts):
+        """
+        error, result, df_sim = score_condition(dyme, condition, variables)
+
+        Simulate and score one condition. sim_opts: prec_bs, dt
+        """
+        result = self.simulate_batch(dyme, basis=basis, verbosity=verbosity,
+                                     sim_params=condition['sim_params'], **sim_opts)
+        df_sim = self.compute_conc_profile(result)
+        error = self.condition_error(condition, df_sim, variables, error_fun=error_fun)
+        return error, result, df_sim
+
+
+    def score_conditions(self, variables, error_fun=None, basis=None, verbosity=0,
+                         pool=None, pert_rxns=None, **sim_opts):
+        """
+        objval, results, df_sims = score_conditions(variables, pool=None)
+
+        Score the current keffs of self.me under all conditions.
+        With pool (see make_pool), conditions are simulated in parallel
+        and only keffs of pert_rxns (default: all) that differ from the
+        workers' model are sent. error_fun must then be picklable
+        (e.g., a module-level function).
+        """
+        conditions = self.conditions
+        if pool is None:
+            dyme = self.make_dyme()
+            scores = [self.score_condition(dyme, cond, variables, error_fun=error_fun,
+                                           basis=basis, verbosity=verbosity, **sim_opts)
+                      for cond in conditions]
+        else:
+            keff_delta = pool.keff_delta(self.me, pert_rxns)
+            tasks = [(keff_delta, i, variables, error_fun, basis, sim_opts)
+                     for i in range(len(conditions))]
+            scores = pool.map(_score_condition_task, tasks)
+        objval = sum(score[0] for score in scores)
+        return objval, [score[1] for score in scores], [score[2] for score in scores]
+
+
+    def simulate_batch(self, dyme, basis=None, prec_bs=1e-3, verbosity=2, dt=None,
+                       sim_params=None, basis_ref=None, record_bases=False):
         """
         Compute error in concentration profile given params
 
         [Inputs]
         dyme:   DynamicME object
+        dt:     time step (default: sim_params['dt'], else 0.1)
+        sim_params: simulation parameters (default: self.sim_params)
+        basis_ref, record_bases: see DynamicME.simulate_batch
 
         [Outputs]
         """
         import copy as cp
 
-        sim_params = self.sim_params
+        if sim_params is None:
+            sim_params = self.sim_params
         # Provide copy of params and containers
         # so we can re-simulate after local moves
         T = cp.copy(sim_params['T'])
@@ -1108,13 +3143,17 @@ class ParamOpt(object):
         ub_dict = cp.deepcopy(sim_params['ub_dict'])
         extra_rxns_tracked = sim_params['extra_rxns_tracked']
         ZERO_CONC = sim_params['ZERO_CONC']
+        if dt is None:
+            dt = sim_params.get('dt', 0.1)
 
-        result = dyme.simulate_batch(T, c0_dict, X0, prec_bs=prec_bs,
+        result = dyme.simulate_batch(T, c0_dict, X0, dt=dt, prec_bs=prec_bs,
                                      ZERO_CONC=ZERO_CONC,
                                      extra_rxns_tracked=extra_rxns_tracked,
                                      lb_dict=lb_dict,
                                      ub_dict=ub_dict,
-                                     verbosity=verbosity)
+                                     verbosity=verbosity,
+                                     basis_ref=basis_ref,
+                                     record_bases=record_bases)
         self.result = result
         return result
 
@@ -1197,6 +3236,31 @@ class ParamOpt(object):
         error_tot = sum(weighted_errors)
         return error_tot
 
+    def calc_residuals_conc(self, df_sim, df_meas, cols_fit, col_weights={}, tt=None):
+        """
+        resid, tt = calc_residuals_conc(df_sim, df_meas, cols_fit)
+
+        Residuals (simulated - measured) at time points tt (default: all
+        simulated and measured times, as calc_error_conc), column by
+        column, scaled by sqrt(col_weights). sum(resid**2) equals
+        calc_error_conc with errfun_sse.
+        """
+        t_sim = df_sim['time']
+        t_meas = df_meas['time']
+        if tt is None:
+            tt = np.union1d(t_sim, t_meas)
+        resids = []
+        for col in cols_fit:
+            yy_sim = np.interp(tt, t_sim, df_sim[col])
+            yy_meas = np.interp(tt, t_meas, df_meas[col])
+            resid = yy_sim - yy_meas
+            if col in col_weights:
+                resid = resid * np.sqrt(col_weights[col])
+            resids.append(resid)
+        if not resids:
+            return np.zeros(0), tt
+        return np.concatenate(resids), tt
+
     def compute_proteome_profile(self, result, rxns_trsl):
         """
         df_prot = compute_proteome_profile(result, rxns_trsl) 
@@ -1261,59 +3325,60 @@ def get_undiluted_cplxs(solver, exclude_types=[
     exclude_types : Reaction types that are allowed to not have complex dilution coupling
     """
     me = solver.me
-    undiluted_cplxs = []
-    for data in me.complex_data:
-        met = data.complex
-        for rxn in met.reactions:
-            if not any([isinstance(rxn,t) for t in exclude_types]):
-                try:
-                    if rxn.metabolites[met]<0:
-                        if not hasattr(rxn.metabolites[met],'subs'):
-                            undiluted_cplxs.append(data)
-                except TypeError:
-                    continue
-
-    undiluted_cplxs = list(set(undiluted_cplxs))
+    index = get_complex_index(me)
+    undiluted_cplxs = index.undiluted(exclude_types)
 
     return undiluted_cplxs
 
 
+def get_cplx_usage_index(me, cplxs, keff_scales=None):
+    """
+    rows, cols, coeffs = get_cplx_usage_index(me, cplxs, keff_scales=None)
+
+    Integer index arrays for complex usage:
+    [E_i] = sum_k x[cols[k]] * coeffs[k] over k with rows[k] == i
+    where coeffs is the (negated) coefficient on mu of the complex
+    in each rxn that dilutes it. Uses the cached ComplexIndex of me.
+    keff_scales: {rxn ID: factor on coeffs} (see DynamicME.keff_scales)
+    """
+    index = get_complex_index(me)
+    return index.usage_arrays(me, [cplx.id for cplx in cplxs], keff_scales)
+
+
 def get_cplx_concs(solver, muopt=None, growth_rxn='biomass_dilution', undiluted_cplxs=None,
-        ZERO=1e-20):
+        ZERO=1e-20, x=None):
     """
     Get complex concentrations (mmol/gDW) from solution:
     [E_i] = sum_j v_j / keff_ij
 
     undiluted_cplxs: skip the complexes that are not diluted--i.e.,. treated as metabolites
+    x: solution vector ordered as me.reactions. Default: solver.x if
+       available (DynamicME), else me.solution.x
+    Keffs set with DynamicME.set_keffs_numeric are used if solver is a
+    DynamicME.
     """
     me = solver.me
-    x_dict = me.solution.x_dict
+    if x is None:
+        x = getattr(solver, 'x', None)
+    if x is None:
+        x = me.solution.x
+    x = np.asarray(x, dtype=float).ravel()
+
     if muopt is None:
         #muopt = solver.substitution_dict['mu']
-        muopt = x_dict[growth_rxn]
+        muopt = x[me.reactions.index(growth_rxn)]
 
     if undiluted_cplxs is None:
         undiluted_cplxs = get_undiluted_cplxs(solver)
 
     solver.substitution_dict['mu'] = muopt
-    sub_vals = [solver.substitution_dict[k] for k in solver.subs_keys_ordered]
+    undiluted_cplxs = set(undiluted_cplxs)
     cplxs = [data.complex for data in me.complex_data if data not in undiluted_cplxs]
 
-    cplx_conc_dict = {}
-    for cplx in cplxs:
-        #----------------------------------------------------
-        # Just get the coefficient on mu to avoid:  -1/keff*mu - 1
-        concs = []
-        for rxn in cplx.reactions:
-            stoich = rxn.metabolites[cplx]
-            if stoich<0 and hasattr(stoich,'free_symbols') and mu in stoich.free_symbols:
-                ci = stoich.coeff(mu)
-                if not ci.free_symbols:
-                    conci = x_dict[rxn.id] * -float(ci)
-                    concs.append(conci)
-        conc = sum(concs)
-        if conc < ZERO:
-            conc = 0
-        cplx_conc_dict[cplx.id] = conc
+    keff_scales = solver.keff_scales() if hasattr(solver, 'keff_scales') else None
+    rows, cols, coeffs = get_cplx_usage_index(me, cplxs, keff_scales)
+    concs = np.bincount(rows, weights=x[cols]*coeffs, minlength=len(cplxs))
+    concs[concs < ZERO] = 0.
+    cplx_conc_dict = {cplx.id:concs[i] for i,cplx in enumerate(cplxs)}
 
     return cplx_conc_dict
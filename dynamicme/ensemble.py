@@ -0,0 +1,325 @@
+#============================================================
+# File ensemble.py
+#
+# class  RunningStats
+# class  P2Quantile
+# class  EnsembleStats
+# class  KeffSampler
+#
+# Monte Carlo keff-uncertainty ensembles folded into streaming
+# statistics, so memory does not grow with ensemble size.
+#============================================================
+
+from six import iteritems
+
+from dynamicme.dynamic import LocalMove
+
+import numpy as np
+import pandas as pd
+
+
+class RunningStats(object):
+    """
+    Elementwise running mean and variance (Welford). nan values are
+    skipped per element.
+
+    stats = RunningStats(shape)
+    stats.add(x)
+    stats.mean, stats.var, stats.std, stats.n
+    """
+    def __init__(self, shape):
+        self.n = np.zeros(shape, dtype=np.int64)
+        self.mean = np.zeros(shape)
+        self._M2 = np.zeros(shape)
+
+    def add(self, x):
+        x = np.asarray(x, dtype=float)
+        ok = np.isfinite(x)
+        self.n[ok] += 1
+        delta = np.where(ok, x - self.mean, 0.)
+        self.mean[ok] += delta[ok] / self.n[ok]
+        self._M2[ok] += delta[ok] * (x[ok] - self.mean[ok])
+
+    @property
+    def var(self):
+        """
+        Sample variance (nan with fewer than 2 values)
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.n > 1, self._M2 / (self.n - 1), np.nan)
+
+    @property
+    def std(self):
+        return np.sqrt(self.var)
+
+
+class P2Quantile(object):
+    """
+    Elementwise streaming estimate of quantile p with the P-square
+    algorithm (Jain & Chlamtac, 1985): five markers per element,
+    O(1) memory in the number of samples. nan values are skipped.
+
+    est = P2Quantile(p, shape)
+    est.add(x)
+    q = est.value()
+    """
+    def __init__(self, p, shape):
+        self.p = p
+        self.shape = shape
+        m = int(np.prod(shape))
+        self.count = np.zeros(m, dtype=np.int64)
+        self.q = np.zeros((5, m))          # marker heights
+        self.pos = np.zeros((5, m))        # marker positions
+        self.desired = np.zeros((5, m))    # desired marker positions
+        self.dn = np.array([0., p/2., p, (1.+p)/2., 1.])
+
+    def add(self, x):
+        x = np.asarray(x, dtype=float).ravel()
+        ok = np.isfinite(x)
+        p = self.p
+
+        # First five values of each element are stored as is
+        init = np.flatnonzero(ok & (self.count < 5))
+        if len(init):
+            self.q[self.count[init], init] = x[init]
+            self.count[init] += 1
+            full = init[self.count[init] == 5]
+            if len(full):
+                self.q[:, full] = np.sort(self.q[:, full], axis=0)
+                self.pos[:, full] = np.arange(1., 6.)[:, None]
+                self.desired[:, full] = np.array([1., 1.+2*p, 1.+4*p, 3.+2*p, 5.])[:, None]
+
+        idx = np.flatnonzero(ok & (self.count >= 5))
+        idx = np.setdiff1d(idx, init, assume_unique=True)
+        if len(idx) == 0:
+            return
+        self.count[idx] += 1
+        xi = x[idx]
+        q = self.q[:, idx]
+        pos = self.pos[:, idx]
+        desired = self.desired[:, idx]
+
+        # Cell k with q[k] <= x < q[k+1]; extend extremes
+        q[0] = np.minimum(q[0], xi)
+        q[4] = np.maximum(q[4], xi)
+        k = np.clip(np.sum(xi[None, :] >= q[1:4], axis=0), 0, 3)
+        pos += np.arange(5)[:, None] > k[None, :]
+        desired += self.dn[:, None]
+
+        # Adjust middle markers
+        for i in (1, 2, 3):
+            d = desired[i] - pos[i]
+            move = ((d >= 1) & (pos[i+1] - pos[i] > 1)) | ((d <= -1) & (pos[i-1] - pos[i] < -1))
+            if not move.any():
+                continue
+            ds = np.sign(d[move])
+            qm, qi, qp = q[i-1, move], q[i, move], q[i+1, move]
+            nm, ni, npl = pos[i-1, move], pos[i, move], pos[i+1, move]
+            parabolic = qi + ds/(npl - nm) * ((ni - nm + ds)*(qp - qi)/(npl - ni) +
+                                             (npl - ni - ds)*(qi - qm)/(ni - nm))
+            q_nb = np.where(ds > 0, qp, qm)
+            n_nb = np.where(ds > 0, npl, nm)
+            linear = qi + ds*(q_nb - qi)/(n_nb - ni)
+            q[i, move] = np.where((qm < parabolic) & (parabolic < qp), parabolic, linear)
+            pos[i, move] = ni + ds
+
+        self.q[:, idx] = q
+        self.pos[:, idx] = pos
+        self.desired[:, idx] = desired
+
+    def value(self):
+        """
+        Current quantile estimates (exact with fewer than 5 values,
+        nan without values)
+        """
+        vals = self.q[2].copy()
+        for j in np.flatnonzero(self.count < 5):
+            c = self.count[j]
+            vals[j] = np.percentile(self.q[:c, j], 100*self.p) if c > 0 else np.nan
+        return vals.reshape(self.shape)
+
+
+class EnsembleStats(object):
+    """
+    Streaming statistics of trajectories on a common time grid.
+
+    stats = EnsembleStats(time_grid, variables, quantiles=(0.05, 0.5, 0.95))
+    stats.add(df_sim)   # time column 'time', interpolated onto time_grid
+    df = stats.to_frame()
+
+    Memory is O(len(time_grid) * len(variables) * len(quantiles)).
+    """
+    def __init__(self, time_grid, variables, quantiles=(0.05, 0.5, 0.95)):
+        self.time_grid = np.asarray(time_grid, dtype=float)
+        self.variables = list(variables)
+        self.quantiles = list(quantiles)
+        shape = (len(self.time_grid), len(self.variables))
+        self.moments = RunningStats(shape)
+        self.sketches = [P2Quantile(p, shape) for p in self.quantiles]
+        self.n_samples = 0
+
+    def align(self, df_sim, colT='time'):
+        """
+        (n_time, n_variables) values of df_sim on the time grid.
+        Trajectories ending early hold their last value; missing
+        variables are nan.
+        """
+        t = np.asarray(df_sim[colT], dtype=float)
+        Y = np.full((len(self.time_grid), len(self.variables)), np.nan)
+        for k, var in enumerate(self.variables):
+            if var in df_sim:
+                Y[:,k] = np.interp(self.time_grid, t, np.asarray(df_sim[var], dtype=float))
+        return Y
+
+    def add(self, df_sim, colT='time'):
+        Y = self.align(df_sim, colT)
+        self.moments.add(Y)
+        for sketch in self.sketches:
+            sketch.add(Y)
+        self.n_samples += 1
+
+    def to_frame(self):
+        """
+        DataFrame with one row per (time, variable): n, mean, std and
+        one column per quantile (e.g., q0.05)
+        """
+        n_t, n_v = len(self.time_grid), len(self.variables)
+        data = {'time': np.repeat(self.time_grid, n_v),
+                'variable': np.tile(self.variables, n_t),
+                'n': self.moments.n.ravel(),
+                'mean': self.moments.mean.ravel(),
+                'std': self.moments.std.ravel()}
+        columns = ['time', 'variable', 'n', 'mean', 'std']
+        for p, sketch in zip(self.quantiles, self.sketches):
+            col = 'q%g' % p
+            data[col] = sketch.value().ravel()
+            columns.append(col)
+        return pd.DataFrame(data, columns=columns)
+
+
+#============================================================
+def sample_keff_ensemble(me, n_samples, pert_rxns, method='lognormal',
+                         group_rxn_dict=None, seed=None, move_params=None):
+    """
+    keffs_list = sample_keff_ensemble(me, n_samples, pert_rxns, method='lognormal')
+
+    Keff sets (dicts of rxn ID - keff) drawn with LocalMove.sample, each
+    from its own RNG stream spawned from numpy SeedSequence(seed), so
+    sample i is the same whatever n_samples, batching or worker count.
+    move_params: updates to LocalMove.move_param_dict[method]
+    """
+    sampler = KeffSampler(me, pert_rxns, method=method, group_rxn_dict=group_rxn_dict,
+                          seed=seed, move_params=move_params)
+    return sampler.draw(n_samples)
+
+
+class KeffSampler(object):
+    """
+    Draws keff sets in batches, sample i from the i-th child of
+    SeedSequence(seed), so batches of any size give the same samples
+    as sample_keff_ensemble. Only the SeedSequence is kept between
+    batches.
+
+    sampler = KeffSampler(me, pert_rxns, method='lognormal', seed=None)
+    keffs_list = sampler.draw(n)
+    """
+    def __init__(self, me, pert_rxns, method='lognormal', group_rxn_dict=None,
+                 seed=None, move_params=None):
+        self.me = me
+        self.pert_rxns = pert_rxns
+        self.method = method
+        self.group_rxn_dict = group_rxn_dict
+        self.seed_seq = np.random.SeedSequence(seed)
+        self.mover = LocalMove(me)
+        if move_params is not None:
+            self.mover.move_param_dict[method].update(move_params)
+
+    def draw(self, n):
+        """
+        Next n keff sets
+        """
+        mover = self.mover
+        keffs_list = []
+        for stream in self.seed_seq.spawn(n):
+            mover.rng = np.random.default_rng(stream)
+            keffs_list.append(mover.sample(self.me, self.pert_rxns, method=self.method,
+                                           group_rxn_dict=self.group_rxn_dict))
+        return keffs_list
+
+
+def run_ensemble(popt, n_samples, pert_rxns, variables=None,
+                 time_grid=None, n_time=101,
+                 method='lognormal',
+                 group_rxn_dict=None,
+                 move_params=None,
+                 quantiles=(0.05, 0.5, 0.95),
+                 seed=None,
+                 batch_size=None,
+                 pool=None,
+                 n_workers=None,
+                 verbosity=0,
+                 **sim_opts):
+    """
+    df_stats = run_ensemble(popt, n_samples, pert_rxns, variables=None)
+
+    Simulate n_samples random keff sets (see sample_keff_ensemble) and
+    fold each trajectory (popt.compute_conc_profile output) into
+    EnsembleStats. Keff sets are drawn one batch at a time and
+    trajectories are discarded after folding, so memory does not grow
+    with n_samples.
+
+    popt:       ParamOpt (its sim_params or conditions are simulated)
+    variables:  columns to summarize (default: all but time, from the
+                first trajectory)
+    time_grid:  common time grid (default: n_time points over [0, T])
+    batch_size: keff sets simulated per round (default: 4 per worker)
+    Samples are simulated in parallel on pool (default: pool of n_workers
+    for the ensemble; n_workers=0: sequentially).
+
+    Returns DataFrame of EnsembleStats.to_frame, with a condition column
+    if popt.conditions is set.
+    """
+    sampler = KeffSampler(popt.me, pert_rxns, method=method,
+                          group_rxn_dict=group_rxn_dict, seed=seed,
+                          move_params=move_params)
+    conditions = popt.get_conditions()
+
+    own_pool = False
+    if pool is None and n_workers != 0:
+        pool = popt.make_pool(n_workers)
+        own_pool = True
+    if batch_size is None:
+        batch_size = 4*pool.n_workers if pool is not None else 1
+
+    stats = None
+    for start in range(0, n_samples, batch_size):
+        keffs_list = sampler.draw(min(batch_size, n_samples - start))
+        scores = popt.score_keffs(keffs_list, [],
+                                  pool=pool, verbosity=verbosity, **sim_opts)
+        for score in scores:
+            dfs = score[2] if popt.conditions is not None else [score[2]]
+            if stats is None:
+                stats = []
+                for cond, df in zip(conditions, dfs):
+                    if time_grid is None:
+                        grid = np.linspace(0., cond['sim_params']['T'], n_time)
+                    else:
+                        grid = time_grid
+                    cols = variables
+                    if cols is None:
+                        cols = [c for c in df.columns if c != 'time']
+                    stats.append(EnsembleStats(grid, cols, quantiles))
+            for st, df in zip(stats, dfs):
+                st.add(df)
+    if own_pool:
+        pool.close()
+
+    if stats is None:
+        return pd.DataFrame()
+    frames = []
+    for icond, st in enumerate(stats):
+        df = st.to_frame()
+        if popt.conditions is not None:
+            df.insert(0, 'condition', icond)
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True)
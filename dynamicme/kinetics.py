@@ -0,0 +1,145 @@
+#============================================================
+# File kinetics.py
+#
+# class  UptakeKinetics
+#
+# Concentration-dependent uptake rates and keffs,
+# evaluated in vectorized form at each time step.
+#============================================================
+
+import numpy as np
+
+
+#============================================================
+# Chassagnole et al. (2002) PTS parameters (mM)
+PTS_PARAMS = {
+    'Ka1': 3082.3,
+    'Ka2': 0.01,
+    'Ka3': 245.3,
+    'n_g6p': 3.66,
+    'K_g6p': 2.15,
+    'x_pep': 2.67,
+    'x_pyr': 2.67,
+    'x_g6p': 3.48
+    }
+
+
+class UptakeKinetics(object):
+    """
+    Concentration-dependent uptake kinetics
+
+    kin = UptakeKinetics(mode='bound', tol=1e-2)
+
+    mode:   'bound': rate is the max uptake flux (mmol/gDW/h) of
+                     exchange rxn rid, imposed as a bound.
+            'keff':  rate is the keff (1/s) of transport rxn rid,
+                     imposed by rescaling its enzyme coupling coefficient.
+    tol:    relative change in rate below which no update is pushed
+            to the solver (and thus no resolve is triggered)
+
+    Michaelis-Menten:
+        rate = vmax * c / (Km + c)
+    Chassagnole PTS (pep, pyr, g6p held constant), normalized so that
+    rate -> vmax as c -> inf:
+        rate = vmax * c*r / ((Ka1 + Ka2*r + Ka3*c + c*r)(1 + g6p^n/Kg6p)) / sat_inf
+        r = pep/pyr
+    """
+    def __init__(self, mode='bound', tol=1e-2):
+        if mode not in ['bound', 'keff']:
+            raise ValueError("mode must be 'bound' or 'keff'")
+        self.mode = mode
+        self.tol = tol
+        self.rxn_ids = []
+        self.metids = []
+        self.vmax = []
+        self.Km = []
+        self.is_pts = []
+        self.pts_params = []
+        self.values = None      # Rates last pushed to the solver
+        self._conc_inds = None
+        self._arrays = None
+
+    def add_michaelis_menten(self, rid, metid, vmax, Km):
+        """
+        Add Michaelis-Menten kinetics for rxn rid with substrate metid
+        """
+        self._add(rid, metid, vmax, Km, False, None)
+
+    def add_chassagnole_pts(self, rid, metid, vmax, **kwargs):
+        """
+        Add Chassagnole PTS kinetics for rxn rid with substrate metid.
+        kwargs override entries of PTS_PARAMS.
+        """
+        params = dict(PTS_PARAMS)
+        params.update(kwargs)
+        self._add(rid, metid, vmax, params['Ka3'], True, params)
+
+    def _add(self, rid, metid, vmax, Km, is_pts, params):
+        self.rxn_ids.append(rid)
+        self.metids.append(metid)
+        self.vmax.append(vmax)
+        self.Km.append(Km)
+        self.is_pts.append(is_pts)
+        self.pts_params.append(params)
+        self.values = None
+        self._arrays = None
+
+    def _build_arrays(self):
+        n = len(self.rxn_ids)
+        Ka1 = np.ones(n)
+        Ka2 = np.zeros(n)
+        r = np.ones(n)
+        inhib = np.ones(n)
+        for i,params in enumerate(self.pts_params):
+            if params is not None:
+                Ka1[i] = params['Ka1']
+                Ka2[i] = params['Ka2']
+                r[i] = params['x_pep'] / params['x_pyr']
+                inhib[i] = 1. + params['x_g6p']**params['n_g6p'] / params['K_g6p']
+        self._arrays = {
+            'vmax': np.array(self.vmax, dtype=float),
+            'Km': np.array(self.Km, dtype=float),
+            'is_pts': np.array(self.is_pts, dtype=bool),
+            'Ka1': Ka1, 'Ka2': Ka2, 'r': r, 'inhib': inhib
+            }
+
+    def bind(self, metids):
+        """
+        Precompute positions of substrates in the concentration vector
+        ordered as metids
+        """
+        pos = {metid:i for i,metid in enumerate(metids)}
+        self._conc_inds = np.array([pos[m] for m in self.metids], dtype=int)
+        if self._arrays is None:
+            self._build_arrays()
+
+    def rates(self, conc):
+        """
+        Vectorized rates given concentration vector (ordered as bound metids)
+        """
+        a = self._arrays
+        c = np.maximum(conc[self._conc_inds], 0.)
+        sat = c / (a['Km'] + c)
+        # Chassagnole PTS, normalized by its saturating value
+        r = a['r']
+        pts = c*r / ((a['Ka1'] + a['Ka2']*r + a['Km']*c + c*r)*a['inhib'])
+        pts_inf = r / ((a['Km'] + r)*a['inhib'])
+        sat = np.where(a['is_pts'], pts/pts_inf, sat)
+        return a['vmax'] * sat
+
+    def update(self, conc):
+        """
+        changed = update(conc)
+
+        Evaluate rates and return indices of entries whose relative change
+        since the last pushed value exceeds tol. self.values is updated
+        for those entries only.
+        """
+        rates = self.rates(conc)
+        if self.values is None:
+            self.values = rates
+            return np.arange(len(rates))
+        dv = np.abs(rates - self.values)
+        changed = np.flatnonzero(dv > self.tol*np.maximum(np.abs(self.values), 1e-12))
+        self.values[changed] = rates[changed]
+        return changed
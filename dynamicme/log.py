@@ -0,0 +1,175 @@
+#============================================================
+# File log.py
+#
+# class  SimLogger
+# class  RingBufferHandler
+# class  JSONLinesHandler
+#
+# Low-overhead logging for the simulation and fitting loops.
+#============================================================
+
+from collections import deque
+
+import json
+import logging
+import sys
+
+
+LOGGER_NAME = 'dynamicme'
+
+# verbosity -> logging level. verbosity keeps its old meaning:
+# 0: quiet, 1: per-step summaries, 2: all diagnostics
+VERBOSITY_LEVELS = {0: logging.WARNING, 1: logging.INFO, 2: logging.DEBUG}
+
+
+def get_logger(name=LOGGER_NAME):
+    """
+    Package logger. Prints plain messages to stdout unless
+    configure_logging has been called.
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    if not getattr(logger, '_dynamicme_configured', False):
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+        logger.propagate = False
+        logger._dynamicme_configured = True
+    if name == LOGGER_NAME:
+        return logger
+    return logging.getLogger(name)
+
+
+def configure_logging(stdout=True, filename=None, ring_buffer=None,
+                      level=logging.DEBUG):
+    """
+    handlers = configure_logging(stdout=True, filename=None, ring_buffer=None)
+
+    Replace handlers of the package logger.
+    stdout:      print plain messages to stdout
+    filename:    write one JSON record per line to this file
+    ring_buffer: keep the last ring_buffer records in memory
+                 (returned RingBufferHandler.records)
+    """
+    logger = get_logger()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    handlers = []
+    if stdout:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        handlers.append(handler)
+    if filename is not None:
+        handlers.append(JSONLinesHandler(filename))
+    if ring_buffer is not None:
+        handlers.append(RingBufferHandler(ring_buffer))
+    for handler in handlers:
+        logger.addHandler(handler)
+    logger.setLevel(level)
+    return handlers
+
+
+def record_to_dict(record):
+    """
+    Machine-readable dict of a log record
+    """
+    rec = {'time': record.created,
+           'level': record.levelname,
+           'logger': record.name}
+    event = getattr(record, 'dyme_event', None)
+    if event is None:
+        rec['msg'] = record.getMessage()
+    else:
+        rec['event'] = event
+        rec.update(record.dyme_fields)
+    return rec
+
+
+class RingBufferHandler(logging.Handler):
+    """
+    Keep the last capacity records (as dicts) in memory
+    """
+    def __init__(self, capacity=10000):
+        logging.Handler.__init__(self)
+        self.records = deque(maxlen=capacity)
+
+    def emit(self, record):
+        self.records.append(record_to_dict(record))
+
+
+class JSONLinesHandler(logging.FileHandler):
+    """
+    Write one JSON record per line
+    """
+    def emit(self, record):
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(json.dumps(record_to_dict(record), default=float) + '\n')
+            self.flush()
+        except Exception:
+            self.handleError(record)
+
+
+class SimLogger(object):
+    """
+    Verbosity-gated logger for hot loops.
+
+    slog = SimLogger(verbosity=1, every=10)
+    slog.info('Biomass at t=%g: %g', t, X)        # formatted only if emitted
+    slog.step(iter_sim, 'Biomass at t=%g', t)     # only every 10th step
+    slog.record('step', t=t, biomass=X)           # structured record
+
+    Messages below the verbosity are dropped with one int comparison.
+    """
+    def __init__(self, verbosity=1, every=1, name=LOGGER_NAME):
+        self.verbosity = verbosity
+        self.every = max(int(every), 1)
+        self.logger = get_logger(name)
+
+    def enabled(self, verbosity=1):
+        return self.verbosity >= verbosity
+
+    def _log(self, verbosity, msg, args, extra=None):
+        level = VERBOSITY_LEVELS.get(verbosity, logging.DEBUG)
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, msg, *args, extra=extra)
+
+    def info(self, msg, *args):
+        if self.verbosity >= 1:
+            self._log(1, msg, args)
+
+    def debug(self, msg, *args):
+        if self.verbosity >= 2:
+            self._log(2, msg, args)
+
+    def warning(self, msg, *args):
+        self._log(0, msg, args)
+
+    def step(self, iter_step, msg, *args, **kwargs):
+        """
+        Log msg at verbosity kwargs.get('verbosity', 1),
+        only every self.every steps
+        """
+        verbosity = kwargs.get('verbosity', 1)
+        if self.verbosity >= verbosity and iter_step % self.every == 0:
+            self._log(verbosity, msg, args)
+
+    def record(self, event, iter_step=0, verbosity=1, **fields):
+        """
+        Structured record. Rate-limited like step().
+        """
+        if self.verbosity >= verbosity and iter_step % self.every == 0:
+            self._log(verbosity, '%s %s', (event, _LazyFields(fields)),
+                      extra={'dyme_event': event, 'dyme_fields': fields})
+
+
+class _LazyFields(object):
+    """
+    Formats fields only when the message is rendered
+    """
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __str__(self):
+        return ' '.join('%s=%s' % (k, v) for k, v in sorted(self.fields.items()))
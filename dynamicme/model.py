@@ -5,6 +5,7 @@
 # class PeptideDegradation
 # class ComplexDegradationData
 # class PeptideDegradationData
+# class ComplexIndex
 
 # Model extensions
 #
@@ -14,12 +15,16 @@
 #============================================================
 from cobrame import StoichiometricData, ComplexData, SubreactionData
 from cobrame import MEReaction
+from cobrame import ComplexFormation, GenericFormationReaction
 from cobra import DictList
 from cobrame import mu
 
 from six import iteritems, string_types
 from collections import defaultdict
 
+import hashlib
+import numpy as np
+import scipy.sparse as sps
 import warnings
 
 
@@ -189,3 +194,215 @@ class PeptideDegradation(MEReaction):
 
         self.add_metabolites(object_stoichiometry, combine=False,
                 add_to_container_model=False)
+
+
+def model_signature(me):
+    """
+    Signature of model structure. Changes when reactions, metabolites
+    or complexes are added, removed, replaced or renamed.
+    Only comparable within one process.
+
+    Cached on the model and recomputed only when a cheap structure key
+    changes: container lengths, their first and last objects and a
+    version counter. Call invalidate_model_signature(me) after replacing
+    or renaming objects elsewhere in the containers.
+    """
+    key = [getattr(me, '_structure_version', 0)]
+    for objs in (me.reactions, me.metabolites, me.complex_data):
+        key.append(id(objs))
+        key.append(len(objs))
+        if len(objs):
+            key.append(id(objs[0]))
+            key.append(id(objs[-1]))
+            key.append(objs[0].id)
+            key.append(objs[-1].id)
+    key = tuple(key)
+    cached = getattr(me, '_model_signature', None)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    parts = []
+    for objs in (me.reactions, me.metabolites, me.complex_data):
+        parts.append(tuple(obj.id for obj in objs))
+        parts.append(tuple(map(id, objs)))
+    sig = hash(tuple(parts))
+    me._model_signature = (key, sig)
+    return sig
+
+
+def invalidate_model_signature(me):
+    """
+    Force model_signature (and the caches keyed on it: model_hash,
+    get_complex_index) to be recomputed, e.g., after renaming a reaction
+    """
+    me._structure_version = getattr(me, '_structure_version', 0) + 1
+
+
+def model_hash(me):
+    """
+    Stable hash of the reaction and metabolite IDs, in order.
+    Cached on the model until model_signature changes.
+    """
+    sig = model_signature(me)
+    cached = getattr(me, '_model_hash', None)
+    if cached is None or cached[0] != sig:
+        h = hashlib.sha1()
+        for rxn in me.reactions:
+            h.update(rxn.id.encode('utf-8') + b'\n')
+        h.update(b'|')
+        for met in me.metabolites:
+            h.update(met.id.encode('utf-8') + b'\n')
+        cached = (sig, h.hexdigest())
+        me._model_hash = cached
+    return cached[1]
+
+
+def get_complex_index(me):
+    """
+    index = get_complex_index(me)
+
+    Cached ComplexIndex for me. Rebuilt only if the model structure changed.
+    """
+    index = getattr(me, '_complex_index', None)
+    if index is None or index.signature != model_signature(me):
+        index = ComplexIndex(me)
+        me._complex_index = index
+    return index
+
+
+class ComplexIndex(object):
+    """
+    Classification of all complexes in an ME model, computed once.
+
+    For each complex ID:
+    catalyzed:         rxns whose coupling coefficient on the complex is -mu/keff
+    symbolic:          rxns with symbolic stoichiometry on the complex
+    numeric_consumers: rxns consuming the complex with numeric stoichiometry
+    formation:         rxns forming the complex
+    degradation:       ComplexDegradation rxns of the complex
+
+    Coupling coefficients (1/keff) are refreshed lazily when a
+    rxn's stoichiometry object changes (e.g., after rxn.update()).
+    """
+    def __init__(self, me):
+        self.signature = model_signature(me)
+        self.complex_ids = []
+        self.complex_data = {}
+        self.catalyzed = {}
+        self.symbolic = {}
+        self.numeric_consumers = {}
+        self.formation = {}
+        self.degradation = {}
+        self._usage = {}    # {cplx_id: [[rxn, stoich, coeff]]}
+        self._subunits = {} # {include_modifications: (P, prot_ids, cplx_ids)}
+
+        for data in me.complex_data:
+            cplx = data.complex
+            cid = cplx.id
+            catalyzed = []
+            symbolic = []
+            consumers = []
+            formation = []
+            degradation = []
+            usage = []
+            for rxn in cplx.reactions:
+                stoich = rxn.metabolites[cplx]
+                if hasattr(stoich, 'subs'):
+                    symbolic.append(rxn)
+                    if mu in stoich.free_symbols:
+                        ci = stoich.coeff(mu)
+                        if not ci.free_symbols and ci < 0:
+                            catalyzed.append(rxn)
+                            usage.append([rxn, stoich, -float(ci)])
+                elif stoich < 0:
+                    consumers.append(rxn)
+                elif stoich > 0 and isinstance(rxn, (ComplexFormation, GenericFormationReaction)):
+                    formation.append(rxn)
+                if isinstance(rxn, ComplexDegradation):
+                    degradation.append(rxn)
+
+            self.complex_ids.append(cid)
+            self.complex_data[cid] = data
+            self.catalyzed[cid] = catalyzed
+            self.symbolic[cid] = symbolic
+            self.numeric_consumers[cid] = consumers
+            self.formation[cid] = formation
+            self.degradation[cid] = degradation
+            self._usage[cid] = usage
+
+    def undiluted(self, exclude_types):
+        """
+        Complex data of complexes consumed with numeric stoichiometry by a
+        rxn not of exclude_types, i.e., not diluted
+        """
+        exclude_types = tuple(exclude_types)
+        return [self.complex_data[cid] for cid in self.complex_ids if
+                any(not isinstance(rxn, exclude_types) for rxn in self.numeric_consumers[cid])]
+
+    def usage_arrays(self, me, cplx_ids, keff_scales=None):
+        """
+        rows, cols, coeffs = usage_arrays(me, cplx_ids, keff_scales=None)
+
+        [E_i] = sum_k x[cols[k]] * coeffs[k] over k with rows[k] == i
+        keff_scales: {rxn ID: keff0/keff} multiplying the coeffs of rxns
+            whose keffs are set outside the model (DynamicME.keff_scales)
+        """
+        rows = []
+        cols = []
+        coeffs = []
+        for i,cid in enumerate(cplx_ids):
+            cplx = me.metabolites.get_by_id(cid)
+            for entry in self._usage[cid]:
+                rxn, stoich, coeff = entry
+                stoich1 = rxn.metabolites[cplx]
+                if stoich1 is not stoich:
+                    # keff changed since last use
+                    coeff = -float(stoich1.coeff(mu))
+                    entry[1] = stoich1
+                    entry[2] = coeff
+                if keff_scales and rxn.id in keff_scales:
+                    coeff = coeff*keff_scales[rxn.id]
+                rows.append(i)
+                cols.append(me.reactions.index(rxn))
+                coeffs.append(coeff)
+
+        return np.array(rows, dtype=int), np.array(cols, dtype=int), np.array(coeffs)
+
+    def subunit_matrix(self, me, cplx_ids=None, include_modifications=False):
+        """
+        P, prot_ids, cplx_ids = subunit_matrix(me, cplx_ids=None)
+
+        Sparse (n_prot, n_cplx) subunit stoichiometry from complex_data:
+        P[i,j] copies of protein i in complex j.
+        include_modifications: also rows for modification components,
+            with the stoichiometry released by ComplexDegradation.update
+        Cached for cplx_ids=None (all complexes, in index order).
+        """
+        if cplx_ids is None:
+            cached = self._subunits.get(include_modifications)
+            if cached is not None:
+                return cached
+        ids = self.complex_ids if cplx_ids is None else list(cplx_ids)
+        rows = []
+        cols = []
+        vals = []
+        prot_pos = {}
+        prot_ids = []
+        for j,cid in enumerate(ids):
+            data = self.complex_data[cid]
+            stoich = dict(data.stoichiometry)
+            if include_modifications:
+                for mod in data.modifications:
+                    for met,val in iteritems(me.modification_data.get_by_id(mod).stoichiometry):
+                        stoich[met] = -val
+            for pid,val in iteritems(stoich):
+                if pid not in prot_pos:
+                    prot_pos[pid] = len(prot_ids)
+                    prot_ids.append(pid)
+                rows.append(prot_pos[pid])
+                cols.append(j)
+                vals.append(float(val))
+        P = sps.csr_matrix((vals, (rows, cols)), shape=(len(prot_ids), len(ids)))
+        out = (P, prot_ids, ids)
+        if cplx_ids is None:
+            self._subunits[include_modifications] = out
+        return out
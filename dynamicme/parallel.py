@@ -0,0 +1,300 @@
+#============================================================
+# File parallel.py
+#
+# class  WorkerPool
+#
+# Local process pool where each worker holds its own copy of
+# the ME model and solver (DynamicME).
+#============================================================
+
+from six.moves import cPickle as pickle
+
+import multiprocessing
+import numpy as np
+
+
+#============================================================
+# Worker-side state. Set once per process by _init_worker.
+_worker = {}
+
+
+def _init_worker(me_bytes, dyme_kwargs, data_bytes=None):
+    from dynamicme.dynamic import DynamicME
+
+    me = pickle.loads(me_bytes)
+    dyme = DynamicME(me, **dyme_kwargs)
+    dyme.init_lp_bounds()
+    _worker['dyme'] = dyme
+    _worker['xl0'] = dyme.xl.copy()
+    _worker['xu0'] = dyme.xu.copy()
+    _worker['data'] = pickle.loads(data_bytes) if data_bytes is not None else {}
+
+
+def get_worker_dyme():
+    """
+    DynamicME object owned by this worker process
+    """
+    return _worker['dyme']
+
+
+def set_worker_bounds(bound_state):
+    """
+    Reset worker LP bounds to the model bounds and apply bound_state
+    (inds, xl, xu) sent by the parent.
+    """
+    dyme = _worker['dyme']
+    inds, xl, xu = bound_state
+    if dyme.xl is None:
+        # Released by a simulation on this worker
+        dyme.init_lp_bounds()
+    dyme.xl = _worker['xl0'].copy()
+    dyme.xu = _worker['xu0'].copy()
+    dyme.xl[inds] = xl
+    dyme.xu[inds] = xu
+
+
+def get_worker_popt():
+    """
+    ParamOpt for the worker model, built from the worker data
+    (sim_params, conditions)
+    """
+    popt = _worker.get('popt')
+    if popt is None:
+        from dynamicme.dynamic import ParamOpt
+
+        dyme = _worker['dyme']
+        data = _worker['data']
+        popt = ParamOpt(dyme.me, data.get('sim_params'), conditions=data.get('conditions'),
+                        growth_key=dyme.growth_key, growth_rxn=dyme.growth_rxn,
+                        exchange_one_rxn=dyme.exchange_one_rxn, backend=dyme.backend)
+        _worker['popt'] = popt
+    return popt
+
+
+def set_worker_keffs(keff_delta):
+    """
+    Set keffs of the worker model to keff_delta (dict of rxn ID - keff),
+    and all other keffs to their values when the pool was created.
+    Uses numeric rescaling of the compiled coefficients (no recompile).
+    Nothing is done if the worker already has these keffs, as for
+    successive tasks of one ksectmu, fva or sweep call.
+    """
+    dyme = _worker['dyme']
+    if dyme._keffs_numeric == keff_delta:
+        return
+    dyme.reset_keffs_numeric()
+    rids = list(keff_delta.keys())
+    dyme.set_keffs_numeric(rids, [keff_delta[rid] for rid in rids])
+
+
+def _checkmu_task(args):
+    """
+    Solve LP at fixed mu in worker. Returns (mu, stat, hs, x)
+    """
+    mu_fix, bound_state, keffs, basis = args
+    dyme = get_worker_dyme()
+    set_worker_bounds(bound_state)
+    set_worker_keffs(keffs)
+    x, stat, hs = dyme.solver.solvelp(mu_fix, basis=basis, verbosity=0)
+    return mu_fix, stat, hs, x
+
+
+def _fva_task(args):
+    """
+    Min or max (sense -1 or 1) of flux j at fixed mu in worker.
+    Returns the flux, nan if not optimal
+    """
+    mu_fix, bound_state, keffs, basis, j, sense = args
+    dyme = get_worker_dyme()
+    set_worker_bounds(bound_state)
+    set_worker_keffs(keffs)
+    x, stat, hs = dyme.solve_objective(mu_fix, {j:sense}, basis=basis)
+    if stat != 'optimal' or x is None:
+        return np.nan
+    return float(np.ravel(x)[j])
+
+
+def _score_condition_task(args):
+    """
+    Simulate and score one ParamOpt condition in worker.
+    Returns (error, result, df_sim)
+    """
+    keff_delta, icond, variables, error_fun, basis, sim_opts = args
+    dyme = get_worker_dyme()
+    conditions = _worker['data']['conditions']
+    popt = get_worker_popt()
+    set_worker_keffs(keff_delta)
+    return popt.score_condition(dyme, conditions[icond], variables, error_fun=error_fun,
+                                basis=basis, verbosity=0, **sim_opts)
+
+
+def _score_keffs_task(args):
+    """
+    Simulate and score one keff set (dict of rxn ID - keff) in worker,
+    under all ParamOpt conditions (or sim_params and df_meas of the
+    worker data). Returns (objval, result, df_sim)
+    """
+    keffs, variables, error_fun, basis, sim_opts = args
+    dyme = get_worker_dyme()
+    popt = get_worker_popt()
+    set_worker_keffs(keffs)
+    conditions = popt.get_conditions(_worker['data'].get('df_meas'))
+    scores = [popt.score_condition(dyme, cond, variables, error_fun=error_fun,
+                                   basis=basis, verbosity=0, **sim_opts)
+              for cond in conditions]
+    if popt.conditions is None:
+        return scores[0]
+    return (sum(score[0] for score in scores), [score[1] for score in scores],
+            [score[2] for score in scores])
+
+
+def _residuals_task(args):
+    """
+    Residuals of one keff set (dict of rxn ID - keff) in worker.
+    Returns (resid, tts, basis_refs), see ParamOpt.residuals
+    """
+    keffs, variables, tts, basis_refs, record_bases, sim_opts = args
+    dyme = get_worker_dyme()
+    popt = get_worker_popt()
+    set_worker_keffs(keffs)
+    return popt.residuals(dyme, variables, df_meas=_worker['data'].get('df_meas'), tts=tts,
+                          basis_refs=basis_refs, record_bases=record_bases, **sim_opts)[:3]
+
+
+def _lbta_epoch_task(args):
+    """
+    Continue one LBTA chain of ParamOpt.fit_profile_population in worker.
+    state: keffs, result, Ts, rng of the chain.
+    Returns (state, sol_best, opt_stats, result_best), state as
+    ParamOpt.lbta_state plus rng.
+    """
+    state, fit_kwargs = args
+    data = _worker['data']
+    popt = get_worker_popt()
+    popt.update_keffs(state['keffs'])
+    sol_best, opt_stats, result_best = popt.fit_profile(
+        data['df_meas'], data['pert_rxns'], data['variables'],
+        result0=state['result'], Ts0=state['Ts'], rng=state['rng'], **fit_kwargs)
+    new_state = dict(popt.lbta_state)
+    new_state['rng'] = state['rng']
+    return new_state, sol_best, opt_stats, result_best
+
+
+def _sweep_chunk_task(args):
+    """
+    Simulate a contiguous chunk of a DynamicME.sweep path in worker.
+    Returns DataFrame (see dynamicme.dynamic.run_sweep_chunk)
+    """
+    from dynamicme.dynamic import run_sweep_chunk
+
+    items, sim_kwargs, keffs, verbosity = args
+    set_worker_keffs(keffs)
+    return run_sweep_chunk(get_worker_dyme(), items, sim_kwargs, verbosity=verbosity)
+
+
+#============================================================
+class WorkerPool(object):
+    """
+    Local process pool with one DynamicME per worker
+
+    pool = WorkerPool(dyme, n_workers=None, worker_data=None)
+
+    dyme:       DynamicME whose model is copied to each worker
+    n_workers:  number of processes. Default: number of cores
+    worker_data: dict copied once to each worker (e.g., ParamOpt conditions)
+
+    Workers receive only bound differences (bound_state) and keff
+    differences (keff_delta) with each task, never the full problem.
+    """
+    def __init__(self, dyme, n_workers=None, worker_data=None):
+        if n_workers is None:
+            n_workers = multiprocessing.cpu_count()
+        self.n_workers = n_workers
+        me = dyme.me
+        # Baseline bounds are the cobra model bounds, as seen by workers
+        self.xl0, self.xu0, bound_exprs = lp_bound_arrays(me)
+        dyme_kwargs = {'growth_key': dyme.growth_key,
+                       'growth_rxn': dyme.growth_rxn,
+                       'exchange_one_rxn': dyme.exchange_one_rxn,
+                       'backend': dyme.backend}
+        # Baseline keffs, as seen by workers
+        self.keffs0 = {rxn.id:rxn.keff for rxn in me.reactions
+                       if getattr(rxn, 'keff', None) is not None}
+        me_bytes = pickle.dumps(me, protocol=pickle.HIGHEST_PROTOCOL)
+        data_bytes = None
+        if worker_data is not None:
+            data_bytes = pickle.dumps(worker_data, protocol=pickle.HIGHEST_PROTOCOL)
+        self.pool = multiprocessing.Pool(n_workers, initializer=_init_worker,
+                                         initargs=(me_bytes, dyme_kwargs, data_bytes))
+
+    def bound_state(self, dyme):
+        """
+        (inds, xl, xu) of bounds in dyme that differ from the model bounds
+        """
+        if dyme.xl is None:
+            dyme.init_lp_bounds()
+        inds = np.flatnonzero((dyme.xl != self.xl0) | (dyme.xu != self.xu0))
+        return inds, dyme.xl[inds], dyme.xu[inds]
+
+    def keff_delta(self, me, rids=None):
+        """
+        {rxn ID: keff} of rxns (default: all with keff) whose keff in me
+        differs from the model copied to the workers
+        """
+        keffs0 = self.keffs0
+        if rids is None:
+            rids = keffs0.keys()
+        delta = {}
+        for rid in rids:
+            keff = me.reactions.get_by_id(rid).keff
+            if keff != keffs0.get(rid):
+                delta[rid] = keff
+        return delta
+
+    def keff_state(self, dyme):
+        """
+        {rxn ID: keff} that makes a worker match dyme: keffs changed in
+        the model since the pool was created (keff_delta), overridden by
+        the numeric keffs of dyme (set_keffs_numeric)
+        """
+        keffs = self.keff_delta(dyme.me)
+        keffs.update(dyme._keffs_numeric)
+        return keffs
+
+    def map(self, func, args_list):
+        return self.pool.map(func, args_list, chunksize=1)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def lp_bound_arrays(me):
+    """
+    xl, xu, bound_exprs = lp_bound_arrays(me)
+
+    Numeric bound arrays ordered as me.reactions. mu-dependent bounds
+    are returned as (index, is_upper, expr) and left at 0 in the arrays.
+    """
+    n_rxn = len(me.reactions)
+    xl = np.zeros(n_rxn)
+    xu = np.zeros(n_rxn)
+    bound_exprs = []
+    for j,rxn in enumerate(me.reactions):
+        lb = rxn.lower_bound
+        ub = rxn.upper_bound
+        if hasattr(lb,'subs'):
+            bound_exprs.append((j, False, lb))
+        else:
+            xl[j] = lb
+        if hasattr(ub,'subs'):
+            bound_exprs.append((j, True, ub))
+        else:
+            xu[j] = ub
+    return xl, xu, bound_exprs
@@ -0,0 +1,147 @@
+#============================================================
+# File profiling.py
+#
+# class  Profiler
+# class  NullProfiler
+#
+# Hot-path instrumentation for DynamicME and ParamOpt.
+#============================================================
+
+from contextlib import contextmanager
+
+import json
+import time
+
+
+class Profiler(object):
+    """
+    Records time spent per section for each step (or move) of a run.
+
+    prof = Profiler()
+    dyme.simulate_batch(..., profiler=prof)
+    df = prof.to_frame()
+    prof.dump('timing.json')
+
+    Sections recorded by DynamicME.simulate_batch (per time step):
+        bounds, mu_search, lp_solve (with counts), state_update, record
+    Sections recorded by ParamOpt.fit_profile (per move):
+        move, simulate, score
+    """
+    def __init__(self):
+        self.records = []
+        self._current = None
+        self._timer = time.time
+
+    def start(self, kind, **labels):
+        """
+        Start a new record (e.g., kind='step' or 'move'). Sections timed
+        until the next start() are accumulated into it.
+        """
+        self.finish()
+        rec = dict(labels)
+        rec['kind'] = kind
+        rec['_tic'] = self._timer()
+        self._current = rec
+
+    def finish(self):
+        """
+        Close the current record
+        """
+        rec = self._current
+        if rec is not None:
+            rec['total'] = self._timer() - rec.pop('_tic')
+            self.records.append(rec)
+            self._current = None
+
+    @contextmanager
+    def section(self, name):
+        """
+        Time a section of the current record
+        """
+        tic = self._timer()
+        try:
+            yield
+        finally:
+            self.add(name, self._timer() - tic)
+
+    def add(self, name, secs, count=1):
+        """
+        Add secs and count to section name of current record
+        """
+        rec = self._current
+        if rec is None:
+            return
+        rec[name] = rec.get(name, 0.) + secs
+        rec['n_' + name] = rec.get('n_' + name, 0) + count
+
+    def wrap_solver(self, solver, method='solvelp', name='lp_solve'):
+        """
+        Count and time calls to solver.<method>, including those made
+        internally by bisectmu. Returns a function that restores the solver.
+        """
+        func = getattr(solver, method)
+        had_attr = method in vars(solver)
+        profiler = self
+
+        def timed(*args, **kwargs):
+            tic = profiler._timer()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.add(name, profiler._timer() - tic)
+
+        setattr(solver, method, timed)
+
+        def restore():
+            if had_attr:
+                setattr(solver, method, func)
+            else:
+                delattr(solver, method)
+
+        return restore
+
+    def to_frame(self):
+        """
+        Records as pandas DataFrame, one row per step or move
+        """
+        import pandas as pd
+
+        self.finish()
+        return pd.DataFrame(self.records)
+
+    def summary(self):
+        """
+        Total time per section and kind
+        """
+        df = self.to_frame()
+        cols = [c for c in df.columns if c not in ['kind'] and df[c].dtype.kind in 'fi']
+        return df.groupby('kind')[cols].sum()
+
+    def dump(self, filename):
+        """
+        Write records to a JSON file
+        """
+        self.finish()
+        with open(filename, 'w') as f:
+            json.dump(self.records, f, default=float)
+
+
+class NullProfiler(object):
+    """
+    Profiler that records nothing. Used by default.
+    """
+    def start(self, kind, **labels):
+        pass
+
+    def finish(self):
+        pass
+
+    @contextmanager
+    def section(self, name):
+        yield
+
+    def add(self, name, secs, count=1):
+        pass
+
+    def wrap_solver(self, solver, method='solvelp', name='lp_solve'):
+        return lambda: None
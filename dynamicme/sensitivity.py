@@ -0,0 +1,244 @@
+#============================================================
+# File sensitivity.py
+#
+# Global sensitivity screening of keffs (Morris elementary effects,
+# Sobol indices) to select pert_rxns before fitting.
+#============================================================
+
+from six import iteritems
+
+import numpy as np
+import pandas as pd
+
+
+#============================================================
+# Sampling designs on the unit hypercube
+
+def morris_samples(n_factors, n_trajectories=10, n_levels=4, rng=None):
+    """
+    X, steps = morris_samples(n_factors, n_trajectories=10, n_levels=4)
+
+    Morris one-at-a-time trajectories on the unit hypercube.
+    X:     (n_trajectories*(n_factors+1), n_factors) samples
+    steps: (n_trajectories*n_factors, 3) rows of
+           (index of point before, factor moved, signed delta)
+    """
+    rng = np.random.default_rng(rng)
+    levels = np.arange(n_levels) / float(n_levels - 1)
+    delta = n_levels / (2. * (n_levels - 1))
+    X = []
+    steps = []
+    for r in range(n_trajectories):
+        signs = rng.choice([-1., 1.], n_factors)
+        x = np.empty(n_factors)
+        for i in range(n_factors):
+            if signs[i] > 0:
+                x[i] = rng.choice(levels[levels <= 1 - delta + 1e-12])
+            else:
+                x[i] = rng.choice(levels[levels >= delta - 1e-12])
+        start = len(X)
+        X.append(x.copy())
+        for k, i in enumerate(rng.permutation(n_factors)):
+            x[i] = x[i] + signs[i]*delta
+            X.append(x.copy())
+            steps.append((start + k, i, signs[i]*delta))
+    return np.array(X), np.array(steps)
+
+
+def morris_effects(Y, steps, n_factors):
+    """
+    mu, mu_star, sigma = morris_effects(Y, steps, n_factors)
+
+    Elementary effect statistics per factor from outputs Y of
+    morris_samples points
+    """
+    Y = np.asarray(Y, dtype=float)
+    pos = steps[:,0].astype(int)
+    factors = steps[:,1].astype(int)
+    ee = (Y[pos+1] - Y[pos]) / steps[:,2]
+    mu = np.zeros(n_factors)
+    mu_star = np.zeros(n_factors)
+    sigma = np.zeros(n_factors)
+    for i in range(n_factors):
+        ee_i = ee[(factors == i) & np.isfinite(ee)]
+        if len(ee_i):
+            mu[i] = ee_i.mean()
+            mu_star[i] = np.abs(ee_i).mean()
+            sigma[i] = ee_i.std(ddof=1) if len(ee_i) > 1 else 0.
+    return mu, mu_star, sigma
+
+
+def sobol_samples(n_factors, n_base=64, rng=None):
+    """
+    X = sobol_samples(n_factors, n_base=64)
+
+    Saltelli design: rows are A (n_base), B (n_base), then AB_i
+    (A with column i from B) for each factor. Uses a scrambled Sobol
+    sequence if scipy.stats.qmc is available.
+    """
+    rng = np.random.default_rng(rng)
+    try:
+        from scipy.stats import qmc
+        AB = qmc.Sobol(2*n_factors, scramble=True, seed=rng).random(n_base)
+    except ImportError:
+        AB = rng.random((n_base, 2*n_factors))
+    A = AB[:, :n_factors]
+    B = AB[:, n_factors:]
+    X = [A, B]
+    for i in range(n_factors):
+        ABi = A.copy()
+        ABi[:,i] = B[:,i]
+        X.append(ABi)
+    return np.vstack(X)
+
+
+def sobol_indices(Y, n_factors, n_base):
+    """
+    S1, ST = sobol_indices(Y, n_factors, n_base)
+
+    First-order (Saltelli 2010) and total (Jansen) indices from outputs
+    Y of sobol_samples points
+    """
+    Y = np.asarray(Y, dtype=float)
+    fA = Y[:n_base]
+    fB = Y[n_base:2*n_base]
+    var = np.var(np.concatenate([fA, fB]))
+    S1 = np.zeros(n_factors)
+    ST = np.zeros(n_factors)
+    if var <= 0:
+        return S1, ST
+    for i in range(n_factors):
+        fABi = Y[(2+i)*n_base:(3+i)*n_base]
+        S1[i] = np.nanmean(fB*(fABi - fA)) / var
+        ST[i] = 0.5*np.nanmean((fA - fABi)**2) / var
+    return S1, ST
+
+
+#============================================================
+def screen_keffs(popt, pert_rxns, variables=[], df_meas=None,
+                 method='morris',
+                 group_rxn_dict=None,
+                 log10_range=(-1., 1.),
+                 n_trajectories=10,
+                 n_levels=4,
+                 n_base=64,
+                 summaries=None,
+                 error_fun=None,
+                 seed=None,
+                 pool=None,
+                 n_workers=None,
+                 verbosity=0,
+                 **sim_opts):
+    """
+    df_sens = screen_keffs(popt, pert_rxns, variables, df_meas, method='morris')
+
+    Rank keffs (or groups of keffs) by influence on the fitting error
+    and/or trajectory summaries.
+
+    popt:        ParamOpt (its sim_params or conditions are simulated)
+    pert_rxns:   candidate rxn IDs
+    group_rxn_dict: dict of group - rxn IDs. One factor per group,
+                 scaling the keffs of its pert_rxns together.
+    log10_range: range of the log10 keff scaling factor per factor
+    method:      'morris' (n_trajectories*(n_factors+1) simulations) or
+                 'sobol' (n_base*(n_factors+2) simulations)
+    summaries:   dict of name - function(df_sim) -> float, computed on
+                 the popt.compute_conc_profile output
+    variables, df_meas, error_fun: as in ParamOpt.calc_error_conc. The
+                 'error' output is included if df_meas or popt.conditions
+                 is given.
+    Samples are simulated in parallel on pool (default: pool of n_workers
+    for the screen; n_workers=0: sequentially).
+
+    Returns DataFrame with one row per (factor, output): mu, mu_star,
+    sigma (morris) or S1, ST (sobol), and rank within the output
+    (1: most influential).
+    """
+    me = popt.me
+    if group_rxn_dict is None:
+        factors = list(pert_rxns)
+        factor_rxns = [[rid] for rid in pert_rxns]
+    else:
+        pert_set = set(pert_rxns)
+        factors = []
+        factor_rxns = []
+        for group, rids in iteritems(group_rxn_dict):
+            rids = [rid for rid in rids if rid in pert_set]
+            if rids:
+                factors.append(group)
+                factor_rxns.append(rids)
+    n_factors = len(factors)
+    keffs0 = {rid:me.reactions.get_by_id(rid).keff for rids in factor_rxns for rid in rids}
+
+    if method == 'morris':
+        U, steps = morris_samples(n_factors, n_trajectories, n_levels, rng=seed)
+    elif method == 'sobol':
+        U = sobol_samples(n_factors, n_base, rng=seed)
+    else:
+        raise ValueError("method must be 'morris' or 'sobol'")
+
+    lo, hi = log10_range
+    keffs_list = []
+    for u in U:
+        keffs = {}
+        for i, rids in enumerate(factor_rxns):
+            scale = 10**(lo + u[i]*(hi - lo))
+            for rid in rids:
+                keffs[rid] = keffs0[rid]*scale
+        keffs_list.append(keffs)
+
+    own_pool = False
+    if pool is None and n_workers != 0:
+        pool = popt.make_pool(n_workers, df_meas=df_meas)
+        own_pool = True
+    scores = popt.score_keffs(keffs_list, variables, df_meas=df_meas, error_fun=error_fun,
+                              pool=pool, verbosity=verbosity, **sim_opts)
+    if own_pool:
+        pool.close()
+
+    outputs = {}
+    if df_meas is not None or popt.conditions is not None:
+        outputs['error'] = np.array([score[0] for score in scores], dtype=float)
+    if summaries is not None:
+        for name, func in iteritems(summaries):
+            outputs[name] = np.array([func(score[2]) for score in scores], dtype=float)
+
+    rows = []
+    for output, Y in iteritems(outputs):
+        if method == 'morris':
+            mu, mu_star, sigma = morris_effects(Y, steps, n_factors)
+            stats = {'mu':mu, 'mu_star':mu_star, 'sigma':sigma}
+            key = mu_star
+        else:
+            S1, ST = sobol_indices(Y, n_factors, n_base)
+            stats = {'S1':S1, 'ST':ST}
+            key = ST
+        ranks = np.empty(n_factors, dtype=int)
+        ranks[np.argsort(-key)] = np.arange(1, n_factors+1)
+        for i, factor in enumerate(factors):
+            row = {'factor':factor, 'output':output, 'rank':ranks[i],
+                   'n_rxns':len(factor_rxns[i])}
+            row.update({k:v[i] for k,v in iteritems(stats)})
+            rows.append(row)
+
+    df_sens = pd.DataFrame(rows)
+    if len(df_sens):
+        df_sens = df_sens.sort_values(['output','rank']).reset_index(drop=True)
+    return df_sens
+
+
+def select_pert_rxns(df_sens, n_top=10, output='error', group_rxn_dict=None):
+    """
+    pert_rxns = select_pert_rxns(df_sens, n_top=10, output='error')
+
+    rxn IDs of the n_top most influential factors of screen_keffs.
+    Groups are expanded with group_rxn_dict.
+    """
+    df = df_sens[df_sens['output'] == output].sort_values('rank')
+    top = list(df['factor'][:n_top])
+    if group_rxn_dict is None:
+        return top
+    pert_rxns = []
+    for group in top:
+        pert_rxns.extend(group_rxn_dict[group])
+    return pert_rxns
@@ -0,0 +1,99 @@
+#============================================================
+# File surrogate.py
+#
+# class  RandomFeatureSurrogate
+#
+# Cheap online model of the fitting objective, used by
+# ParamOpt.fit_profile to screen candidate moves.
+#============================================================
+
+import numpy as np
+
+
+class RandomFeatureSurrogate(object):
+    """
+    Bayesian ridge regression on random Fourier features (approximate
+    Gaussian process with RBF kernel) of log10 keffs.
+
+    sur = RandomFeatureSurrogate(n_features=200, lengthscale=0.5)
+    sur.add(z, objval)                  # z: log10 keffs of pert_rxns
+    mean, std = sur.predict(Z)          # Z: (n_candidates, n_pert)
+
+    n_features:  number of random features
+    lengthscale: RBF length scale in log10 keff units
+    ridge:       prior precision of feature weights (relative to noise)
+    min_train:   number of samples before ready is True
+    """
+    def __init__(self, n_features=200, lengthscale=0.5, ridge=1e-2, min_train=10,
+                 seed=None):
+        self.n_features = n_features
+        self.lengthscale = lengthscale
+        self.ridge = ridge
+        self.min_train = min_train
+        self.rng = np.random.RandomState(seed)
+        self.Z = []
+        self.y = []
+        self._W = None
+        self._b = None
+        self._fit = None
+
+    @property
+    def n_train(self):
+        return len(self.y)
+
+    @property
+    def ready(self):
+        return self.n_train >= self.min_train
+
+    def add(self, z, y):
+        """
+        Add one training sample
+        """
+        z = np.asarray(z, dtype=float).ravel()
+        if self._W is None:
+            n_dim = len(z)
+            self._W = self.rng.normal(0., 1./self.lengthscale, (n_dim, self.n_features))
+            self._b = self.rng.uniform(0., 2*np.pi, self.n_features)
+        self.Z.append(z)
+        self.y.append(float(y))
+        self._fit = None
+
+    def features(self, Z):
+        Z = np.atleast_2d(Z)
+        return np.sqrt(2./self.n_features) * np.cos(np.dot(Z, self._W) + self._b)
+
+    def fit(self):
+        """
+        Solve for posterior of feature weights. Called lazily by predict.
+        """
+        Z = np.array(self.Z)
+        y = np.array(self.y)
+        # Standardize targets
+        y_mean = y.mean()
+        y_std = y.std()
+        if y_std <= 0:
+            y_std = 1.
+        Phi = self.features(Z)
+        A = np.dot(Phi.T, Phi) + self.ridge*np.eye(self.n_features)
+        L = np.linalg.cholesky(A)
+        w = np.linalg.solve(L.T, np.linalg.solve(L, np.dot(Phi.T, (y-y_mean)/y_std)))
+        resid = (y-y_mean)/y_std - np.dot(Phi, w)
+        noise = max(np.mean(resid**2), 1e-6)
+        self._fit = {'y_mean': y_mean, 'y_std': y_std,
+                     'L': L, 'w': w, 'noise': noise}
+        return self._fit
+
+    def predict(self, Z):
+        """
+        mean, std = predict(Z)
+
+        Predicted objective and its standard deviation for rows of Z
+        """
+        fit = self._fit
+        if fit is None:
+            fit = self.fit()
+        Phi = self.features(Z)
+        mean = np.dot(Phi, fit['w'])
+        V = np.linalg.solve(fit['L'], Phi.T)
+        var = fit['noise'] * (1. + np.sum(V**2, axis=0))
+        return fit['y_mean'] + fit['y_std']*mean, fit['y_std']*np.sqrt(var)
@@ -0,0 +1,33 @@
+#============================================================
+# File conftest.py
+#
+# Shared fixtures: synthetic ME-style model (benchmarks/synthetic.py)
+# solved with the 'highs' backend.
+#============================================================
+
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from synthetic import build_synthetic_me
+
+
+@pytest.fixture
+def me():
+    return build_synthetic_me(n_pathways=2, chain_length=2, seed=0)
+
+
+@pytest.fixture
+def make_me():
+    """
+    Factory of identical synthetic models (independent copies)
+    """
+    def make():
+        return build_synthetic_me(n_pathways=2, chain_length=2, seed=0)
+    return make
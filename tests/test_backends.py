@@ -0,0 +1,65 @@
+#============================================================
+# File test_backends.py
+#
+# Tests of LPBackend on the synthetic model
+#============================================================
+
+import pytest
+
+from dynamicme.backends import LPBackend
+
+
+class FakeVerifier(object):
+    """
+    Stands in for qMINOS: feasible only at mu <= mu_max
+    """
+    def __init__(self, mu_max):
+        self.mu_max = mu_max
+        self.mus = []
+
+    def solvelp(self, mu_fix, basis=None, verbosity=0):
+        self.mus.append(mu_fix)
+        if mu_fix <= self.mu_max:
+            return [mu_fix], 'optimal', 'hs'
+        return None, 'infeasible', None
+
+
+def make_backend(me, mu_max, max_backoff=3):
+    solver = LPBackend(me, verify=True, verify_max_backoff=max_backoff)
+    solver._verifier = FakeVerifier(mu_max)
+    return solver
+
+
+def test_bisectmu_unverified(me):
+    solver = LPBackend(me)
+    mu_opt, hs, x_opt, cache = solver.bisectmu(1e-4)
+    assert mu_opt > 0.
+    assert x_opt is not None
+    assert cache is None
+
+
+def test_verify_mu_backs_off(me):
+    solver = make_backend(me, 0.505)
+    mu, hs, x = solver.verify_mu(0.52, 0.01)
+    assert mu == pytest.approx(0.5)
+    assert x == [mu]
+    assert hs == 'hs'
+
+
+def test_verify_mu_falls_back_to_mumin(me):
+    solver = make_backend(me, 0.1, max_backoff=3)
+    mu, hs, x = solver.verify_mu(0.9, 0.01, mumin=0.05)
+    # Backoff exhausted: the returned mu and x are qMINOS-confirmed
+    assert mu == 0.05
+    assert x == [0.05]
+    assert solver._verifier.mus[-1] == 0.05
+
+
+def test_verify_mu_infeasible(me):
+    solver = make_backend(me, -1.)
+    mu, hs, x = solver.verify_mu(0.9, 0.01)
+    assert (mu, hs, x) == (0., None, None)
+    solver = make_backend(me, -1.)
+    mu_opt, hs, x_opt, cache = solver.bisectmu(1e-3)
+    assert x_opt is None
+    assert cache == {'infeasible': True}
@@ -0,0 +1,99 @@
+#============================================================
+# File test_basis.py
+#
+# Tests of BasisLibrary and per-event basis replay
+#============================================================
+
+import os
+import time
+
+import numpy as np
+
+from dynamicme.basis import BasisLibrary, compact_basis, expand_basis
+from dynamicme.dynamic import DynamicME
+
+
+def test_compact_basis_round_trip():
+    hs = np.array([0, 1, 2, 3, -1], dtype=np.int32)
+    compact = compact_basis(hs)
+    assert compact[0].dtype == np.int8
+    back = expand_basis(compact)
+    assert back.dtype == np.int32
+    np.testing.assert_array_equal(back, hs)
+    assert compact_basis(None) is None
+    assert expand_basis(None, default='x') == 'x'
+
+
+def test_library_lru_in_memory():
+    lib = BasisLibrary(max_entries=2)
+    lib.put('a', np.array([1, 2]))
+    lib.put('b', np.array([3, 4]))
+    assert lib.get('a') is not None     # a is now most recent
+    lib.put('c', np.array([5, 6]))
+    assert lib.get('b') is None
+    np.testing.assert_array_equal(lib.get('a'), [1, 2])
+    np.testing.assert_array_equal(lib.get('c'), [5, 6])
+    assert lib.n_hits == 3
+    assert lib.n_misses == 1
+
+
+def test_library_disk_persistence_and_eviction(tmp_path):
+    path = str(tmp_path)
+    lib = BasisLibrary(path, max_entries=2)
+    hs0 = np.array([0, 1, 2], dtype=np.int32)
+    lib.put('k0', hs0)
+    lib.put('k1', np.array([3, 4, 5]))
+    now = time.time()
+    os.utime(os.path.join(path, 'k0.npz'), (now-200, now-200))
+    os.utime(os.path.join(path, 'k1.npz'), (now-100, now-100))
+
+    # Persists across libraries, in the original dtype
+    lib2 = BasisLibrary(path, max_entries=2)
+    hs = lib2.get('k0')     # Read from disk: k0 becomes most recent
+    assert hs.dtype == np.int32
+    np.testing.assert_array_equal(hs, hs0)
+    lib2.put('k2', np.array([6, 7, 8]))
+    assert sorted(os.listdir(path)) == ['k0.npz', 'k2.npz']
+    assert BasisLibrary(path).get('k1') is None
+
+    lib2.clear()
+    assert os.listdir(path) == []
+    assert lib2.get('k0') is None
+
+
+def test_simulate_batch_replays_event_bases(me):
+    # HiGHS returns no basis: tag each solve event with a fake one
+    dyme = DynamicME(me, backend='highs', exchange_one_rxn=True)
+    calls = []
+    def solve_mu(prec_bs, basis=None, use_library=True, **kwargs):
+        mu_opt, hs, x_opt, cache = DynamicME.solve_mu(dyme, prec_bs, **kwargs)
+        calls.append((basis, use_library))
+        return mu_opt, np.full(4, len(calls), dtype=np.int32), x_opt, cache
+    dyme.solve_mu = solve_mu
+
+    def run(basis_ref=None):
+        del calls[:]
+        return dyme.simulate_batch(3., {'glc__D_e': 2., 'o2_e': 0.21, 'ac_e': 0.}, 0.1,
+                                   dt=0.25, lb_dict={'EX_glc__D_e': -10.}, prec_bs=1e-4,
+                                   verbosity=0, record_bases=True, basis_ref=basis_ref)
+
+    result = run()
+    events = result['basis_events']
+    assert len(events) == len(calls) >= 2
+    assert [e['iter'] for e in events] == sorted(e['iter'] for e in events)
+    for k, event in enumerate(events):
+        assert event['hs'][0].dtype == np.int8
+        assert (expand_basis(event['hs']) == k+1).all()
+    # Without a reference, each event starts from the previous one
+    assert calls[0][0] is None
+    assert (calls[1][0] == 1).all()
+
+    # Replay: event k starts from event k of the reference
+    ref = [dict(e, hs=compact_basis(np.full(4, 10+k, dtype=np.int32)))
+           for k, e in enumerate(events)]
+    result2 = run(basis_ref=ref)
+    for k, (basis, use_library) in enumerate(calls):
+        assert (basis == 10+k).all()
+        assert basis.dtype == np.int32
+        assert not use_library
+    np.testing.assert_allclose(result2['biomass'], result['biomass'])
@@ -0,0 +1,50 @@
+#============================================================
+# File test_cmaes.py
+#
+# Tests of CMAES
+#============================================================
+
+import numpy as np
+import pytest
+
+from dynamicme.cmaes import CMAES
+
+
+def sphere(x):
+    return float(np.sum((x - 0.3)**2))
+
+
+def test_cmaes_minimizes_sphere():
+    es = CMAES(np.ones(5), 0.5, seed=0)
+    for it in range(500):
+        if es.stop():
+            break
+        X = es.ask()
+        es.tell(X, [sphere(x) for x in X])
+    assert es.fbest < 1e-6
+    np.testing.assert_allclose(es.xbest, 0.3, atol=1e-3)
+
+
+def test_cmaes_bounds_and_seed():
+    bounds = (np.zeros(3), np.full(3, 0.1))
+    es1 = CMAES(np.full(3, 0.05), 1., bounds=bounds, seed=1)
+    es2 = CMAES(np.full(3, 0.05), 1., bounds=bounds, seed=1)
+    X1 = es1.ask()
+    np.testing.assert_array_equal(X1, es2.ask())
+    assert X1.shape == (es1.popsize, 3)
+    assert np.all(X1 >= 0.) and np.all(X1 <= 0.1)
+    # Optimum on the bound
+    for it in range(100):
+        X = es1.ask()
+        es1.tell(X, [np.sum((x + 1.)**2) for x in X])
+    np.testing.assert_allclose(es1.xbest, 0., atol=1e-3)
+
+
+def test_cmaes_popsize_validated():
+    for popsize in [0, 1]:
+        with pytest.raises(ValueError):
+            CMAES(np.zeros(3), 0.5, popsize=popsize)
+    es = CMAES(np.zeros(3), 0.5, popsize=2, seed=0)
+    X = es.ask()
+    es.tell(X, [sphere(x) for x in X])
+    assert np.all(np.isfinite(es.mean))
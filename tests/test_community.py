@@ -0,0 +1,74 @@
+#============================================================
+# File test_community.py
+#
+# Tests of Community on the synthetic model
+#============================================================
+
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+from dynamicme.community import Community, CommunityMember
+from dynamicme.dynamic import DynamicME
+
+
+C0_DICT = {'glc__D_e': 0.5, 'o2_e': 0.21, 'ac_e': 0.}
+LB_DICT = {'EX_glc__D_e': -10., 'EX_o2_e': -20., 'EX_ac_e': -10.}
+X0_DICT = {'a': 0.1, 'b': 0.1}
+
+
+def make_members(make_me):
+    return OrderedDict((name, DynamicME(make_me(), backend='highs', exchange_one_rxn=True))
+                       for name in ['a', 'b'])
+
+
+def run_community(comm, **kwargs):
+    return comm.simulate_batch(2., dict(C0_DICT), dict(X0_DICT), dt=0.25,
+                               lb_dict=dict(LB_DICT), prec_bs=1e-4, **kwargs)
+
+
+def test_identical_members_grow_alike(make_me):
+    members = make_members(make_me)
+    with Community(members, processes=False) as comm:
+        result = run_community(comm)
+    final = result['biomass'][-1]
+    assert final['a'] > X0_DICT['a']
+    assert final['a'] == pytest.approx(final['b'])
+    for conc in result['concentration']:
+        assert min(conc.values()) >= 0.
+    # Routing and bound deltas released in every member
+    for dyme in members.values():
+        assert dyme.xl is None
+        assert dyme._make_lp_full is None
+
+
+def test_release_on_error(make_me):
+    members = make_members(make_me)
+    dyme = members['b']
+    calls = []
+    def solve_mu(*args, **kwargs):
+        calls.append(1)
+        if len(calls) > 2:
+            raise RuntimeError('solver failed')
+        return DynamicME.solve_mu(dyme, *args, **kwargs)
+    dyme.solve_mu = solve_mu
+    with Community(members, processes=False) as comm:
+        with pytest.raises(RuntimeError):
+            run_community(comm)
+    for dyme in members.values():
+        assert dyme.xl is None
+        assert dyme._make_lp_full is None
+
+
+def test_caps_hold_for_one_solve(me):
+    dyme = DynamicME(me, backend='highs', exchange_one_rxn=True)
+    member = CommunityMember(dyme, list(C0_DICT.keys()), lb_dict=LB_DICT)
+    conc = np.array([C0_DICT[m] for m in member.metids])
+    k = member.metids.index('glc__D_e')
+    member.solve(conc, {'glc__D_e': 1.})
+    assert dyme.xl[member.bound_inds[list(member.bound_pos).index(k)]] == -1.
+    member.solve(conc)
+    assert dyme.xl[member.bound_inds[list(member.bound_pos).index(k)]] == -10.
+    member.finish()
+    assert dyme.xl is None
@@ -0,0 +1,64 @@
+#============================================================
+# File test_concs.py
+#
+# Tests of complex/protein concentration conversion
+#============================================================
+
+import numpy as np
+import pytest
+
+from dynamicme.dynamic import DynamicME, get_cplx_concs
+
+
+def test_cplx_prot_concs_round_trip(me):
+    # Distinct subunits per complex, so protein concs determine complexes
+    for j, data in enumerate(me.complex_data):
+        data.stoichiometry = {'protA_%d' % j: 2., 'protB_%d' % j: 3.}
+    dyme = DynamicME(me, backend='highs', exchange_one_rxn=True)
+    cplx_ids = [data.id for data in me.complex_data]
+    rs = np.random.RandomState(0)
+    cplx_concs = {cid: rs.uniform(0.1, 1.) for cid in cplx_ids}
+
+    prot_concs = dyme.cplx_to_prot_concs(cplx_concs)
+    assert prot_concs['protA_0'] == pytest.approx(2*cplx_concs[cplx_ids[0]])
+    assert prot_concs['protB_0'] == pytest.approx(3*cplx_concs[cplx_ids[0]])
+    back = dyme.prot_to_cplx_concs(prot_concs)
+    for cid in cplx_ids:
+        assert back[cid] == pytest.approx(cplx_concs[cid])
+
+    # Array form: (n_time, n_cplx)
+    X = rs.uniform(0.1, 1., (4, len(cplx_ids)))
+    Y = dyme.cplx_to_prot_concs(X, cplx_ids=cplx_ids)
+    np.testing.assert_allclose(dyme.prot_to_cplx_concs(Y, cplx_ids=cplx_ids), X)
+
+
+def test_prot_to_cplx_concs_scarcest_subunit(me):
+    for j, data in enumerate(me.complex_data):
+        data.stoichiometry = {'protA_%d' % j: 2., 'protB_%d' % j: 3.}
+    dyme = DynamicME(me, backend='highs', exchange_one_rxn=True)
+    cid = me.complex_data[0].id
+    cplx_concs = dyme.prot_to_cplx_concs({'protA_0': 1., 'protB_0': 6.})
+    assert cplx_concs[cid] == pytest.approx(0.5)
+    # Missing subunits count as 0
+    assert cplx_concs[me.complex_data[1].id] == 0.
+
+
+def test_cplx_concs_use_numeric_keffs(me):
+    dyme = DynamicME(me, backend='highs', exchange_one_rxn=True)
+    mu_opt, hs, x_opt, cache = dyme.bisectmu(1e-4, verbosity=0)
+    dyme.set_solution_vector(x_opt)
+    concs0 = get_cplx_concs(dyme, muopt=mu_opt)
+    rxn = me.reactions.get_by_id('GLCt')
+    keff0 = rxn.keff
+    stoich0 = rxn.metabolites[rxn.complex]
+    dyme.set_keffs_numeric(['GLCt'], [0.5*keff0])
+    concs = get_cplx_concs(dyme, muopt=mu_opt)
+    # Same fluxes, half the keff: twice the enzyme
+    assert concs0['CPLX_GLCt'] > 0.
+    assert concs['CPLX_GLCt'] == pytest.approx(2*concs0['CPLX_GLCt'])
+    assert concs['CPLX_translation'] == pytest.approx(concs0['CPLX_translation'])
+    # The model itself is not edited
+    assert rxn.keff == keff0
+    assert rxn.metabolites[rxn.complex] is stoich0
+    dyme.reset_keffs_numeric()
+    assert get_cplx_concs(dyme, muopt=mu_opt)['CPLX_GLCt'] == pytest.approx(concs0['CPLX_GLCt'])
@@ -0,0 +1,59 @@
+#============================================================
+# File test_ensemble.py
+#
+# Tests of streaming ensemble statistics
+#============================================================
+
+import numpy as np
+
+from dynamicme.ensemble import (RunningStats, P2Quantile, KeffSampler,
+                                sample_keff_ensemble)
+
+
+def test_running_stats_matches_numpy():
+    rs = np.random.RandomState(0)
+    X = rs.normal(2., 3., (200, 3, 4))
+    X[5, 0, 0] = np.nan
+    stats = RunningStats((3, 4))
+    for x in X:
+        stats.add(x)
+    np.testing.assert_allclose(stats.mean, np.nanmean(X, axis=0))
+    np.testing.assert_allclose(stats.var, np.nanvar(X, axis=0, ddof=1))
+    assert stats.n[0, 0] == 199
+    assert stats.n[1, 1] == 200
+
+
+def test_running_stats_var_needs_two_values():
+    stats = RunningStats(2)
+    stats.add([1., np.nan])
+    assert np.all(np.isnan(stats.var))
+
+
+def test_p2_quantile_exact_below_five():
+    est = P2Quantile(0.5, (2,))
+    for x in [[3., np.nan], [1., np.nan], [2., 4.]]:
+        est.add(x)
+    np.testing.assert_allclose(est.value(), [2., 4.])
+    assert np.isnan(P2Quantile(0.5, (1,)).value()[0])
+
+
+def test_p2_quantile_approximates_percentiles():
+    rs = np.random.RandomState(1)
+    X = np.column_stack([rs.normal(0., 1., 5000), rs.exponential(2., 5000)])
+    for p in [0.05, 0.5, 0.95]:
+        est = P2Quantile(p, (2,))
+        for x in X:
+            est.add(x)
+        np.testing.assert_allclose(est.value(), np.percentile(X, 100*p, axis=0),
+                                   atol=0.1, rtol=0.05)
+
+
+def test_keff_sampler_batches_match_full_draw(me):
+    pert_rxns = ['GLCt', 'translation']
+    full = sample_keff_ensemble(me, 7, pert_rxns, seed=3)
+    sampler = KeffSampler(me, pert_rxns, seed=3)
+    batched = sampler.draw(3) + sampler.draw(1) + sampler.draw(3)
+    assert len(batched) == 7
+    for keffs, keffs_b in zip(full, batched):
+        assert keffs == keffs_b
+    assert full[0] != full[1]
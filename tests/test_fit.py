@@ -0,0 +1,160 @@
+#============================================================
+# File test_fit.py
+#
+# Tests of ParamOpt keff fitting on the synthetic model
+#============================================================
+
+import numpy as np
+import pytest
+
+from dynamicme.dynamic import ParamOpt
+
+
+SIM_PARAMS = {'T': 2., 'X0': 0.1, 'dt': 0.25,
+              'c0_dict': {'glc__D_e': 2., 'o2_e': 0.21, 'ac_e': 0.},
+              'lb_dict': {'EX_glc__D_e': -10., 'EX_o2_e': -20., 'EX_ac_e': -10.},
+              'ub_dict': {}, 'extra_rxns_tracked': [], 'ZERO_CONC': 1e-3}
+VARIABLES = ['biomass', 'glc__D_e']
+PERT_RXNS = ['translation', 'GLCt']
+
+
+def make_popt(me, **kwargs):
+    return ParamOpt(me, dict(SIM_PARAMS), backend='highs', exchange_one_rxn=True, **kwargs)
+
+
+def measured_profile(popt, sim_params=None):
+    """
+    'Measurements': profile simulated at the current keffs
+    """
+    result = popt.simulate_batch(popt.make_dyme(), verbosity=0, sim_params=sim_params)
+    return popt.compute_conc_profile(result)
+
+
+def perturb(popt, factor=3.):
+    keffs = {rid: factor*popt.me.reactions.get_by_id(rid).keff for rid in PERT_RXNS}
+    popt.update_keffs(keffs)
+    return keffs
+
+
+def test_fit_profile_multi_fidelity(me):
+    popt = make_popt(me)
+    df_meas = measured_profile(popt)
+    schedule = popt.get_fidelity_schedule('multi')
+    assert schedule['coarse']['dt'] == pytest.approx(0.5)
+    assert schedule['fine']['dt'] == pytest.approx(0.25)
+    assert popt.get_fidelity_schedule(None) is None
+    with pytest.raises(ValueError):
+        popt.get_fidelity_schedule({'phase1': 'medium'})
+
+    perturb(popt)
+    sol_best, opt_stats, result_best = popt.fit_profile(
+        df_meas, PERT_RXNS, VARIABLES, max_iter_phase1=2, max_iter_phase2=4,
+        verbosity=0, fidelity='multi', rng=np.random.default_rng(0))
+    phase1 = [s for s in opt_stats if s['phase'] == 1]
+    assert len(phase1) == 2
+    assert all(s['fidelity'] == 'coarse' for s in phase1)
+    # Only fine simulations are accepted or reported as best
+    assert np.allclose(np.diff(result_best['time']), 0.25)
+    obj0 = opt_stats[0]['objbest']
+    fine = [s['obj'] for s in opt_stats if s['phase'] == 2 and s['fidelity'] == 'fine']
+    assert popt.lbta_state['obj_best'] == pytest.approx(min([obj0] + fine))
+
+
+class FixedSurrogate(object):
+    """
+    Surrogate predicting the same objective for every candidate
+    """
+    ready = True
+
+    def __init__(self, mean):
+        self.mean = mean
+        self.Z = []
+
+    def add(self, z, objval):
+        self.Z.append(z)
+
+    def predict(self, Z):
+        return np.full(len(Z), self.mean), np.zeros(len(Z))
+
+
+@pytest.mark.parametrize('mean,n_saved', [(1e9, 3), (-1e9, 0)])
+def test_fit_profile_surrogate_screens_moves(me, mean, n_saved):
+    popt = make_popt(me)
+    df_meas = measured_profile(popt)
+    keffs = perturb(popt)
+    n_sims = []
+    simulate_batch = popt.simulate_batch
+    def count(*args, **kwargs):
+        n_sims.append(1)
+        return simulate_batch(*args, **kwargs)
+    popt.simulate_batch = count
+    surrogate = FixedSurrogate(mean)
+    sol_best, opt_stats, result_best = popt.fit_profile(
+        df_meas, PERT_RXNS, VARIABLES, max_iter_phase1=1, max_iter_phase2=3,
+        verbosity=0, surrogate=surrogate, rng=np.random.default_rng(0))
+    phase2 = [s for s in opt_stats if s['phase'] == 2]
+    assert len(phase2) == 3
+    assert phase2[-1]['n_sims_saved'] == n_saved
+    # Initial solution, Phase I and the simulated Phase II candidates
+    assert len(n_sims) == 2 + 3 - n_saved
+    # Trained on every (fine) simulation
+    assert len(surrogate.Z) == len(n_sims)
+    if n_saved == 3:
+        # Skipped moves are undone
+        assert [s['fidelity'] for s in phase2] == ['surrogate']*3
+        for rid, keff in keffs.items():
+            assert popt.me.reactions.get_by_id(rid).keff == pytest.approx(keff)
+
+
+def test_score_conditions_serial_and_pool(me):
+    popt = make_popt(me)
+    sim_params2 = dict(SIM_PARAMS, c0_dict=dict(SIM_PARAMS['c0_dict'], glc__D_e=1.))
+    df1 = measured_profile(popt)
+    df2 = measured_profile(popt, sim_params2)
+    popt = make_popt(me, conditions=[(dict(SIM_PARAMS), df1, None),
+                                     (sim_params2, df2, 2.)])
+    objval, results, df_sims = popt.score_conditions(VARIABLES)
+    assert len(results) == 2
+    assert objval == pytest.approx(0., abs=1e-8)
+
+    keffs = perturb(popt)
+    objval_serial, results, df_sims = popt.score_conditions(VARIABLES)
+    error1 = popt.calc_error_conc(df_sims[0], df1, VARIABLES)
+    error2 = popt.calc_error_conc(df_sims[1], df2, VARIABLES)
+    assert error1 > 0. and error2 > 0.
+    assert objval_serial == pytest.approx(error1 + 2*error2)
+    # Workers hold the perturbed keffs; other keffs are sent as deltas
+    with popt.make_pool(2) as pool:
+        popt.update_keffs({rid: keff/3. for rid, keff in keffs.items()})
+        pool_model_keffs = popt.score_conditions(VARIABLES, pool=pool)[0]
+        popt.update_keffs(keffs)
+        objval_pool = popt.score_conditions(VARIABLES, pool=pool)[0]
+    assert objval_pool == pytest.approx(objval_serial, rel=1e-6)
+    assert pool_model_keffs == pytest.approx(0., abs=1e-6)
+
+
+def test_fit_profile_population(make_me):
+    def fit():
+        popt = make_popt(make_me())
+        df_meas = measured_profile(popt)
+        perturb(popt)
+        obj0 = popt.calc_error_conc(measured_profile(popt), df_meas, VARIABLES)
+        sol_best, opt_stats, result_best = popt.fit_profile_population(
+            df_meas, PERT_RXNS, VARIABLES, n_chains=2, exchange_every=2, seed=0,
+            max_iter_phase1=1, max_iter_phase2=4, verbosity=0)
+        return popt, df_meas, obj0, opt_stats
+
+    popt, df_meas, obj0, opt_stats = fit()
+    assert set(s['chain'] for s in opt_stats) == {0, 1}
+    assert max(s['epoch'] for s in opt_stats) >= 1
+    phase2 = [s for s in opt_stats if s['phase'] == 2]
+    for chain in [0, 1]:
+        iters = [s['iter'] for s in phase2 if s['chain'] == chain]
+        assert iters == list(range(1, len(iters)+1))
+    # Best keffs are set in the model
+    obj_best = min(s['objbest'] for s in opt_stats)
+    assert obj_best <= obj0
+    obj = popt.calc_error_conc(measured_profile(popt), df_meas, VARIABLES)
+    assert obj == pytest.approx(obj_best)
+    # Reproducible from the seed
+    assert [s['obj'] for s in fit()[3]] == [s['obj'] for s in opt_stats]
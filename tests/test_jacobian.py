@@ -0,0 +1,69 @@
+#============================================================
+# File test_jacobian.py
+#
+# Tests of the finite-difference keff Jacobian
+#============================================================
+
+import numpy as np
+import pytest
+
+from dynamicme.dynamic import ParamOpt
+
+
+class ToyParamOpt(ParamOpt):
+    """
+    ParamOpt whose residuals are an analytic function of log10 keffs
+    """
+    rids = ['R1', 'R2']
+
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def resid(z):
+        return np.array([z[0]**2 + z[1], 3*z[0]*z[1], np.exp(z[1])])
+
+    @staticmethod
+    def jac(z):
+        return np.array([[2*z[0], 1.],
+                         [3*z[1], 3*z[0]],
+                         [0., np.exp(z[1])]])
+
+    def residuals_keffs(self, keffs_list, variables, df_meas=None, tts=None,
+                        basis_refs=None, record_bases=False, pool=None, dyme=None,
+                        **sim_opts):
+        outs = []
+        for keffs in keffs_list:
+            z = np.log10([keffs[rid] for rid in self.rids])
+            outs.append((self.resid(z), None, None))
+        return outs
+
+
+@pytest.mark.parametrize('central,h,tol', [(False, 1e-5, 1e-4), (True, 1e-3, 1e-5)])
+def test_keff_jacobian_analytic(central, h, tol):
+    popt = ToyParamOpt()
+    z = np.array([0.7, 1.3])
+    keffs = dict(zip(popt.rids, 10**z))
+    J, r0, tts, basis_refs = popt.keff_jacobian(None, popt.rids, [], keffs=keffs, h=h,
+                                                central=central, n_workers=0,
+                                                dyme=object())
+    np.testing.assert_allclose(r0, popt.resid(z))
+    np.testing.assert_allclose(J, popt.jac(z), rtol=tol, atol=tol)
+
+
+def test_keff_jacobian_backward_at_upper_bound():
+    popt = ToyParamOpt()
+    z = np.array([0.7, 1.3])
+    keffs = dict(zip(popt.rids, 10**z))
+    evaluated = []
+    residuals_keffs = popt.residuals_keffs
+    def record(keffs_list, *args, **kwargs):
+        evaluated.extend(keffs_list)
+        return residuals_keffs(keffs_list, *args, **kwargs)
+    popt.residuals_keffs = record
+    keff_max = {'R1': keffs['R1']}
+    J = popt.keff_jacobian(None, popt.rids, [], keffs=keffs, h=1e-5, keff_max=keff_max,
+                           n_workers=0, dyme=object())[0]
+    assert max(k['R1'] for k in evaluated) <= keff_max['R1']
+    assert max(k['R2'] for k in evaluated) > keffs['R2']
+    np.testing.assert_allclose(J, popt.jac(z), rtol=1e-4, atol=1e-4)
@@ -0,0 +1,49 @@
+#============================================================
+# File test_kinetics.py
+#
+# Tests of UptakeKinetics
+#============================================================
+
+import numpy as np
+import pytest
+
+from dynamicme.kinetics import UptakeKinetics, PTS_PARAMS
+
+
+def test_michaelis_menten_rates():
+    kin = UptakeKinetics(mode='bound')
+    kin.add_michaelis_menten('EX_glc__D_e', 'glc__D_e', vmax=10., Km=0.5)
+    kin.add_michaelis_menten('EX_ac_e', 'ac_e', vmax=4., Km=2.)
+    kin.bind(['o2_e', 'ac_e', 'glc__D_e'])
+    rates = kin.rates(np.array([0.2, 2., 1.5]))
+    np.testing.assert_allclose(rates, [10.*1.5/2., 4.*2./4.])
+    # Negative concentrations are treated as 0
+    np.testing.assert_allclose(kin.rates(np.array([0., -1., -1.])), [0., 0.])
+
+
+def test_chassagnole_pts_saturates_at_vmax():
+    kin = UptakeKinetics(mode='keff')
+    kin.add_chassagnole_pts('GLCptspp', 'glc__D_e', vmax=50.)
+    kin.bind(['glc__D_e'])
+    low, mid, high = [kin.rates(np.array([c]))[0] for c in [1e-3, PTS_PARAMS['Ka3'], 1e9]]
+    assert 0. < low < mid < high
+    assert high == pytest.approx(50., rel=1e-5)
+
+
+def test_update_pushes_only_changes_above_tol():
+    kin = UptakeKinetics(mode='bound', tol=1e-2)
+    kin.add_michaelis_menten('EX_a', 'a', vmax=10., Km=1.)
+    kin.add_michaelis_menten('EX_b', 'b', vmax=10., Km=1.)
+    kin.bind(['a', 'b'])
+    assert list(kin.update(np.array([1., 1.]))) == [0, 1]
+    values = kin.values.copy()
+    # a: 0.1% change (below tol), b: large change
+    changed = kin.update(np.array([1.002, 3.]))
+    assert list(changed) == [1]
+    assert kin.values[0] == values[0]
+    assert kin.values[1] == pytest.approx(7.5)
+
+
+def test_invalid_mode():
+    with pytest.raises(ValueError):
+        UptakeKinetics(mode='flux')
@@ -0,0 +1,54 @@
+#============================================================
+# File test_log.py
+#
+# Tests of SimLogger and the package log handlers
+#============================================================
+
+import json
+
+import pytest
+
+from dynamicme.dynamic import DynamicME
+from dynamicme.log import SimLogger, configure_logging
+
+
+@pytest.fixture
+def handlers():
+    handlers = []
+    def configure(**kwargs):
+        handlers.extend(configure_logging(**kwargs))
+        return handlers
+    yield configure
+    configure_logging()
+    for handler in handlers:
+        handler.close()
+
+
+def test_verbosity_and_rate_limit(handlers):
+    ring = handlers(stdout=False, ring_buffer=100)[-1]
+    slog = SimLogger(verbosity=1, every=2)
+    slog.debug('hidden %d', 1)
+    slog.info('shown %d', 1)
+    for i in range(4):
+        slog.record('step', iter_step=i, t=float(i))
+    records = list(ring.records)
+    assert [r.get('msg') for r in records[:1]] == ['shown 1']
+    assert [r['event'] for r in records[1:]] == ['step', 'step']
+    assert [r['t'] for r in records[1:]] == [0., 2.]
+    SimLogger(verbosity=0).info('quiet')
+    assert len(ring.records) == 3
+
+
+def test_simulate_batch_step_records(me, tmpdir, handlers):
+    filename = str(tmpdir.join('log.jsonl'))
+    ring = handlers(stdout=False, filename=filename, ring_buffer=1000)[-1]
+    dyme = DynamicME(me, backend='highs', exchange_one_rxn=True)
+    result = dyme.simulate_batch(1., {'glc__D_e': 2., 'o2_e': 0.21, 'ac_e': 0.}, 0.1,
+                                 dt=0.25, lb_dict={'EX_glc__D_e': -10.},
+                                 prec_bs=1e-4, verbosity=1)
+    steps = [r for r in ring.records if r.get('event') == 'step']
+    assert len(steps) == len(result['time']) - 1
+    assert steps[-1]['t'] == pytest.approx(result['time'][-1])
+    with open(filename) as f:
+        lines = [json.loads(line) for line in f]
+    assert [r for r in lines if r.get('event') == 'step'][-1]['t'] == steps[-1]['t']
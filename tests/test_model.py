@@ -0,0 +1,45 @@
+#============================================================
+# File test_model.py
+#
+# Tests of model caches
+#============================================================
+
+from dynamicme.model import (get_complex_index, model_hash, model_signature,
+                             invalidate_model_signature)
+from synthetic import SyntheticComplexData
+
+
+def test_caches_follow_model_structure(me):
+    index = get_complex_index(me)
+    h = model_hash(me)
+    assert get_complex_index(me) is index
+    assert model_hash(me) == h
+
+    # Same counts, different reaction
+    me.reactions.get_by_id('ATPM').id = 'ATPM2'
+    me.repair()
+    invalidate_model_signature(me)
+    assert model_hash(me) != h
+    assert get_complex_index(me) is not index
+
+
+def test_complex_index_follows_replaced_complex(me):
+    index = get_complex_index(me)
+    data = me.complex_data[0]
+    me.complex_data[0] = SyntheticComplexData(data.complex, data.formation, 1.)
+    index2 = get_complex_index(me)
+    assert index2 is not index
+    assert index2.complex_data[data.id] is me.complex_data[0]
+
+
+def test_signature_cached_until_structure_changes(me):
+    sig = model_signature(me)
+    cached = me._model_signature
+    assert model_signature(me) == sig
+    assert me._model_signature is cached
+    # Adding or removing objects changes the cheap key
+    rxn = me.reactions[-1]
+    me.remove_reactions([rxn])
+    assert model_signature(me) != sig
+    me.add_reactions([rxn])
+    assert me._model_signature is not cached
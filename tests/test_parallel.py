@@ -0,0 +1,63 @@
+#============================================================
+# File test_parallel.py
+#
+# Tests of WorkerPool tasks on the synthetic model
+#============================================================
+
+import numpy as np
+import pytest
+
+from dynamicme.dynamic import DynamicME
+from dynamicme.parallel import WorkerPool
+
+PREC_BS = 1e-4
+
+
+def test_ksectmu_matches_bisectmu(me):
+    dyme = DynamicME(me, backend='highs', exchange_one_rxn=True)
+    with WorkerPool(dyme, n_workers=2) as pool:
+        mu_k, hs, x_k, cache = dyme.ksectmu(PREC_BS, pool)
+        mu_b = dyme.bisectmu(PREC_BS, verbosity=0)[0]
+        assert mu_k == pytest.approx(mu_b, abs=2*PREC_BS)
+        assert x_k is not None
+        # Numeric keffs set after the pool was created reach the workers
+        rid = 'translation'
+        keff = me.reactions.get_by_id(rid).keff
+        dyme.set_keffs_numeric([rid], [0.5*keff])
+        mu_k2 = dyme.ksectmu(PREC_BS, pool)[0]
+        mu_b2 = dyme.bisectmu(PREC_BS, verbosity=0)[0]
+        dyme.reset_keffs_numeric()
+    assert mu_k2 < mu_k
+    assert mu_k2 == pytest.approx(mu_b2, abs=2*PREC_BS)
+
+
+def test_ksectmu_reports_infeasible(me):
+    # Infeasible at any mu: no glucose and forced secretion of acetate
+    me.reactions.get_by_id('EX_glc__D_e').lower_bound = 0.
+    me.reactions.get_by_id('EX_ac_e').lower_bound = 1.
+    dyme = DynamicME(me, backend='highs', exchange_one_rxn=True)
+    with WorkerPool(dyme, n_workers=2) as pool:
+        mu, hs, x, cache = dyme.ksectmu(PREC_BS, pool)
+    assert mu == 0.
+    assert x is None
+    assert cache == {'infeasible': True}
+    dyme.set_solution_vector(x, cache)
+    assert dyme.x is None
+
+
+def test_fva_pool_matches_serial(me):
+    dyme = DynamicME(me, backend='highs', exchange_one_rxn=True)
+    rid = 'translation'
+    dyme.set_keffs_numeric([rid], [0.5*me.reactions.get_by_id(rid).keff])
+    mu_opt, hs, x_opt, cache = dyme.bisectmu(PREC_BS, verbosity=0)
+    mu_fix = 0.9*mu_opt
+    rxns = ['EX_ac_e', 'GLCt', 'PREsink', 'not_in_model']
+    fmin, fmax = dyme.fva(mu_fix, rxns)
+    assert np.isnan(fmin[-1]) and np.isnan(fmax[-1])
+    assert np.all(fmin[:-1] <= fmax[:-1])
+    # Below max growth there is slack
+    assert np.any(fmax[:-1] - fmin[:-1] > 1e-6)
+    with WorkerPool(dyme, n_workers=2) as pool:
+        fmin_p, fmax_p = dyme.fva(mu_fix, rxns, pool=pool)
+    np.testing.assert_allclose(fmin_p, fmin, rtol=1e-6, atol=1e-8)
+    np.testing.assert_allclose(fmax_p, fmax, rtol=1e-6, atol=1e-8)
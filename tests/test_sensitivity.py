@@ -0,0 +1,51 @@
+#============================================================
+# File test_sensitivity.py
+#
+# Tests of Morris and Sobol designs and indices
+#============================================================
+
+import numpy as np
+import pytest
+
+from dynamicme.sensitivity import (morris_samples, morris_effects,
+                                   sobol_samples, sobol_indices)
+
+
+def test_morris_one_factor_at_a_time():
+    n_factors = 4
+    X, steps = morris_samples(n_factors, n_trajectories=6, n_levels=4, rng=0)
+    assert X.shape == (6*(n_factors+1), n_factors)
+    assert steps.shape == (6*n_factors, 3)
+    assert np.all((X >= 0) & (X <= 1))
+    for pos, i, delta in steps:
+        diff = X[int(pos)+1] - X[int(pos)]
+        assert np.count_nonzero(diff) == 1
+        assert diff[int(i)] == pytest.approx(delta)
+
+
+def test_morris_effects_linear():
+    a = np.array([3., -1., 0., 0.5])
+    X, steps = morris_samples(len(a), n_trajectories=8, rng=1)
+    mu, mu_star, sigma = morris_effects(X.dot(a), steps, len(a))
+    np.testing.assert_allclose(mu, a)
+    np.testing.assert_allclose(mu_star, np.abs(a))
+    np.testing.assert_allclose(sigma, 0., atol=1e-12)
+
+
+def test_sobol_indices_additive():
+    a = np.array([1., 2., 0.])
+    n_base = 2048
+    X = sobol_samples(len(a), n_base=n_base, rng=0)
+    assert X.shape == ((2 + len(a))*n_base, len(a))
+    S1, ST = sobol_indices(X.dot(a), len(a), n_base)
+    # Uniform inputs: S_i = a_i^2 / sum(a^2), no interactions
+    expected = a**2 / np.sum(a**2)
+    np.testing.assert_allclose(S1, expected, atol=0.05)
+    np.testing.assert_allclose(ST, expected, atol=0.05)
+
+
+def test_sobol_indices_constant_output():
+    X = sobol_samples(2, n_base=16, rng=0)
+    S1, ST = sobol_indices(np.ones(len(X)), 2, 16)
+    np.testing.assert_array_equal(S1, 0.)
+    np.testing.assert_array_equal(ST, 0.)
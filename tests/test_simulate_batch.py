@@ -0,0 +1,215 @@
+#============================================================
+# File test_simulate_batch.py
+#
+# Tests of DynamicME.simulate_batch on the synthetic model
+#============================================================
+
+import numpy as np
+import pytest
+import sympy
+
+from cobrame import mu
+
+from dynamicme.backends import LPBackend
+from dynamicme.dynamic import DynamicME
+from dynamicme.profiling import Profiler
+
+
+C0_DICT = {'glc__D_e': 2., 'o2_e': 0.21, 'ac_e': 0.}
+LB_DICT = {'EX_glc__D_e': -10., 'EX_o2_e': -20., 'EX_ac_e': -10.}
+T = 3.
+DT = 0.25
+X0 = 0.1
+PREC_BS = 1e-4
+
+
+def baseline_trajectory(dyme, T, c0_dict, X0, dt, lb_dict, prec_bs,
+                        o2_e_id='o2_e', o2_head=0.21, kLa=7.5,
+                        ZERO_CONC=1e-3, LB_DEFAULT=-1000.):
+    """
+    times, biomass, conc_profile of the original (dict-based) batch loop
+    for ME 2.0-style exchanges: cobra bounds and solver.bisectmu each
+    time a bound changes
+    """
+    me = dyme.me
+    solver = dyme.solver
+    rxn_ids = [rxn.id for rxn in me.reactions]
+    conc_dict = dict(c0_dict)
+    X_biomass = X0
+    mu_opt = 0.
+    x_dict = None
+    t_sim = 0.
+    times = [t_sim]
+    biomass = [X_biomass]
+    concs = [dict(conc_dict)]
+    recompute = True
+    while t_sim < T:
+        for metid, conc in conc_dict.items():
+            ex_rxn = dyme.get_exchange_rxn(metid, exchange_one_rxn=True)
+            lb1 = 0. if conc <= ZERO_CONC else lb_dict.get(ex_rxn.id, LB_DEFAULT)
+            if lb1 != ex_rxn.lower_bound:
+                recompute = True
+            ex_rxn.lower_bound = lb1
+        if recompute:
+            mu_opt, hs, x_opt, cache = solver.bisectmu(prec_bs)
+            x_dict = None if x_opt is None else dict(zip(rxn_ids, x_opt))
+
+        X_prime = X_biomass + mu_opt*X_biomass*dt
+        conc_prime = dict(conc_dict)
+        reset_run = False
+        for metid, conc in conc_dict.items():
+            rxn = dyme.get_exchange_rxn(metid, exchange_one_rxn=True)
+            v = 0. if x_dict is None else x_dict[rxn.id]
+            if metid != o2_e_id:
+                conc_prime[metid] = conc + v*X_prime*dt
+                if conc_prime[metid] < (ZERO_CONC - prec_bs):
+                    reset_run = True
+                    lb_dict[rxn.id] = min(-conc / (X_prime*dt), 0.)
+                elif -v*X_prime*dt > conc_prime[metid]/2:
+                    lb_dict[rxn.id] = min(-conc_prime[metid]/(X_biomass*dt), 0.)
+            else:
+                conc_prime[metid] = conc + (v*X_prime + kLa*(o2_head - conc))*dt
+        if reset_run:
+            continue
+        X_biomass = X_prime
+        conc_dict = conc_prime
+        t_sim = t_sim + dt
+        times.append(t_sim)
+        biomass.append(X_biomass)
+        concs.append(dict(conc_dict))
+        recompute = False
+
+    return times, biomass, concs
+
+
+def run_batch(dyme, **kwargs):
+    return dyme.simulate_batch(T, dict(C0_DICT), X0, dt=DT, lb_dict=dict(LB_DICT),
+                               prec_bs=PREC_BS, verbosity=0, **kwargs)
+
+
+#============================================================
+# simulate_batch
+
+def test_simulate_batch_matches_baseline(make_me):
+    times0, biomass0, concs0 = baseline_trajectory(
+        DynamicME(make_me(), backend='highs', exchange_one_rxn=True),
+        T, C0_DICT, X0, DT, dict(LB_DICT), PREC_BS)
+
+    dyme = DynamicME(make_me(), backend='highs', exchange_one_rxn=True)
+    result = run_batch(dyme)
+
+    np.testing.assert_allclose(result['time'], times0)
+    np.testing.assert_allclose(result['biomass'], biomass0, rtol=1e-6, atol=1e-12)
+    for metid in C0_DICT:
+        np.testing.assert_allclose([c[metid] for c in result['concentration']],
+                                   [c[metid] for c in concs0], rtol=1e-6, atol=1e-9)
+    # Glucose runs out within T, so depletion and throttling are covered
+    assert result['concentration'][-1]['glc__D_e'] < C0_DICT['glc__D_e'] / 2
+
+
+def test_simulate_batch_fast_forward(make_me):
+    result_ff = run_batch(DynamicME(make_me(), backend='highs', exchange_one_rxn=True))
+    result = run_batch(DynamicME(make_me(), backend='highs', exchange_one_rxn=True),
+                       fast_forward=False)
+    np.testing.assert_allclose(result_ff['time'], result['time'])
+    np.testing.assert_allclose(result_ff['biomass'], result['biomass'], rtol=1e-9)
+    for metid in C0_DICT:
+        np.testing.assert_allclose([c[metid] for c in result_ff['concentration']],
+                                   [c[metid] for c in result['concentration']],
+                                   rtol=1e-9, atol=1e-12)
+
+
+def test_simulate_batch_repeatable(me):
+    dyme = DynamicME(me, backend='highs', exchange_one_rxn=True)
+    lbs = [rxn.lower_bound for rxn in me.reactions]
+    result1 = run_batch(dyme)
+    # LP bound routing is released and bounds are written back to the model
+    assert dyme.solver.make_lp.__func__ is LPBackend.make_lp
+    assert dyme.xl is None
+    for rxn, lb in zip(me.reactions, lbs):
+        if rxn.id not in LB_DICT:
+            assert rxn.lower_bound == lb
+    result2 = run_batch(dyme)
+    np.testing.assert_allclose(result1['biomass'], result2['biomass'])
+
+
+def test_simulate_batch_cleans_up_on_error(me):
+    dyme = DynamicME(me, backend='highs', exchange_one_rxn=True)
+    def fail(*args, **kwargs):
+        raise RuntimeError('solver failed')
+    dyme.solve_mu = fail
+    with pytest.raises(RuntimeError):
+        run_batch(dyme, profiler=Profiler())
+    assert 'solvelp' not in vars(dyme.solver)
+    assert dyme.solver.make_lp.__func__ is LPBackend.make_lp
+    assert dyme.xl is None
+
+
+def test_make_lp_reevaluates_symbolic_rows(me):
+    # Symbolic rhs (metabolite _bound and an added constraint) and a bound
+    # depending on a symbol other than mu
+    k = sympy.Symbol('k_cap')
+    me.reactions.get_by_id('EX_ac_e').upper_bound = 10.*k
+    me.metabolites[0]._bound = 2.*mu
+    dyme = DynamicME(me, backend='highs', exchange_one_rxn=True)
+    solver = dyme.solver
+    solver.compiled_expressions[(1, None)] = (solver.compile_expr(3.*mu + k), 'L')
+    solver.substitution_dict['k_cap'] = 2.
+    dyme.init_lp_bounds()
+    try:
+        dyme.make_lp(0.1)
+        for mu_fix in [0.3, 0.7]:
+            S, b, c, xl, xu, csense = dyme.make_lp(mu_fix)
+            S0, b0, c0, xl0, xu0, csense0 = dyme._make_lp_full(mu_fix)
+            np.testing.assert_allclose(np.ravel(b), np.ravel(b0))
+            np.testing.assert_allclose(np.ravel(xu), np.ravel(xu0))
+            assert list(csense) == list(csense0)
+        assert b[0] == pytest.approx(1.4)
+        assert b[1] == pytest.approx(4.1)
+    finally:
+        dyme.release_lp_bounds()
+
+
+def test_stop_at_steady_state(me):
+    dyme = DynamicME(me, backend='highs', exchange_one_rxn=True)
+    T_long = 50.
+    result = dyme.simulate_batch(T_long, dict(C0_DICT), X0, dt=DT, lb_dict=dict(LB_DICT),
+                                 prec_bs=PREC_BS, verbosity=0, stop_at_ss=True,
+                                 ZERO_SS=1e-6, n_ss=3)
+    assert result['washout'] is False
+    assert result['t_ss'] is not None
+    assert result['time'][-1] < T_long
+    # Stopped n_ss steps after steady state was first reached
+    assert result['time'][-1] == pytest.approx(result['t_ss'] + 2*DT)
+    assert result['concentration'][-1]['glc__D_e'] <= 1e-3 + PREC_BS
+
+
+
+def test_chemostat_washout(me):
+    dyme = DynamicME(me, backend='highs', exchange_one_rxn=True)
+    # Dilution above any feasible growth rate (bisection is within [0, 2])
+    result = dyme.simulate_chemostat(50., 5., {'glc__D_e': 2.}, X0,
+                                     c0_dict=dict(C0_DICT), dt=0.1,
+                                     lb_dict=dict(LB_DICT), prec_bs=PREC_BS, verbosity=0)
+    assert result['washout'] is True
+    assert result['biomass'][-1] <= 1e-6
+    assert result['time'][-1] < 50.
+    assert 'steady_state' not in result
+    # Glucose is fed in while biomass washes out
+    assert result['concentration'][-1]['glc__D_e'] > 1.
+
+
+def test_fva_brackets_tracked_fluxes(me):
+    dyme = DynamicME(me, backend='highs', exchange_one_rxn=True)
+    tracked = ['GLCt', 'EX_ac_e']
+    result = run_batch(dyme, extra_rxns_tracked=tracked, fva=True)
+    assert len(result['rxn_flux_min']) == len(result['rxn_flux'])
+    n_checked = 0
+    for flux, fmin, fmax in zip(result['rxn_flux'], result['rxn_flux_min'],
+                                result['rxn_flux_max']):
+        for rid in tracked:
+            if rid in flux and rid in fmin and not np.isnan(fmin[rid]):
+                tol = 1e-6*(1. + abs(flux[rid]))
+                assert fmin[rid] - tol <= flux[rid] <= fmax[rid] + tol
+                n_checked += 1
+    assert n_checked > 0
@@ -0,0 +1,47 @@
+#============================================================
+# File test_surrogate.py
+#
+# Tests of RandomFeatureSurrogate
+#============================================================
+
+import numpy as np
+
+from dynamicme.surrogate import RandomFeatureSurrogate
+
+
+def objective(z):
+    return np.sin(2*z[0]) + 0.5*z[1]**2
+
+
+def test_surrogate_ready_after_min_train():
+    sur = RandomFeatureSurrogate(min_train=3, seed=0)
+    for k in range(3):
+        assert not sur.ready
+        sur.add([k, 0.], float(k))
+    assert sur.ready
+    assert sur.n_train == 3
+
+
+def test_surrogate_fits_smooth_objective():
+    rs = np.random.RandomState(0)
+    sur = RandomFeatureSurrogate(n_features=300, lengthscale=0.5, ridge=1e-3, seed=0)
+    Z = rs.uniform(-1, 1, (80, 2))
+    for z in Z:
+        sur.add(z, objective(z))
+    Ztest = rs.uniform(-0.8, 0.8, (20, 2))
+    mean, std = sur.predict(Ztest)
+    y = np.array([objective(z) for z in Ztest])
+    assert np.sqrt(np.mean((mean - y)**2)) < 0.2 * np.std(y)
+    # More uncertain far from the training data
+    mean_far, std_far = sur.predict(np.array([[5., 5.]]))
+    assert std_far[0] > 2*np.max(std)
+
+
+def test_surrogate_refits_after_add():
+    sur = RandomFeatureSurrogate(min_train=2, seed=0)
+    sur.add([0.], 0.)
+    sur.add([1.], 1.)
+    m1 = sur.predict([[0.5]])[0]
+    sur.add([0.5], 10.)
+    m2 = sur.predict([[0.5]])[0]
+    assert m2[0] > m1[0]
@@ -0,0 +1,53 @@
+#============================================================
+# File test_sweep.py
+#
+# Tests of parameter sweep ordering and execution
+#============================================================
+
+import pandas as pd
+import pytest
+
+from dynamicme.dynamic import DynamicME, order_points, sweep_points
+from dynamicme.parallel import WorkerPool
+
+C0_DICT = {'glc__D_e': 2., 'o2_e': 0.21, 'ac_e': 0.}
+LB_DICT = {'EX_glc__D_e': -10., 'EX_o2_e': -20., 'EX_ac_e': -10.}
+
+
+def test_order_points_snake():
+    grid = {'a': [1., 2., 3.], 'b': [10., 20., 30.], 'c': ['x', 'y']}
+    points = sweep_points(grid)
+    path = order_points(points, order='snake', params=['a', 'b', 'c'])
+    assert sorted(path) == list(range(len(points)))
+    levels = {p: sorted(set(v), key=str) for p, v in grid.items()}
+    for i, j in zip(path[:-1], path[1:]):
+        steps = [abs(levels[p].index(points[i][p]) - levels[p].index(points[j][p]))
+                 for p in grid]
+        assert sorted(steps) == [0, 0, 1]
+    # First parameter slowest
+    a_path = [points[i]['a'] for i in path]
+    assert a_path == sorted(a_path)
+
+
+def test_order_points_nn_and_none():
+    points = sweep_points({'a': [3., 1., 2.]})
+    assert list(order_points(points, order=None)) == [0, 1, 2]
+    assert [points[i]['a'] for i in order_points(points, order='nn')] == [1., 2., 3.]
+    with pytest.raises(ValueError):
+        order_points(points, order='spiral')
+
+
+def test_sweep_serial_matches_pool(me):
+    dyme = DynamicME(me, backend='highs', exchange_one_rxn=True)
+    # Numeric keffs are part of the state the workers must see
+    dyme.set_keffs_numeric(['GLCt'], [0.5*me.reactions.get_by_id('GLCt').keff])
+    grid = {'c0_dict:glc__D_e': [1., 2., 3.]}
+    kwargs = dict(dt=0.25, lb_dict=dict(LB_DICT), prec_bs=1e-4)
+    df = dyme.sweep(grid, 2., dict(C0_DICT), 0.1, n_workers=0, **kwargs)
+    assert sorted(df['point'].unique()) == [0, 1, 2]
+    with WorkerPool(dyme, n_workers=2) as pool:
+        df_pool = dyme.sweep(grid, 2., dict(C0_DICT), 0.1, pool=pool, **kwargs)
+    pd.testing.assert_frame_equal(df, df_pool, check_exact=False, rtol=1e-6)
+    # More glucose, more biomass
+    final = df.groupby('point')['biomass'].last()
+    assert final[0] < final[2]